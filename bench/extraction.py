@@ -0,0 +1,99 @@
+"""Micro-benchmark dos extratores: motor compilado (main.py) x implementação original (legacy.py).
+
+Uso:
+    python bench/extraction.py [--repeat 50] [--json]
+
+Cada página de bench/corpus é parseada uma vez; o tempo medido é só o dos extratores
+(sem parse e sem markdown, que não mudaram).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import legacy  # noqa: E402
+import main  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+def best_of(func, repeat: int) -> float:
+    """Menor tempo (ms) entre `repeat` execuções: descarta ruído de agendamento."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def check_equivalence(name: str, old: dict, new: dict):
+    """Os dois motores precisam encontrar os mesmos sinais na mesma página."""
+    assert old["pixels"] == {k for k, v in new["pixels"]["pixels"].items() if v}, f"{name}: pixels divergem"
+    assert old["checkouts"] == set(new["checkouts"]["platforms"]), f"{name}: checkouts divergem"
+    for network, links in old["social"].items():
+        assert set(main.clean_and_deduplicate(links)) == set(new["social_media"][network]), f"{name}: {network} diverge"
+    assert set(main.clean_and_deduplicate(old["whatsapp"])) == set(new["whatsapp"]), f"{name}: whatsapp diverge"
+    for field in ("emails", "phones", "cnpj"):
+        assert set(main.clean_and_deduplicate(old["regex"][field])) == set(new[field]), f"{name}: {field} diverge"
+
+
+def run(repeat: int) -> list:
+    results = []
+    for filename in sorted(os.listdir(CORPUS_DIR)):
+        if not filename.endswith(".html"):
+            continue
+        with open(os.path.join(CORPUS_DIR, filename), encoding="utf-8") as f:
+            html = f.read()
+        soup = BeautifulSoup(html, "lxml")
+        body_text = soup.get_text(separator="\n")
+
+        check_equivalence(
+            filename,
+            legacy.extract_signals(soup, html, body_text),
+            main.extract_signals(soup, body_text, list(main.RESPONSE_FIELDS)),
+        )
+
+        timings = {
+            "legacy_ms": best_of(lambda: legacy.extract_signals(soup, html, body_text), repeat),
+            "compiled_ms": best_of(lambda: main.extract_signals(soup, body_text, list(main.RESPONSE_FIELDS)), repeat),
+            "legacy_pixels_ms": best_of(lambda: legacy.detect_pixels_html(html), repeat),
+            "compiled_pixels_ms": best_of(lambda: main.detect_pixels_html(html), repeat),
+        }
+        results.append({
+            "page": filename,
+            "size_kb": round(len(html) / 1024, 1),
+            **{key: round(value, 3) for key, value in timings.items()},
+            "speedup": round(timings["legacy_ms"] / timings["compiled_ms"], 2),
+        })
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="saída em JSON (para comparação automática)")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'página':<30}{'KB':>8}{'original':>12}{'compilado':>12}{'speedup':>9}{'pixels orig':>13}{'pixels comp':>13}")
+    for r in results:
+        print(
+            f"{r['page']:<30}{r['size_kb']:>8}{r['legacy_ms']:>10.2f}ms{r['compiled_ms']:>10.2f}ms"
+            f"{r['speedup']:>8.2f}x{r['legacy_pixels_ms']:>11.2f}ms{r['compiled_pixels_ms']:>11.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
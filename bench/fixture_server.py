@@ -0,0 +1,185 @@
+"""Servidor HTTP local com as páginas usadas nos benchmarks (nada sai da máquina).
+
+Uso:
+    python bench/fixture_server.py [--port 8766]
+
+Cenários:
+    /static/<arquivo>      páginas salvas em bench/corpus (HTML completo, resolvidas pelo tier estático)
+    /js-heavy              casca vazia preenchida por JS (força a escalada para o navegador)
+    /infinite-scroll       lista que carrega mais itens via IntersectionObserver, sem fim
+    /huge-dom?nodes=N      DOM gigante (padrão 50000 elementos)
+    /slow?delay=S          página estática respondida após S segundos (padrão 2)
+    /status/<código>       responde com o status HTTP pedido (páginas de erro)
+    /streamed?kb=N         página de ~N KB enviada em blocos (chunked), contatos só no fim (padrão 600)
+    /legacy-charset        página em Windows-1252 declarada só no <meta> (Content-Type sem charset)
+    /versioned/<nome>      página que muda quando VERSIONS[nome] sobe (um e-mail a mais por versão), com ETag/304
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from aiohttp import web
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+# Versão atual de cada página /versioned/<nome> (1 se ausente); recrawls alteram isso entre passadas
+VERSIONS = {}
+
+CONTACT_BLOCK = """<footer><p>Fale conosco: contato@fixture.com.br | (11) 3456-7890 | CNPJ 12.345.678/0001-90</p>
+<a href="https://wa.me/5511987654321">WhatsApp</a> <a href="https://www.instagram.com/fixture">Instagram</a>
+<a href="/contato">Contato</a> <a href="/sobre">Sobre</a></footer>"""
+
+JS_HEAVY = """<!DOCTYPE html><html lang="pt-BR"><head><meta charset="UTF-8"><title>Fixture SPA</title></head>
+<body><div id="root"></div>
+<script>
+const data = %s;
+const root = document.getElementById("root");
+for (const section of data) {
+  const el = document.createElement("section");
+  el.innerHTML = "<h2>" + section.title + "</h2><p>" + section.body + "</p>";
+  root.appendChild(el);
+}
+root.insertAdjacentHTML("beforeend", %s);
+</script></body></html>"""
+
+INFINITE_SCROLL = """<!DOCTYPE html><html lang="pt-BR"><head><meta charset="UTF-8"><title>Fixture Scroll Infinito</title></head>
+<body><h1>Feed</h1><ul id="feed"></ul><div id="sentinel" style="height:10px"></div>
+""" + CONTACT_BLOCK + """
+<script>
+let page = 0;
+const feed = document.getElementById("feed");
+async function more() {
+  const resp = await fetch("/infinite-scroll/items?page=" + page++);
+  for (const item of await resp.json()) {
+    const li = document.createElement("li");
+    li.style.height = "120px";
+    li.innerHTML = '<img loading="lazy" data-src="/img/' + item.id + '.jpg"> ' + item.text;
+    feed.appendChild(li);
+  }
+}
+new IntersectionObserver(entries => { if (entries[0].isIntersecting) more(); }).observe(document.getElementById("sentinel"));
+</script></body></html>"""
+
+
+def corpus_page(name: str) -> str:
+    with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def corpus_pages() -> list:
+    return sorted(name for name in os.listdir(CORPUS_DIR) if name.endswith(".html"))
+
+
+async def static_page(request: web.Request) -> web.Response:
+    name = request.match_info["name"]
+    if name not in corpus_pages():
+        raise web.HTTPNotFound()
+    return web.Response(text=corpus_page(name), content_type="text/html")
+
+
+async def js_heavy(request: web.Request) -> web.Response:
+    sections = [{"title": f"Seção {i}", "body": "Conteúdo renderizado no cliente. " * 20} for i in range(30)]
+    return web.Response(text=JS_HEAVY % (json.dumps(sections), json.dumps(CONTACT_BLOCK)), content_type="text/html")
+
+
+async def infinite_scroll(request: web.Request) -> web.Response:
+    return web.Response(text=INFINITE_SCROLL, content_type="text/html")
+
+
+async def infinite_scroll_items(request: web.Request) -> web.Response:
+    page = int(request.query.get("page", 0))
+    items = [{"id": page * 20 + i, "text": f"Item {page * 20 + i} do feed"} for i in range(20)]
+    await asyncio.sleep(0.05)
+    return web.json_response(items)
+
+
+async def huge_dom(request: web.Request) -> web.Response:
+    nodes = int(request.query.get("nodes", 50000))
+    rows = "".join(
+        f'<div class="row"><span>Linha {i}</span><a href="/produto/{i}">Produto {i}</a></div>'
+        for i in range(nodes // 3)
+    )
+    html = (
+        '<!DOCTYPE html><html lang="pt-BR"><head><meta charset="UTF-8"><title>Fixture DOM Gigante</title></head>'
+        f"<body><main>{rows}</main>{CONTACT_BLOCK}</body></html>"
+    )
+    return web.Response(text=html, content_type="text/html")
+
+
+async def slow(request: web.Request) -> web.Response:
+    await asyncio.sleep(float(request.query.get("delay", 2)))
+    return web.Response(text=corpus_page(corpus_pages()[0]), content_type="text/html")
+
+
+async def streamed(request: web.Request) -> web.StreamResponse:
+    size = int(request.query.get("kb", 600)) * 1024
+    resp = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+    resp.enable_chunked_encoding()
+    await resp.prepare(request)
+    await resp.write(b'<!DOCTYPE html><html lang="pt-BR"><head><meta charset="UTF-8"><title>Fixture Streamed</title></head><body>')
+    row = b"<p>Par\xc3\xa1grafo de conte\xc3\xbado enviado aos poucos pelo servidor.</p>\n"
+    for _ in range(size // len(row)):
+        await resp.write(row)
+    await resp.write(f"{CONTACT_BLOCK}</body></html>".encode())
+    await resp.write_eof()
+    return resp
+
+
+LEGACY_CHARSET = """<!DOCTYPE html><html lang="pt-BR"><head>
+<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1"><title>Açaí & Cia — Fale Conosco</title></head>
+<body><h1>Atendimento “sem complicação”</h1><p>Endereço: Rua São João, 123 – Centro</p>%s</body></html>"""
+
+
+async def legacy_charset(request: web.Request) -> web.Response:
+    return web.Response(body=(LEGACY_CHARSET % CONTACT_BLOCK).encode("cp1252"), headers={"Content-Type": "text/html"})
+
+
+async def versioned(request: web.Request) -> web.Response:
+    name = request.match_info["name"]
+    version = VERSIONS.get(name, 1)
+    etag = f'"{name}-v{version}"'
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag})
+    emails = "".join(f"<li>equipe{i}@fixture.com.br</li>" for i in range(version))
+    html = (
+        f'<!DOCTYPE html><html lang="pt-BR"><head><meta charset="UTF-8"><title>Fixture {name}</title></head>'
+        f"<body><h1>Versão {version}</h1><ul>{emails}</ul>{CONTACT_BLOCK}</body></html>"
+    )
+    return web.Response(text=html, content_type="text/html", headers={"ETag": etag})
+
+
+async def status(request: web.Request) -> web.Response:
+    code = int(request.match_info["code"])
+    return web.Response(status=code, text=f"<html><body><h1>HTTP {code}</h1></body></html>", content_type="text/html")
+
+
+def make_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/static/{name}", static_page)
+    app.router.add_get("/js-heavy", js_heavy)
+    app.router.add_get("/infinite-scroll", infinite_scroll)
+    app.router.add_get("/infinite-scroll/items", infinite_scroll_items)
+    app.router.add_get("/huge-dom", huge_dom)
+    app.router.add_get("/slow", slow)
+    app.router.add_get("/streamed", streamed)
+    app.router.add_get("/status/{code}", status)
+    app.router.add_get("/versioned/{name}", versioned)
+    app.router.add_get("/legacy-charset", legacy_charset)
+    return app
+
+
+async def start(host: str = "127.0.0.1", port: int = 8766) -> web.AppRunner:
+    """Sobe o servidor no event loop atual (usado pelo bench/run.py)."""
+    runner = web.AppRunner(make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    web.run_app(make_app(), host=args.host, port=args.port)
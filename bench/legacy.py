@@ -0,0 +1,108 @@
+"""Implementação original (pré-motor compilado) dos extratores, congelada para comparação no benchmark."""
+import re
+from typing import Dict, List
+
+from bs4 import BeautifulSoup
+
+
+def extract_regex(text: str) -> Dict[str, List[str]]:
+    emails = list(set(re.findall(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", text)))
+    phones = list(set(re.findall(r"\(?\d{2}\)?\s?\d{4,5}-?\d{4}", text)))
+    cnpjs = list(set(re.findall(r"\d{2}\.\d{3}\.\d{3}\/\d{4}-\d{2}", text)))
+    return {"emails": emails, "phones": phones, "cnpj": cnpjs}
+
+
+def get_checkouts(soup: BeautifulSoup, text_content: str) -> set:
+    platforms_detected = set()
+    checkout_keywords = {
+        "hotmart": ["pay.hotmart.com", "hotmart.com/checkout"],
+        "kiwify": ["pay.kiwify.com.br", "kiwify.app"],
+        "eduzz": ["sun.eduzz.com", "chk.eduzz.com"],
+        "monetizze": ["app.monetizze.com.br/checkout"],
+        "braip": ["ev.braip.com/checkout", "pay.braip.com"],
+        "ticto": ["checkout.ticto.com.br"],
+        "kirvano": ["pay.kirvano.com"],
+        "stripe": ["checkout.stripe.com", "js.stripe.com"],
+        "paypal": ["paypal.com/cgi-bin/webscr", "paypal.com/checkout"],
+        "shopify": ["myshopify.com", "cdn.shopify.com"],
+        "woocommerce": ["/checkout/", "wc-ajax="],
+        "yampi": ["seguro.yampi.com.br", "yampi.io"],
+        "cartpanda": ["cartpanda.com", "mycartpanda.com"],
+        "cloudfox": ["pay.cloudfox.net"]
+    }
+    for a in soup.find_all("a", href=True):
+        href = a['href'].lower()
+        for platform, patterns in checkout_keywords.items():
+            for pattern in patterns:
+                if pattern in href:
+                    platforms_detected.add(platform)
+                    break
+    for script in soup.find_all("script", src=True):
+        src = script['src'].lower()
+        if "hotmart" in src: platforms_detected.add("hotmart")
+        if "eduzz" in src: platforms_detected.add("eduzz")
+        if "stripe.com" in src: platforms_detected.add("stripe")
+        if "paypal.com" in src: platforms_detected.add("paypal")
+        if "shopify" in src: platforms_detected.add("shopify")
+        if "woocommerce" in src: platforms_detected.add("woocommerce")
+        if "yampi" in src: platforms_detected.add("yampi")
+    return platforms_detected
+
+
+def detect_pixels_html(html_content: str) -> set:
+    found = set()
+    if re.search(r"fbq\s*\(\s*['\"]init['\"]\s*,\s*['\"](\d+)['\"]", html_content): found.add("facebook")
+    if re.search(r"['\"](UA-\d+-\d+|G-[A-Z0-9]+)['\"]", html_content): found.add("google_analytics")
+    if re.search(r"['\"]AW-\d+['\"]", html_content): found.add("google_ads")
+    if re.search(r"ttq\.load\s*\(\s*['\"]([A-Z0-9]+)['\"]", html_content): found.add("tiktok")
+    if re.search(r"pintrk\s*\(\s*['\"]load['\"]\s*,\s*['\"](\d+)['\"]", html_content): found.add("pinterest")
+    if re.search(r"twq\s*\(\s*['\"]init['\"]\s*,\s*['\"]([a-zA-Z0-9]+)['\"]", html_content): found.add("twitter")
+    if re.search(r"_linkedin_partner_id\s*=\s*['\"](\d+)['\"]", html_content): found.add("linkedin")
+    if re.search(r"snaptr\s*\(\s*['\"]init['\"]\s*,\s*['\"]([a-zA-Z0-9-]+)['\"]", html_content): found.add("snapchat")
+    if "trc.taboola.com" in html_content: found.add("taboola")
+    if "widgets.outbrain.com/outbrain.js" in html_content: found.add("outbrain")
+    return found
+
+
+def extract_signals(soup: BeautifulSoup, content_html: str, body_text: str) -> dict:
+    """Mesma sequência de passadas do execute_scraping_task original (sem markdown)."""
+    regex_data = extract_regex(body_text)
+    desc_tag = soup.find("meta", attrs={"name": "description"})
+    og_image_tag = soup.find("meta", property="og:image")
+    social_links = {"linkedin": [], "facebook": [], "instagram": [], "youtube": [], "twitter": []}
+    whatsapp_links = []
+    whatsapp_seen_numbers = set()
+    button_links = []
+    for a in soup.find_all("a", href=True):
+        href = a['href'].lower()
+        original_href = a['href']
+        txt = a.get_text(strip=True)
+        if "linkedin.com" in href: social_links["linkedin"].append(href)
+        elif "facebook.com" in href: social_links["facebook"].append(href)
+        elif "instagram.com" in href: social_links["instagram"].append(href)
+        elif "youtube.com" in href: social_links["youtube"].append(href)
+        elif "twitter.com" in href or "x.com" in href: social_links["twitter"].append(href)
+        if "wa.me" in href or "api.whatsapp.com" in href or "web.whatsapp.com" in href:
+            phone_match = re.search(r'phone=(\d+)', original_href) or re.search(r'wa\.me/(\d+)', original_href)
+            if phone_match:
+                number = phone_match.group(1)
+                if number not in whatsapp_seen_numbers:
+                    whatsapp_seen_numbers.add(number)
+                    whatsapp_links.append(original_href)
+            elif original_href not in whatsapp_links:
+                whatsapp_links.append(original_href)
+        if txt: button_links.append(original_href)
+    imgs = [img['src'] for img in soup.find_all('img', src=True)]
+    icon_link = soup.find("link", rel="icon") or soup.find("link", rel="shortcut icon")
+    return {
+        "regex": regex_data,
+        "description": desc_tag["content"] if desc_tag else "",
+        "og_image": og_image_tag["content"] if og_image_tag else "",
+        "social": social_links,
+        "whatsapp": whatsapp_links,
+        "buttons": button_links,
+        "images": imgs,
+        "favicon": icon_link.get("href") if icon_link else "",
+        "pixels": detect_pixels_html(content_html),
+        "checkouts": get_checkouts(soup, body_text),
+    }
@@ -0,0 +1,388 @@
+"""Suíte de benchmark e carga: extratores puros e /scrape contra o servidor de fixtures local.
+
+Uso:
+    python bench/run.py extractors [--concurrency 1,2,4] [--iterations 200]
+    python bench/run.py scrape --api http://127.0.0.1:8000 [--pid PID] [--concurrency 1,4,16] [--requests 40]
+    python bench/run.py scrape --spawn        # sobe um uvicorn local e mede o RSS dele (Chromium incluso)
+    python bench/run.py all --spawn --json bench_output.json --baseline bench/baseline.json
+    python bench/run.py scrape --scenarios "" --replay ID1,ID2   # páginas reais gravadas com record=true
+
+Para cada cenário e nível de concorrência reporta req/s, latência p50/p95/p99 e pico de RSS
+(árvore de processos: workers do pool de extração e Chromium entram na conta).
+
+Com --baseline o resultado é comparado com uma execução guardada: req/s abaixo ou p95 acima
+da tolerância (--tolerance, padrão 0.2) contam como regressão e o script sai com código 1.
+--save-baseline grava a execução atual no arquivo do --baseline. Tudo roda offline: com --replay
+as páginas vêm de gravações (GET /recordings) servidas do HAR pelo próprio navegador.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+
+import fixture_server  # noqa: E402
+import main  # noqa: E402
+
+SCENARIOS = ("static", "js_heavy", "infinite_scroll", "huge_dom", "slow")
+
+# Todo cenário bate no mesmo host (127.0.0.1): com os limites por host do scheduler (2 simultâneos,
+# 2 req/s) as linhas de concorrência mediriam o throttle, não o throughput. O limite global segue valendo.
+BENCH_API_ENV = {
+    "SCHEDULER_HOST_CONCURRENCY": "100000",
+    "SCHEDULER_HOST_RATE": "100000",
+    "SCHEDULER_HOST_BURST": "100000",
+    "CLUSTER_HOST_RATE": "100000",
+}
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(suite: str, name: str, concurrency: int, latencies: list, errors: int, wall: float, peak_rss: int) -> dict:
+    """Uma linha do relatório. Latências em segundos; a saída em ms."""
+    total = len(latencies) + errors
+    return {
+        "suite": suite,
+        "name": name,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "req_per_s": round(total / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+    }
+
+
+class RssSampler:
+    """Amostra em thread o RSS da árvore de processos de `pid` e guarda o pico."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, main.process_tree_rss(self.pid))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, main.process_tree_rss(self.pid))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# --- Extratores ---
+
+def load_corpus() -> list:
+    pages = []
+    for name in fixture_server.corpus_pages():
+        html = fixture_server.corpus_page(name)
+        soup = BeautifulSoup(html, "lxml")
+        body_text = soup.get_text(separator="\n")
+        links = [a.get("href") for a in soup.find_all("a", href=True)]
+        pages.append({"name": name, "html": html, "soup": soup, "body_text": body_text, "links": links})
+    return pages
+
+
+def bench_extractors(iterations: int, pipeline_pages: int, concurrency_levels: list) -> list:
+    """Extratores puros em sequência (latência por chamada) e o pipeline completo no pool de
+    processos em cada nível de concorrência (throughput de páginas)."""
+    pages = load_corpus()
+    extractors = {
+        "extract_regex": lambda page: main.extract_regex(page["body_text"]),
+        "get_checkouts": lambda page: main.get_checkouts(page["soup"], page["body_text"]),
+        "detect_pixels_html": lambda page: main.detect_pixels_html(page["html"]),
+        "clean_and_deduplicate": lambda page: main.clean_and_deduplicate(page["links"]),
+        "html_to_markdown": lambda page: main.html_to_markdown(page["html"], False),
+    }
+    results = []
+    for name, func in extractors.items():
+        latencies = []
+        with RssSampler(os.getpid()) as rss:
+            wall_start = time.perf_counter()
+            for i in range(iterations):
+                page = pages[i % len(pages)]
+                start = time.perf_counter()
+                func(page)
+                latencies.append(time.perf_counter() - start)
+            wall = time.perf_counter() - wall_start
+        results.append(summarize("extractors", name, 1, latencies, 0, wall, rss.peak))
+
+    for concurrency in concurrency_levels:
+        results.append(bench_pipeline(pages, pipeline_pages, concurrency))
+    return results
+
+
+def bench_pipeline(pages: list, iterations: int, concurrency: int) -> dict:
+    """extract_page_fields (parse + extratores + markdown) como em produção: no pool spawn."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=concurrency, mp_context=context) as pool:
+        # Aquecimento: imports e primeira chamada de cada worker ficam fora da medição
+        list(pool.map(main.extract_page_fields, [pages[0]["html"]] * concurrency, [None] * concurrency, [list(main.RESPONSE_FIELDS)] * concurrency))
+        with RssSampler(os.getpid()) as rss:
+            # Malha fechada: `concurrency` páginas em voo, como o Semaphore faz na API
+            latencies = []
+            in_flight = {}
+            wall_start = time.perf_counter()
+            for i in range(iterations):
+                if len(in_flight) >= concurrency:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                        latencies.append(time.perf_counter() - in_flight.pop(future))
+                future = pool.submit(main.extract_page_fields, pages[i % len(pages)]["html"], None, list(main.RESPONSE_FIELDS))
+                in_flight[future] = time.perf_counter()
+            for future in list(in_flight):
+                future.result()
+                latencies.append(time.perf_counter() - in_flight.pop(future))
+            wall = time.perf_counter() - wall_start
+    return summarize("extractors", "pipeline", concurrency, latencies, 0, wall, rss.peak)
+
+
+# --- /scrape ---
+
+def scenario_requests(fixture_url: str) -> dict:
+    """Corpos enviados ao /scrape por cenário (em rodízio). force_refresh: o cache não entra na medição."""
+    base = {"force_refresh": True}
+    return {
+        "static": [{**base, "url": f"{fixture_url}/static/{name}"} for name in fixture_server.corpus_pages()],
+        "js_heavy": [{**base, "url": f"{fixture_url}/js-heavy"}],
+        "infinite_scroll": [{**base, "url": f"{fixture_url}/infinite-scroll", "scroll": "always"}],
+        "huge_dom": [{**base, "url": f"{fixture_url}/huge-dom"}],
+        "slow": [{**base, "url": f"{fixture_url}/slow?delay=1"}],
+    }
+
+
+async def replay_requests(session: aiohttp.ClientSession, api_url: str, recording_ids: list) -> dict:
+    """Cenários replay:<id>: repete a requisição gravada com replay=<id> (sem rede, só navegador e extração)."""
+    bodies = {}
+    for recording_id in recording_ids:
+        async with session.get(f"{api_url}/recordings/{recording_id}") as resp:
+            resp.raise_for_status()
+            trace = await resp.json()
+        bodies[f"replay:{recording_id[:8]}"] = [{**trace["request"], "url": trace["url"], "replay": recording_id}]
+    return bodies
+
+
+async def drive_scrape(session: aiohttp.ClientSession, api_url: str, bodies: list, total: int, concurrency: int):
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                async with session.post(f"{api_url}/scrape", json=bodies[i % len(bodies)]) as resp:
+                    payload = await resp.json()
+                ok = resp.status == 200 and payload.get("status") == "success"
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - wall_start
+
+
+async def bench_scrape(
+    api_url: str, pid: int, scenarios: list, requests: int, concurrency_levels: list, fixture_port: int, replays: list = ()
+) -> list:
+    runner = await fixture_server.start(port=fixture_port)
+    fixture_url = f"http://127.0.0.1:{fixture_port}"
+    bodies = scenario_requests(fixture_url)
+    results = []
+    timeout = aiohttp.ClientTimeout(total=300)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=0)) as session:
+            if replays:
+                replay_bodies = await replay_requests(session, api_url, replays)
+                bodies.update(replay_bodies)
+                scenarios = [*scenarios, *replay_bodies]
+            for scenario in scenarios:
+                for concurrency in concurrency_levels:
+                    sampler = RssSampler(pid) if pid else None
+                    if sampler:
+                        sampler.start()
+                    try:
+                        latencies, errors, wall = await drive_scrape(session, api_url, bodies[scenario], requests, concurrency)
+                    finally:
+                        if sampler:
+                            await asyncio.to_thread(sampler.stop)
+                    row = summarize("scrape", scenario, concurrency, latencies, errors, wall, sampler.peak if sampler else 0)
+                    results.append(row)
+                    print_row(row, file=sys.stderr)
+    finally:
+        await runner.cleanup()
+    return results
+
+
+def spawn_api(port: int) -> subprocess.Popen:
+    """Sobe o main.py com uvicorn e espera o /health/ready (navegadores aquecidos): a carga não mede boot a frio.
+    Os limites por host saem do caminho (BENCH_API_ENV)."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env={**os.environ, **BENCH_API_ENV},
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API encerrou durante o boot (código {process.returncode})")
+        try:
+            # 503 (warm-up em andamento) chega como HTTPError, que também é OSError
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health/ready", timeout=2) as resp:
+                if resp.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("API não ficou pronta (/health/ready) em 120s")
+
+
+# --- Relatório e baseline ---
+
+def result_key(row: dict) -> str:
+    return f"{row['suite']}/{row['name']}/c{row['concurrency']}"
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Regressões em relação ao baseline. Linhas sem correspondente no baseline são ignoradas."""
+    previous = {result_key(row): row for row in baseline}
+    regressions = []
+    for row in results:
+        base = previous.get(result_key(row))
+        if not base:
+            continue
+        if base["req_per_s"] and row["req_per_s"] < base["req_per_s"] * (1 - tolerance):
+            regressions.append(f"{result_key(row)}: req/s {base['req_per_s']} -> {row['req_per_s']}")
+        if base["p95_ms"] and row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result_key(row)}: p95 {base['p95_ms']}ms -> {row['p95_ms']}ms")
+        if row["errors"] > base["errors"]:
+            regressions.append(f"{result_key(row)}: erros {base['errors']} -> {row['errors']}")
+    return regressions
+
+
+def print_row(row: dict, file=sys.stdout):
+    print(
+        f"{result_key(row):<42}{row['requests']:>6}{row['errors']:>5}{row['req_per_s']:>10.1f}"
+        f"{row['p50_ms']:>11.2f}{row['p95_ms']:>11.2f}{row['p99_ms']:>11.2f}{row['peak_rss_mb']:>10.1f}",
+        file=file,
+    )
+
+
+def print_table(results: list):
+    print(f"{'cenário':<42}{'req':>6}{'err':>5}{'req/s':>10}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'RSS MB':>10}")
+    for row in results:
+        print_row(row)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("suite", choices=("extractors", "scrape", "all"))
+    parser.add_argument("--concurrency", default=None, help="níveis separados por vírgula (padrão 1,2,4 / 1,4,16)")
+    parser.add_argument("--iterations", type=int, default=200, help="chamadas por extrator")
+    parser.add_argument("--pipeline-pages", type=int, default=40, help="páginas por nível no pipeline completo")
+    parser.add_argument("--requests", type=int, default=40, help="requisições por cenário e nível no /scrape")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--replay", default="", help="ids de gravações (separados por vírgula) para reproduzir como cenários")
+    parser.add_argument("--api", default="http://127.0.0.1:8000", help="API já rodando (ignorado com --spawn)")
+    parser.add_argument("--pid", type=int, default=0, help="PID da API para medir RSS (automático com --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="sobe a API com uvicorn para a medição")
+    parser.add_argument("--api-port", type=int, default=8010)
+    parser.add_argument("--fixture-port", type=int, default=8766)
+    parser.add_argument("--json", help="grava o resultado em JSON neste arquivo")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--save-baseline", action="store_true", help="grava esta execução no arquivo do --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = []
+    if args.suite in ("extractors", "all"):
+        levels = [int(c) for c in (args.concurrency or "1,2,4").split(",")]
+        results += bench_extractors(args.iterations, args.pipeline_pages, levels)
+    if args.suite in ("scrape", "all"):
+        levels = [int(c) for c in (args.concurrency or "1,4,16").split(",")]
+        scenarios = [name for name in args.scenarios.split(",") if name]
+        api_url, pid, process = args.api, args.pid, None
+        if args.spawn:
+            process = spawn_api(args.api_port)
+            api_url, pid = f"http://127.0.0.1:{args.api_port}", process.pid
+        try:
+            replays = [recording_id for recording_id in args.replay.split(",") if recording_id]
+            results += asyncio.run(bench_scrape(api_url, pid, scenarios, args.requests, levels, args.fixture_port, replays))
+        finally:
+            if process:
+                process.terminate()
+                process.wait(timeout=30)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": main.available_cpus(),
+            "timestamp": int(time.time()),
+        },
+        "results": results,
+    }
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline gravado em {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        if regressions:
+            print("\nRegressões em relação ao baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nSem regressões em relação ao baseline.")
+
+
+if __name__ == "__main__":
+    main_cli()
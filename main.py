@@ -3,37 +3,169 @@ import asyncio
 import random
 import time
 import base64
+import codecs
 import re
 import logging
+import socket
+import functools
 import gc
-from contextlib import asynccontextmanager
-from typing import List, Optional, Dict, Any
+import hashlib
+import heapq
+import json
+import multiprocessing
+import sqlite3
+import threading
+import uuid
+from collections import Counter, OrderedDict, deque
+from urllib.parse import parse_qsl, urldefrag, urlencode, urljoin, urlsplit, urlunsplit
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, Literal, Tuple, get_args
 
 import aiohttp
-import trafilatura
-from fake_useragent import UserAgent
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Error as PlaywrightError
-from bs4 import BeautifulSoup
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pydantic import BaseModel, ConfigDict, PrivateAttr, model_serializer, model_validator
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+# Importados sob demanda (fora do caminho do boot): bs4/lxml na extração, trafilatura/lxml.html no markdown
+# e redis no modo distribuído
+aioredis = None
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
 # --- Configuração de Logging ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("WebScraperAPI")
 
 # --- Constants & Configs ---
-BLOCKED_RESOURCE_TYPES = ["image", "media", "font", "texttrack", "object", "beacon", "csp_report", "imageset"]
-BLOCKED_URL_PATTERNS = [
-    "google-analytics.com", 
-    "doubleclick.net", 
-    "googlesyndication.com", 
-    "facebook.net/en_US/fbevents.js",
-    "adsystem.com",
-    "adservice.google.com",
-    "connect.facebook.net"
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "texttrack", "object", "beacon", "csp_report", "imageset"})
+# Blocklist estilo EasyList (||dominio^) ou um domínio por linha; vira um conjunto de sufixos de host
+BLOCKLIST_PATH = os.getenv("BLOCKLIST_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "blocklist.txt"))
+# User agents rotativos: arquivo local versionado (nada é baixado no boot)
+USER_AGENTS_PATH = os.getenv("USER_AGENTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "user_agents.txt"))
+FALLBACK_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
+# Pacote de assinaturas (redes sociais, WhatsApp, checkouts, pixels); recarregado quando o arquivo muda
+SIGNATURES_PATH = os.getenv("SIGNATURES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "signatures.json"))
+SIGNATURES_POLL_INTERVAL = 30
+# Até quantos domínios da blocklist viram padrões bloqueados dentro do navegador (CDP); o resto fica no route handler
+BLOCKLIST_CDP_MAX = int(os.getenv("BLOCKLIST_CDP_MAX", 500))
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", 5))
+
+# Shards de navegador: cada Chromium é reciclado sozinho ao atingir um dos limites
+BROWSER_COUNT = int(os.getenv("BROWSER_COUNT", 0))  # 0 = derivado das CPUs
+BROWSER_RESTART_LIMIT = int(os.getenv("BROWSER_RESTART_LIMIT", 200))
+BROWSER_MAX_AGE = int(os.getenv("BROWSER_MAX_AGE", 1800))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", 1500))
+BROWSER_MONITOR_INTERVAL = 10
+BROWSER_DRAIN_TIMEOUT = 120
+# Pool de contextos/páginas pré-aquecidos
+PAGE_POOL_WARM = int(os.getenv("PAGE_POOL_WARM", MAX_CONCURRENCY))
+PAGE_POOL_MAX_IDLE = int(os.getenv("PAGE_POOL_MAX_IDLE", MAX_CONCURRENCY))
+PAGE_MAX_USES = int(os.getenv("PAGE_MAX_USES", 50))
+# Tempo máximo padrão do Smart Scroll (ms), ajustável por requisição
+SCROLL_BUDGET_MS = int(os.getenv("SCROLL_BUDGET_MS", 5000))
+# Pool de processos para o parse/extração (0 = CPUs do container, -1 = inline no event loop)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", 0))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 1000))
+# Markdown: tamanho máximo da saída, do HTML (já sem scripts) que entra no Trafilatura
+# e memória reservada para gerar o markdown sob demanda em GET /results/{id}/markdown
+MARKDOWN_MAX_CHARS = int(os.getenv("MARKDOWN_MAX_CHARS", 20000))
+MARKDOWN_MAX_INPUT = int(os.getenv("MARKDOWN_MAX_INPUT", 1024 * 1024))
+MARKDOWN_STORE_MB = int(os.getenv("MARKDOWN_STORE_MB", 64))
+
+# Jobs assíncronos: estado persistido em SQLite dentro de STORAGE_DIR
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+JOBS_DB_PATH = os.path.join(STORAGE_DIR, "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", MAX_CONCURRENCY))
+JOB_TTL = int(os.getenv("JOB_TTL", 24 * 3600))
+WEBHOOK_ATTEMPTS = 3
+# Screenshots: gravados em disco (STORAGE_DIR/screenshots) e servidos por GET /screenshots/{id}
+SCREENSHOT_DIR = os.path.join(STORAGE_DIR, "screenshots")
+SCREENSHOT_TTL = int(os.getenv("SCREENSHOT_TTL", 24 * 3600))
+SCREENSHOT_MAX_HEIGHT = 10000  # teto do full page, em px
+
+# Gravações (HAR da rede + trace por etapa) para reproduzir páginas offline: STORAGE_DIR/recordings
+RECORDINGS_DIR = os.path.join(STORAGE_DIR, "recordings")
+RECORDING_TTL = int(os.getenv("RECORDING_TTL", 7 * 24 * 3600))
+
+# Detecção de mudança (if_changed/since): fingerprint por URL em SQLite (no Redis em modo distribuído)
+FINGERPRINT_DB_PATH = os.getenv("FINGERPRINT_DB_PATH", os.path.join(STORAGE_DIR, "fingerprints.sqlite3"))
+FINGERPRINT_TTL = int(os.getenv("FINGERPRINT_TTL", 90 * 24 * 3600))
+
+# Cache de resultados: LRU em memória + tier em disco (CACHE_DB_PATH vazio desativa o disco)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_TTL = int(os.getenv("CACHE_TTL", 3600))
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", 7 * 24 * 3600))  # entradas vencidas guardadas para revalidação
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1000))
+CACHE_DB_MAX_ENTRIES = int(os.getenv("CACHE_DB_MAX_ENTRIES", 50000))  # teto do tier em disco (as mais antigas saem)
+CACHE_PURGE_INTERVAL = 300
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join(STORAGE_DIR, "cache.sqlite3"))
+
+# Crawl de site: teto de páginas por crawl e orçamento padrão
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", 20))
+CRAWL_BUDGET_MS = int(os.getenv("CRAWL_BUDGET_MS", 60000))
+
+# Scheduler: limite global adaptativo (AIMD entre MIN e MAX, começa em MAX_CONCURRENCY)
+# e, por host, teto de concorrência + token bucket (taxa em req/s e rajada)
+SCHEDULER_MIN_CONCURRENCY = int(os.getenv("SCHEDULER_MIN_CONCURRENCY", 1))
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", MAX_CONCURRENCY))
+SCHEDULER_LATENCY_TARGET = float(os.getenv("SCHEDULER_LATENCY_TARGET", 15.0))  # segundos com slot ocupado
+SCHEDULER_DECREASE_COOLDOWN = 5.0
+SCHEDULER_HOST_CONCURRENCY = int(os.getenv("SCHEDULER_HOST_CONCURRENCY", 2))
+SCHEDULER_HOST_RATE = float(os.getenv("SCHEDULER_HOST_RATE", 2.0))
+SCHEDULER_HOST_BURST = int(os.getenv("SCHEDULER_HOST_BURST", 5))
+SCHEDULER_MAX_HOSTS = 1024
+
+# Retentativas: só erros transitórios (e um timeout) são repetidos, com backoff exponencial + jitter
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", 3))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 1.0))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 10.0))
+# Circuit breaker por host: falhas seguidas até abrir e tempo aberto antes da requisição de teste
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_OPEN_SECONDS = int(os.getenv("CIRCUIT_OPEN_SECONDS", 60))
+CIRCUIT_MAX_HOSTS = 10000
+
+# Memória: admissão por RSS (Python + pool de extração + Chromium) contra o limite do container
+MEMORY_LIMIT_MB = int(os.getenv("MEMORY_LIMIT_MB", 0))  # 0 = limite do cgroup (ou RAM total)
+MEMORY_SOFT_RATIO = float(os.getenv("MEMORY_SOFT_RATIO", 0.75))  # acima: concorrência reduzida
+MEMORY_HARD_RATIO = float(os.getenv("MEMORY_HARD_RATIO", 0.9))  # acima: 503 com Retry-After
+MEMORY_SAMPLE_INTERVAL = 2.0
+MEMORY_GC_INTERVAL = 30.0  # coleta completa no máximo a cada 30s, e só sob pressão
+MEMORY_RETRY_AFTER = 10
+GC_GEN0_THRESHOLD = 50000  # padrão do CPython é 700: o parse de HTML cria milhões de objetos temporários
+# Teto do HTML lido de uma página (estático e navegador), em bytes/caracteres
+MAX_HTML_BYTES = int(os.getenv("MAX_HTML_BYTES", 5 * 1024 * 1024))
+
+# Modo distribuído: com REDIS_URL (qualquer servidor compatível com o protocolo Redis) os nós
+# compartilham fila de jobs, cache de resultados e rate limit por host. Vazio = nó isolado.
+REDIS_URL = os.getenv("REDIS_URL", "")
+NODE_ID = os.getenv("NODE_ID", f"{socket.gethostname()}-{os.getpid()}")
+CLUSTER_PREFIX = os.getenv("CLUSTER_PREFIX", "scraper")
+CLUSTER_HOST_RATE = float(os.getenv("CLUSTER_HOST_RATE", SCHEDULER_HOST_RATE))  # req/s por host somando todos os nós
+CLUSTER_HEARTBEAT_INTERVAL = 5
+CLUSTER_NODE_TTL = 15  # sem heartbeat por esse tempo, o nó é dado como morto e seus jobs voltam para a fila
+CLUSTER_PENALTY_TTL = 60  # quanto dura a redução de taxa de um host após um 429
+
+# Tier estático (aiohttp): limites e heurísticas de escalada para o navegador
+STATIC_MAX_BYTES = int(os.getenv("STATIC_MAX_BYTES", MAX_HTML_BYTES))
+STATIC_POOL_SIZE = int(os.getenv("STATIC_POOL_SIZE", 100))
+STATIC_MIN_TEXT_LENGTH = 200
+STATIC_SPA_TEXT_LENGTH = 1000
+SPA_ROOT_MARKERS = [
+    '<div id="root"></div>',
+    '<div id="app"></div>',
+    'id="__next"',
+    'id="__nuxt"',
+    'id="___gatsby"',
+    'ng-version=',
+    'data-reactroot',
 ]
-BROWSER_RESTART_LIMIT = 200
+NON_VISIBLE_TAGS = {"script", "style", "noscript", "template", "head", "title", "meta", "link", "svg"}
 
 # --- ADVANCED STEALTH SCRIPT (State of the Art 2025) ---
 # Engana testes de Webdriver, Chrome Runtime, Permissions, Plugins e WebGL.
@@ -89,15 +221,210 @@ ADVANCED_STEALTH_JS = """
 })();
 """
 
+# --- SMART SCROLL ADAPTATIVO ---
+# Conta IntersectionObservers criados pela página (indício de lazy load/scroll infinito).
+# Proxy mantém o toString nativo do construtor.
+LAZY_LOAD_PROBE_JS = """
+(() => {
+    const Native = window.IntersectionObserver;
+    if (!Native) return;
+    Object.defineProperty(window, '__lazyObservers', { value: 0, writable: true, enumerable: false });
+    window.IntersectionObserver = new Proxy(Native, {
+        construct(target, args, newTarget) {
+            window.__lazyObservers++;
+            return Reflect.construct(target, args, newTarget);
+        }
+    });
+})();
+"""
+
+# Passos do tamanho da viewport até o fim; para quando a altura e o DOM ficam estáveis
+# no fim da página ou quando o orçamento de tempo acaba (scroll infinito).
+ADAPTIVE_SCROLL_JS = """
+async ({ budget, force }) => {
+    const start = performance.now();
+    if (!document.body) return { scrolled: false, reason: 'sem body' };
+    const lazySelector = 'img[loading="lazy"], iframe[loading="lazy"], [data-src], [data-srcset], [data-lazy], [data-bg], .lazyload, .lazy';
+    if (!force && !window.__lazyObservers && !document.querySelector(lazySelector)) {
+        return { scrolled: false, reason: 'sem marcadores de lazy load' };
+    }
+    const step = Math.max(window.innerHeight, 400);
+    let mutations = 0;
+    const observer = new MutationObserver((records) => { mutations += records.length; });
+    observer.observe(document.body, { childList: true, subtree: true });
+    let y = 0;
+    let lastHeight = document.body.scrollHeight;
+    let stableChecks = 0;
+    let reason = 'orçamento esgotado';
+    try {
+        while (performance.now() - start < budget) {
+            y += step;
+            window.scrollTo(0, y);
+            await new Promise((resolve) => setTimeout(resolve, 150));
+            const height = document.body.scrollHeight;
+            const atBottom = y + window.innerHeight >= height;
+            if (atBottom && height === lastHeight && mutations === 0) {
+                if (++stableChecks >= 2) { reason = 'fim da página estável'; break; }
+            } else {
+                stableChecks = 0;
+            }
+            lastHeight = height;
+            mutations = 0;
+        }
+    } finally {
+        observer.disconnect();
+    }
+    return { scrolled: true, reason, height: lastHeight, elapsed: Math.round(performance.now() - start) };
+}
+"""
+
+# Pixels via globais do window. As assinaturas vêm do pacote (`SIGNATURES.pixel_globals`) como argumento,
+# então um pacote novo vale sem reconstruir o script (usado no detect_pixels_js e no DOM_SNAPSHOT_JS)
+PIXEL_GLOBALS_JS = """((signatures) => {
+    let dataLayer = null;
+    const found = {};
+    for (const [name, sig] of Object.entries(signatures)) {
+        found[name] = sig.globals.some(global => !!window[global]);
+        if (!found[name] && sig.data_layer) {
+            if (dataLayer === null) dataLayer = JSON.stringify(window.dataLayer || []);
+            found[name] = dataLayer.includes(sig.data_layer);
+        }
+    }
+    return found;
+})"""
+
+# --- EXTRAÇÃO NO NAVEGADOR ---
+# Um único evaluate devolve tudo que os extratores usam (mesma estrutura do collect_dom).
+# "code" junta scripts inline e srcs de script/iframe para as assinaturas de pixel via HTML.
+# `plan` é o extraction_plan: grupos fora dele não são coletados. `maxHtml` limita o HTML devolvido.
+DOM_SNAPSHOT_JS = """
+({plan, maxHtml, pixelGlobals}) => {
+    const want = (...groups) => groups.some(group => plan.includes(group));
+    const anchors = [];
+    if (want('whatsapp', 'social_media', 'button_links', 'checkouts', 'links')) {
+        for (const a of document.querySelectorAll('a[href]')) {
+            anchors.push([a.getAttribute('href'), (a.textContent || '').trim()]);
+        }
+    }
+    const scripts = [];
+    const code = [];
+    if (want('checkouts', 'pixels')) {
+        for (const s of document.scripts) {
+            const src = s.getAttribute('src');
+            if (src) { scripts.push(src); code.push(src); }
+            else if (s.textContent) { code.push(s.textContent); }
+        }
+        for (const f of document.querySelectorAll('iframe[src], noscript')) {
+            code.push(f.getAttribute('src') || f.textContent || '');
+        }
+    }
+    const metas = {};
+    if (want('metadata')) {
+        for (const m of document.querySelectorAll('meta[name], meta[property]')) {
+            const key = m.getAttribute('name') || m.getAttribute('property');
+            if (key && !(key in metas)) metas[key] = m.getAttribute('content') || '';
+        }
+    }
+    const images = [];
+    const icons = [];
+    if (want('images')) {
+        for (const img of document.querySelectorAll('img[src]')) {
+            const src = img.getAttribute('src');
+            if (src) images.push(src);
+        }
+        for (const l of document.querySelectorAll('link[rel~="icon"][href]')) icons.push(l.getAttribute('href'));
+    }
+    return {
+        title: document.title,
+        text: want('emails', 'phones', 'cnpj', 'text') && document.body ? document.body.innerText : '',
+        anchors, scripts, metas, images, icons,
+        code: code.join('\\n'),
+        pixels: want('pixels') ? """ + PIXEL_GLOBALS_JS + """(pixelGlobals) : null,
+        html: want('markdown', 'html') ? document.documentElement.outerHTML.slice(0, maxHtml) : null
+    };
+}
+"""
+
+# HTML serializado no navegador e cortado lá: páginas gigantes não atravessam o CDP inteiras
+PAGE_HTML_JS = "(maxHtml) => document.documentElement.outerHTML.slice(0, maxHtml)"
+
 # --- Modelos Pydantic ---
 
+RECORDING_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Seções da resposta que podem ser pedidas em `fields`
+ResponseField = Literal[
+    "emails", "phones", "cnpj", "whatsapp", "social_media", "metadata",
+    "images", "button_links", "checkouts", "pixels", "screenshot", "markdown",
+]
+RESPONSE_FIELDS = get_args(ResponseField)
+
 class ScrapeRequest(BaseModel):
     url: str
     extract_images: bool = False
     take_screenshot: bool = False
     timeout: int = 20000
+    # auto: tenta o HTML estático e escala para o navegador se a página precisar de JS
+    mode: Literal["auto", "static", "dynamic"] = "auto"
+    # Tier dinâmico: extrai dentro do navegador (um evaluate) em vez de serializar e reparsear o DOM
+    browser_extract: bool = False
+    # Smart Scroll: auto pula páginas sem lazy load; scroll_budget_ms limita o tempo rolando
+    scroll: Literal["auto", "always", "off"] = "auto"
+    scroll_budget_ms: int = SCROLL_BUDGET_MS
+    # Markdown é caro: só sai inline se pedido; senão fica disponível em GET /results/{result_id}/markdown
+    include_markdown: bool = False
+    # Cache: idade máxima aceita (s, padrão CACHE_TTL) e bypass explícito
+    max_age: Optional[int] = None
+    force_refresh: bool = False
+    # Perfil de bloqueio do navegador; padrão: "screenshot" se take_screenshot, senão "default"
+    block_profile: Optional[Literal["default", "screenshot", "fast"]] = None
+    # Screenshot: capturado depois do conteúdo, fora do caminho da resposta, e servido por URL
+    screenshot_format: Literal["webp", "jpeg", "png"] = "webp"
+    screenshot_quality: int = 70
+    screenshot_width: Optional[int] = None  # miniatura: reduz a captura para essa largura (px)
+    screenshot_full_page: bool = False
+    screenshot_inline: bool = False  # base64 no JSON (a resposta espera a captura)
+    # Seções desejadas (padrão: todas). As demais não são extraídas nem vão no JSON;
+    # "images", "screenshot" e "markdown" na lista equivalem a extract_images, take_screenshot e include_markdown.
+    fields: Optional[List[ResponseField]] = None
+    # Perfilamento: record grava a rede da página (HAR) e o tempo por etapa em GET /recordings/{id};
+    # replay=<id> serve a página a partir da gravação, sem acessar o site. Ambos usam o navegador e ignoram o cache.
+    record: bool = False
+    replay: Optional[str] = None
+    # Recrawl incremental: compara com o fingerprint anterior da URL (o último guardado, ou `since` se for ele).
+    # Sem mudança a resposta sai compacta (change="unchanged"); com mudança, só as seções alteradas e o diff.
+    if_changed: bool = False
+    since: Optional[str] = None
+    # Referência da detecção de mudança, carregada antes do scrape (decide se o screenshot vale a pena)
+    _baseline: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+
+    @model_validator(mode="after")
+    def apply_fields(self):
+        if self.fields is not None:
+            self.extract_images = "images" in self.fields
+            self.take_screenshot = "screenshot" in self.fields
+            self.include_markdown = "markdown" in self.fields
+        if self.replay is not None and not RECORDING_ID_RE.match(self.replay):
+            raise ValueError("replay deve ser o id de uma gravação")
+        if self.record or self.replay:
+            self.mode = "dynamic"
+        return self
+
+class BatchScrapeRequest(BaseModel):
+    requests: List[ScrapeRequest]
+
+class JobRequest(ScrapeRequest):
+    webhook_url: Optional[str] = None
+
+class CrawlRequest(ScrapeRequest):
+    # Limites do crawl: páginas (teto em CRAWL_MAX_PAGES), profundidade de links e tempo total
+    max_pages: int = 5
+    max_depth: int = 2
+    budget_ms: int = CRAWL_BUDGET_MS
 
 class SocialMedia(BaseModel):
+    model_config = ConfigDict(extra="allow")  # redes adicionadas pelo pacote de assinaturas
+
     linkedin: List[str] = []
     facebook: List[str] = []
     instagram: List[str] = []
@@ -114,6 +441,8 @@ class Checkouts(BaseModel):
     platforms: List[str] = []
 
 class PixelDetail(BaseModel):
+    model_config = ConfigDict(extra="allow")  # pixels adicionados pelo pacote de assinaturas
+
     facebook: bool = False
     google_analytics: bool = False
     google_ads: bool = False
@@ -127,54 +456,333 @@ class PixelDetail(BaseModel):
 
 class Pixels(BaseModel):
     have_pixels: bool = False
-    pixels: PixelDetail
+    pixels: PixelDetail = PixelDetail()
 
 class Screenshot(BaseModel):
-    base64: str = ""
+    id: str = ""
+    url: str = ""  # GET /screenshots/{id}
+    format: str = ""
+    base64: str = ""  # só com screenshot_inline
     timestamp: str = ""
 
 class Performance(BaseModel):
     total_time: str
+    stages: Dict[str, float] = {}  # segundos por etapa (fila, navegação, scroll, parse, extratores...)
+
+class Blocking(BaseModel):
+    profile: str = ""
+    requests_blocked: int = 0
+    requests_allowed: int = 0
+    bytes_loaded: int = 0  # transferidos pelo navegador (encodedDataLength)
+    bytes_saved_estimate: int = 0  # estimativa por tipo de recurso bloqueado
 
 class ScrapeResponse(BaseModel):
     status: str
     url: str
+    result_id: str = ""  # chave para GET /results/{result_id}/markdown
     method: str = "dynamic"
     emails: List[str] = []
     phones: List[str] = []
     cnpj: List[str] = []
     whatsapp: List[str] = []
-    social_media: SocialMedia
+    social_media: SocialMedia = SocialMedia()
     metadata: Dict[str, str] = {}
-    images: Images
+    images: Images = Images()
     button_links: List[str] = []
-    checkouts: Checkouts
-    pixels: Pixels
-    screenshot: Screenshot
+    checkouts: Checkouts = Checkouts()
+    pixels: Pixels = Pixels()
+    screenshot: Screenshot = Screenshot()
     markdown: str = ""
+    error: str = ""  # só com status="error" (a mensagem também segue em markdown, como antes)
     performance: Performance
+    blocking: Blocking = Blocking()  # só no tier dinâmico
+    cache: str = "miss"  # miss | hit | revalidated | bypass
+    crawled_pages: List[str] = []  # só no /crawl
+    fields: Optional[List[str]] = None  # seções pedidas; as outras saem do JSON
+    recording: str = ""  # id da gravação (record/replay), em GET /recordings/{id}
+    # Só com if_changed/since: fingerprint desta versão (mande como `since` na próxima), new | changed | unchanged
+    # e, em "changed", o que entrou e saiu de cada seção alterada
+    fingerprint: str = ""
+    change: str = ""
+    changes: Dict[str, Dict[str, List[str]]] = {}
+    # ETag/Last-Modified da origem, guardados com a entrada de cache (não vão no JSON)
+    _validators: Dict[str, str] = PrivateAttr(default_factory=dict)
+    # Links (href, texto) da página, usados pelo crawl para escolher as próximas
+    _links: List[Tuple[str, str]] = PrivateAttr(default_factory=list)
+    # Hash do texto visível (só na detecção de mudança)
+    _text_hash: str = PrivateAttr(default="")
+
+    @model_serializer(mode="wrap")
+    def slim(self, handler):
+        data = handler(self)
+        if not self.change:
+            for name in ("fingerprint", "change", "changes"):
+                data.pop(name, None)
+        if not self.error:
+            data.pop("error", None)
+        if self.fields is None:
+            data.pop("fields", None)
+        else:
+            for name in RESPONSE_FIELDS:
+                if name not in self.fields:
+                    data.pop(name, None)
+        return data
+
+class JobStatus(BaseModel):
+    id: str
+    status: str  # queued | running | finished
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[ScrapeResponse] = None
+
+class BatchItemResult(BaseModel):
+    index: int  # posição da requisição no lote
+    result: ScrapeResponse
 
 # --- Variáveis Globais ---
 PLAYWRIGHT_INSTANCE = None
-BROWSER: Optional[Browser] = None
-SEMAPHORE: Optional[asyncio.Semaphore] = None
+PLAYWRIGHT_START: Optional[asyncio.Task] = None  # start() do driver não tolera cancelamento; o shutdown espera por ele
+BROWSER_SHARDS: List["BrowserShard"] = []
+HTTP_SESSION: Optional[aiohttp.ClientSession] = None
+SCHEDULER: Optional["Scheduler"] = None
+MEMORY_GUARD: Optional["MemoryGuard"] = None
+CLUSTER: Optional["Cluster"] = None
 ACTIVE_CONNECTIONS = 0
-REQUEST_COUNT = 0
-UA_GENERATOR = None
+REQUEST_COUNT = 0  # total desde o boot; a reciclagem usa o contador de cada shard
+USER_AGENTS: List[str] = []
+WARMUP_TASK: Optional[asyncio.Task] = None  # navegadores e pool de extração sobem em background
+JOBS_DB: Optional[sqlite3.Connection] = None
+JOBS_DB_LOCK = threading.Lock()
+JOB_QUEUE: Optional[asyncio.Queue] = None
+JOB_WAIT_TIMES: deque = deque(maxlen=500)
+JOB_RUN_TIMES: deque = deque(maxlen=500)
+PENDING_WEBHOOKS = set()
+CACHE_MEMORY: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+CACHE_DB: Optional[sqlite3.Connection] = None
+FINGERPRINT_DB: Optional[sqlite3.Connection] = None
+FINGERPRINT_DB_LOCK = threading.Lock()
+CACHE_DB_LOCK = threading.Lock()
+CACHE_STATS = {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0, "stores": 0}
+PENDING_RELEASES = set()
+PENDING_SCREENSHOTS: Dict[str, asyncio.Task] = {}  # id -> captura em andamento
+MARKDOWN_STORE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # result_id -> fonte ou markdown pronto
+MARKDOWN_STORE_BYTES = 0
+HOST_CIRCUITS: Dict[str, "CircuitBreaker"] = {}
+ERROR_STATS = {"permanent": 0, "transient": 0, "timeout": 0, "retries": 0, "circuit_opened": 0, "circuit_rejected": 0}
+PENDING_ROTATIONS = set()
+STAGE_TIMER: ContextVar[Optional["StageTimer"]] = ContextVar("STAGE_TIMER", default=None)
+ROUTE_STATS: Counter = Counter()  # (blocked|allowed, resource_type) -> sub-requisições do navegador
+BLOCKED_HOSTS: frozenset = frozenset()  # carregado da blocklist no startup
+BLOCKED_HOST_GLOBS: List[str] = []  # parte da blocklist aplicada pelo próprio navegador
+EXTRACTION_POOL: Optional[ProcessPoolExecutor] = None
+
+class StaticFetchError(Exception):
+    """Resposta HTTP inutilizável no tier estático (conteúdo não-HTML)."""
 
 # --- Funções Auxiliares ---
 
-async def init_browser():
-    """Inicializa ou Reinicializa o Browser."""
-    global PLAYWRIGHT_INSTANCE, BROWSER
-    logger.info("Iniciando Playwright (Stealth Mode Ready)...")
-    if PLAYWRIGHT_INSTANCE is None:
-        PLAYWRIGHT_INSTANCE = await async_playwright().start()
-    
-    if BROWSER:
-        await BROWSER.close()
-        
-    BROWSER = await PLAYWRIGHT_INSTANCE.chromium.launch(
+def available_cpus() -> int:
+    """CPUs disponíveis para o container (respeita o limite do cgroup v2 quando existe)."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+def find_pid_by_marker(marker: str) -> Optional[int]:
+    """Localiza o processo principal do Chromium pelo argumento marcador passado no launch."""
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                if marker.encode() in f.read():
+                    return int(entry)
+        except OSError:
+            continue
+    return None
+
+def process_tree_rss(root_pid: int) -> int:
+    """Soma o RSS (bytes) de um processo e de todos os descendentes (renderers, GPU, utilitários)."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # O nome do processo pode conter espaços: o ppid vem logo após o ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    pending = [root_pid]
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            pass
+        pending.extend(children.get(pid, []))
+    return total
+
+def job_queue_depth() -> int:
+    if CLUSTER:
+        return CLUSTER.queue_depth
+    return JOB_QUEUE.qsize() if JOB_QUEUE else 0
+
+# --- Métricas (Prometheus) e Tempo por Etapa ---
+
+STAGE_SECONDS = Histogram(
+    "scraper_stage_seconds", "Tempo gasto em cada etapa do scrape.", ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+REQUEST_SECONDS = Histogram(
+    "scraper_request_seconds", "Duração total de cada scrape/crawl.", ["endpoint", "method", "status"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+
+class StageTimer:
+    """Tempo acumulado (s) por etapa de um scrape. Retentativas e páginas de um crawl somam na mesma etapa."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def rounded(self) -> Dict[str, float]:
+        return {name: round(seconds, 4) for name, seconds in self.stages.items()}
+
+    def observe(self):
+        for name, seconds in self.stages.items():
+            STAGE_SECONDS.labels(name).observe(seconds)
+
+@contextmanager
+def stage(name: str):
+    """Mede um trecho e soma no StageTimer do scrape corrente (no-op fora de um scrape)."""
+    timer = STAGE_TIMER.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timer is not None:
+            timer.add(name, time.perf_counter() - start)
+
+def record_stage(name: str, seconds: float):
+    timer = STAGE_TIMER.get()
+    if timer is not None:
+        timer.add(name, seconds)
+
+def current_stages() -> Dict[str, float]:
+    timer = STAGE_TIMER.get()
+    return timer.rounded() if timer is not None else {}
+
+def timed_pipeline(func):
+    """Etapas medidas dentro do worker voltam no próprio resultado (chave "timings")
+    e o run_extraction as soma no timer do scrape, do lado do event loop."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        timer = StageTimer()
+        token = STAGE_TIMER.set(timer)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            STAGE_TIMER.reset(token)
+        result["timings"] = timer.stages
+        return result
+    return wrapper
+
+def observe_request(endpoint: str, timer: StageTimer, result: Optional["ScrapeResponse"], start_time: float):
+    timer.observe()
+    status = result.status if result is not None else "cancelled"
+    method = result.method if status == "success" else "none"
+    REQUEST_SECONDS.labels(endpoint, method, status).observe(time.perf_counter() - start_time)
+
+class StatsCollector:
+    """Expõe no /metrics o estado que o serviço já mantém (contadores de cache/erros, navegadores, filas)."""
+
+    def collect(self):
+        errors = CounterMetricFamily("scraper_errors", "Falhas classificadas por tipo.", labels=["kind"])
+        for kind in ("permanent", "transient", "timeout"):
+            errors.add_metric([kind], ERROR_STATS[kind])
+        yield errors
+        yield CounterMetricFamily("scraper_retries", "Retentativas executadas.", value=ERROR_STATS["retries"])
+        circuits = CounterMetricFamily("scraper_circuit_events", "Eventos do circuit breaker por host.", labels=["event"])
+        circuits.add_metric(["opened"], ERROR_STATS["circuit_opened"])
+        circuits.add_metric(["rejected"], ERROR_STATS["circuit_rejected"])
+        yield circuits
+
+        cache = CounterMetricFamily("scraper_cache_events", "Eventos do cache de resultados.", labels=["event"])
+        for event, count in CACHE_STATS.items():
+            cache.add_metric([event], count)
+        yield cache
+
+        routed = CounterMetricFamily(
+            "scraper_browser_requests", "Sub-requisições do navegador bloqueadas (CDP ou route handler) ou liberadas.",
+            labels=["decision", "resource_type"],
+        )
+        for (decision, resource_type), count in ROUTE_STATS.items():
+            routed.add_metric([decision, resource_type], count)
+        yield routed
+
+        yield CounterMetricFamily("scraper_requests", "Scrapes finalizados desde o boot.", value=REQUEST_COUNT)
+        yield GaugeMetricFamily("scraper_active_connections", "Scrapes em andamento.", value=ACTIVE_CONNECTIONS)
+        if MEMORY_GUARD:
+            yield GaugeMetricFamily("scraper_memory_rss_bytes", "RSS da árvore de processos do serviço.", value=MEMORY_GUARD.rss)
+            yield GaugeMetricFamily("scraper_memory_limit_bytes", "Limite de memória usado na admissão.", value=MEMORY_GUARD.limit)
+            yield GaugeMetricFamily("scraper_memory_pressure", "RSS / limite (última amostra).", value=MEMORY_GUARD.pressure)
+            yield CounterMetricFamily("scraper_memory_rejected", "Requisições recusadas com 503 por memória.", value=MEMORY_GUARD.rejected)
+        if SCHEDULER:
+            yield GaugeMetricFamily("scraper_slot_waiters", "Scrapes aguardando slot no scheduler.", value=SCHEDULER.waiting)
+            yield GaugeMetricFamily("scraper_concurrency_limit", "Limite global de concorrência (AIMD).", value=SCHEDULER.limit)
+        yield GaugeMetricFamily("scraper_job_queue_depth", "Jobs na fila.", value=job_queue_depth())
+        yield GaugeMetricFamily(
+            "scraper_open_circuits", "Hosts com circuito aberto.",
+            value=sum(1 for circuit in HOST_CIRCUITS.values() if circuit.opened_at is not None),
+        )
+
+        rss = GaugeMetricFamily("scraper_browser_rss_bytes", "RSS do Chromium + filhos (última amostra).", labels=["shard", "pid"])
+        active = GaugeMetricFamily("scraper_browser_active_pages", "Páginas em uso por navegador.", labels=["shard", "pid"])
+        for shard in BROWSER_SHARDS:
+            labels = [str(shard.id), str(shard.pid or "")]
+            rss.add_metric(labels, shard.rss)
+            active.add_metric(labels, shard.active)
+        yield rss
+        yield active
+
+REGISTRY.register(StatsCollector())
+
+# --- Shards de Navegador ---
+
+class BrowserShard:
+    """Um processo Chromium com seu próprio pool de páginas. Reciclado sem parar os demais."""
+
+    def __init__(self, shard_id: int, browser: Browser, marker: str):
+        self.id = shard_id
+        self.browser = browser
+        self.marker = marker
+        self.pid: Optional[int] = None
+        self.launched_at = time.time()
+        self.request_count = 0
+        self.active = 0
+        self.rss = 0
+        self.draining = False
+        self.pool: Dict[str, List["PooledPage"]] = {}
+
+async def launch_browser_shard(shard_id: int) -> BrowserShard:
+    """Inicia um Chromium e o registra em BROWSER_SHARDS."""
+    logger.info(f"Iniciando Playwright (Stealth Mode Ready) - shard {shard_id}...")
+    # Argumento inócuo que identifica o processo em /proc para medir o RSS
+    marker = f"--scraper-shard={uuid.uuid4().hex}"
+    browser = await PLAYWRIGHT_INSTANCE.chromium.launch(
         headless=True,
         args=[
             '--no-sandbox',
@@ -184,166 +792,784 @@ async def init_browser():
             '--disable-blink-features=AutomationControlled',
             '--disable-infobars',
             '--hide-scrollbars',
-            '--mute-audio'
+            '--mute-audio',
+            marker
         ]
     )
-
-async def restart_browser_if_needed():
-    """Reinicia o browser se atingir o limite de requisições e estiver ocioso."""
-    global REQUEST_COUNT, ACTIVE_CONNECTIONS
-    if REQUEST_COUNT >= BROWSER_RESTART_LIMIT and ACTIVE_CONNECTIONS == 0:
-        logger.info(f"Limite de requisições ({REQUEST_COUNT}) atingido. Reiniciando navegador para limpar memória...")
+    shard = BrowserShard(shard_id, browser, marker)
+    browser.on("disconnected", lambda _: on_browser_disconnected(shard))
+    BROWSER_SHARDS.append(shard)
+    await warm_page_pool(shard)
+    return shard
+
+async def init_browsers():
+    """Sobe em paralelo os navegadores que faltam para BROWSER_COUNT (pode ser chamada de novo após uma falha)."""
+    global PLAYWRIGHT_INSTANCE, PLAYWRIGHT_START, BROWSER_COUNT
+    if not BROWSER_COUNT:
+        BROWSER_COUNT = min(available_cpus(), MAX_CONCURRENCY)
+    if PLAYWRIGHT_INSTANCE is None:
+        if PLAYWRIGHT_START is None or (PLAYWRIGHT_START.done() and (PLAYWRIGHT_START.cancelled() or PLAYWRIGHT_START.exception())):
+            PLAYWRIGHT_START = asyncio.create_task(async_playwright().start())
+        PLAYWRIGHT_INSTANCE = await asyncio.shield(PLAYWRIGHT_START)
+    running = {shard.id for shard in BROWSER_SHARDS}
+    await asyncio.gather(*(launch_browser_shard(shard_id) for shard_id in range(BROWSER_COUNT) if shard_id not in running))
+    logger.info(f"{len(BROWSER_SHARDS)} navegadores prontos.")
+
+async def close_browser_shard(shard: BrowserShard):
+    shard.draining = True
+    if shard in BROWSER_SHARDS:
+        BROWSER_SHARDS.remove(shard)
+    await flush_page_pool(shard)
+    try:
+        await shard.browser.close()
+    except Exception:
+        pass
+
+def on_browser_disconnected(shard: BrowserShard):
+    """Chromium caiu (ou foi fechado): tira o shard de rotação e sobe um substituto."""
+    if shard.draining:
+        return
+    logger.error(f"Navegador do shard {shard.id} desconectou inesperadamente. Substituindo...")
+    shard.draining = True
+    if shard in BROWSER_SHARDS:
+        BROWSER_SHARDS.remove(shard)
+    task = asyncio.create_task(launch_browser_shard(shard.id))
+    PENDING_ROTATIONS.add(task)
+    task.add_done_callback(PENDING_ROTATIONS.discard)
+
+def shard_recycle_reason(shard: BrowserShard) -> Optional[str]:
+    if shard.request_count >= BROWSER_RESTART_LIMIT:
+        return f"{shard.request_count} requisições"
+    if time.time() - shard.launched_at >= BROWSER_MAX_AGE:
+        return f"idade acima de {BROWSER_MAX_AGE}s"
+    if BROWSER_MAX_RSS_MB and shard.rss >= BROWSER_MAX_RSS_MB * 1024 * 1024:
+        return f"RSS de {shard.rss // (1024 * 1024)}MB"
+    return None
+
+async def rotate_shard(shard: BrowserShard, reason: str):
+    """Sobe o substituto primeiro, drena o shard antigo e só então o fecha."""
+    shard.draining = True
+    logger.info(f"Reciclando navegador do shard {shard.id} ({reason})...")
+    try:
+        await launch_browser_shard(shard.id)
+    except Exception as e:
+        logger.error(f"Erro ao subir substituto do shard {shard.id}: {e}")
+    deadline = time.time() + BROWSER_DRAIN_TIMEOUT
+    while shard.active > 0 and time.time() < deadline:
+        await asyncio.sleep(0.5)
+    await close_browser_shard(shard)
+    logger.info(f"Shard {shard.id} reciclado com sucesso.")
+
+def maybe_rotate_shard(shard: BrowserShard):
+    if shard.draining:
+        return
+    reason = shard_recycle_reason(shard)
+    if reason:
+        shard.draining = True
+        task = asyncio.create_task(rotate_shard(shard, reason))
+        PENDING_ROTATIONS.add(task)
+        task.add_done_callback(PENDING_ROTATIONS.discard)
+
+async def browser_monitor():
+    """Amostra o RSS de cada Chromium periodicamente e dispara reciclagens por memória/idade."""
+    while True:
+        await asyncio.sleep(BROWSER_MONITOR_INTERVAL)
+        for shard in list(BROWSER_SHARDS):
+            try:
+                if shard.pid is None:
+                    shard.pid = await asyncio.to_thread(find_pid_by_marker, shard.marker)
+                if shard.pid:
+                    shard.rss = await asyncio.to_thread(process_tree_rss, shard.pid)
+            except Exception as e:
+                logger.warning(f"Falha ao medir RSS do shard {shard.id}: {e}")
+            maybe_rotate_shard(shard)
+
+def live_shards() -> List[BrowserShard]:
+    return [shard for shard in BROWSER_SHARDS if not shard.draining]
+
+def pick_shard() -> BrowserShard:
+    """Roteamento least-loaded entre navegadores que não estão drenando."""
+    candidates = live_shards()
+    if not candidates:
+        raise RuntimeError("Nenhum navegador disponível.")
+    return min(candidates, key=lambda shard: shard.active)
+
+# --- Controle de Memória (admissão por RSS) ---
+
+def memory_limit_bytes() -> int:
+    """MEMORY_LIMIT_MB, ou o limite do cgroup (v2 e v1), ou a RAM da máquina."""
+    if MEMORY_LIMIT_MB:
+        return MEMORY_LIMIT_MB * 1024 * 1024
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
         try:
-            await init_browser()
-            REQUEST_COUNT = 0
+            with open(path) as f:
+                value = f.read().strip()
+            if value != "max" and int(value) < 1 << 60:
+                return int(value)
+        except (OSError, ValueError):
+            continue
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+class MemoryGuard:
+    """Amostra o RSS da árvore de processos do serviço (Python, workers de extração, driver e Chromium).
+    Entre MEMORY_SOFT_RATIO e MEMORY_HARD_RATIO do limite, a capacidade do scheduler cai linearmente até o
+    mínimo; acima do hard, novas requisições recebem 503 e as páginas ociosas dos pools são fechadas.
+    A coleta completa do GC só roda sob pressão (no máximo uma a cada MEMORY_GC_INTERVAL)."""
+
+    def __init__(self):
+        self.limit = memory_limit_bytes()
+        self.rss = 0
+        self.pressure = 0.0
+        self.rejected = 0
+        self.gc_runs = 0
+        self.last_gc = 0.0
+
+    def state(self) -> str:
+        if self.pressure >= MEMORY_HARD_RATIO:
+            return "critical"
+        if self.pressure >= MEMORY_SOFT_RATIO:
+            return "high"
+        return "ok"
+
+    def factor(self) -> float:
+        """Fração da concorrência liberada: 1 até o soft, caindo a 0 (o mínimo do scheduler) no hard."""
+        if self.pressure <= MEMORY_SOFT_RATIO:
+            return 1.0
+        span = max(MEMORY_HARD_RATIO - MEMORY_SOFT_RATIO, 0.01)
+        return max(0.0, 1 - (self.pressure - MEMORY_SOFT_RATIO) / span)
+
+    def admit(self) -> bool:
+        if self.state() == "critical":
+            self.rejected += 1
+            return False
+        return True
+
+    async def sample(self):
+        self.rss = await asyncio.to_thread(process_tree_rss, os.getpid())
+        self.pressure = self.rss / self.limit if self.limit else 0.0
+        if SCHEDULER:
+            SCHEDULER.set_memory_factor(self.factor())
+        state = self.state()
+        if state != "ok" and time.monotonic() - self.last_gc >= MEMORY_GC_INTERVAL:
+            self.last_gc = time.monotonic()
+            self.gc_runs += 1
             gc.collect()
-            logger.info("Navegador reiniciado com sucesso.")
+        if state == "critical":
+            # Contextos ociosos são a memória mais barata de devolver
+            for shard in list(BROWSER_SHARDS):
+                await flush_page_pool(shard)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rss_mb": self.rss // (1024 * 1024),
+            "limit_mb": self.limit // (1024 * 1024),
+            "pressure": round(self.pressure, 3),
+            "state": self.state(),
+            "rejected": self.rejected,
+            "gc_runs": self.gc_runs,
+        }
+
+async def memory_monitor():
+    while True:
+        try:
+            await MEMORY_GUARD.sample()
         except Exception as e:
-            logger.error(f"Erro ao reiniciar navegador: {e}")
+            logger.warning(f"Falha ao amostrar memória: {e}")
+        await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
+
+def check_admission():
+    """Recusa trabalho novo com 503 + Retry-After quando a memória está no limite."""
+    if MEMORY_GUARD and not MEMORY_GUARD.admit():
+        raise HTTPException(
+            status_code=503,
+            detail="Memória no limite, tente novamente em instantes.",
+            headers={"Retry-After": str(MEMORY_RETRY_AFTER)},
+        )
 
-async def smart_scroll(page: Page):
-    """Rola a página até o fim para carregar conteúdo Lazy Load."""
+# --- Bloqueio de Recursos ---
+
+# O que cada perfil corta. CSS só é liberado no screenshot; "fast" também derruba scripts de terceiros
+# (widgets, chats, tags): os pixels seguem detectados pelos stubs inline e pelo HTML.
+BLOCK_PROFILES = {
+    "default": {"resource_types": BLOCKED_RESOURCE_TYPES | {"stylesheet"}, "third_party_scripts": False},
+    "screenshot": {"resource_types": BLOCKED_RESOURCE_TYPES, "third_party_scripts": False},
+    "fast": {"resource_types": BLOCKED_RESOURCE_TYPES | {"stylesheet"}, "third_party_scripts": True},
+}
+
+# Extensões que identificam o tipo pela URL: bloqueadas dentro do navegador, sem passar pelo Python
+RESOURCE_TYPE_EXTENSIONS = {
+    "image": ("png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"),
+    "font": ("woff", "woff2", "ttf", "otf", "eot"),
+    "media": ("mp4", "webm", "mp3", "ogg", "wav", "m4a", "mov"),
+    "stylesheet": ("css",),
+}
+
+# Tamanho médio transferido por tipo (ordem de grandeza do HTTP Archive), para estimar a economia
+BLOCKED_BYTES_ESTIMATE = {"image": 25000, "imageset": 25000, "font": 30000, "media": 250000, "stylesheet": 12000, "script": 20000}
+
+SECOND_LEVEL_SUFFIXES = {"com.br", "net.br", "org.br", "gov.br", "edu.br", "co.uk", "org.uk", "com.au", "com.ar", "com.mx", "co.jp"}
+
+def load_blocklist(path: str) -> frozenset:
+    """Lê domínios no formato EasyList (||dominio^, opções $ ignoradas), hosts (0.0.0.0 dominio) ou um por linha.
+    Regras de caminho, exceções (@@) e ocultação de elementos (##) não se aplicam aqui e são puladas."""
+    hosts = set()
     try:
-        # Scroll suave até o fim
-        await page.evaluate("""
-            async () => {
-                await new Promise((resolve) => {
-                    var totalHeight = 0;
-                    var distance = 100;
-                    var timer = setInterval(() => {
-                        var scrollHeight = document.body.scrollHeight;
-                        window.scrollBy(0, distance);
-                        totalHeight += distance;
-
-                        if(totalHeight >= scrollHeight - window.innerHeight){
-                            clearInterval(timer);
-                            resolve();
-                        }
-                    }, 100);
-                });
-            }
-        """)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith(("!", "#", "[", "@@")) or "##" in line or "#@#" in line:
+                    continue
+                if line.startswith("||"):
+                    line = line[2:].split("$", 1)[0]
+                    if not line.endswith("^"):
+                        continue  # regra com caminho
+                    line = line[:-1]
+                elif " " in line:
+                    line = line.split()[-1]  # formato hosts
+                if "/" in line or "*" in line or "." not in line:
+                    continue
+                hosts.add(line.lower().lstrip("."))
+    except OSError as e:
+        logger.warning(f"Blocklist indisponível em {path}: {e}")
+    return frozenset(hosts)
+
+def init_blocklist():
+    global BLOCKED_HOSTS, BLOCKED_HOST_GLOBS
+    BLOCKED_HOSTS = load_blocklist(BLOCKLIST_PATH)
+    BLOCKED_HOST_GLOBS = []
+    if len(BLOCKED_HOSTS) <= BLOCKLIST_CDP_MAX:
+        for host in sorted(BLOCKED_HOSTS):
+            BLOCKED_HOST_GLOBS += [f"*://{host}/*", f"*://*.{host}/*"]
+    logger.info(f"Blocklist: {len(BLOCKED_HOSTS)} domínios ({len(BLOCKED_HOST_GLOBS) // 2} aplicados via CDP).")
+
+def is_blocked_host(host: str) -> bool:
+    """Testa o host e cada sufixo dele (ads.cdn.exemplo.com -> cdn.exemplo.com -> exemplo.com -> com): O(rótulos)."""
+    while host:
+        if host in BLOCKED_HOSTS:
+            return True
+        host = host.partition(".")[2]
+    return False
+
+def base_domain(host: str) -> str:
+    labels = host.split(".")
+    size = 3 if ".".join(labels[-2:]) in SECOND_LEVEL_SUFFIXES else 2
+    return ".".join(labels[-size:])
+
+def blocked_url_globs(profile: str) -> List[str]:
+    """Padrões para Network.setBlockedURLs: extensões dos tipos bloqueados no perfil + domínios da blocklist."""
+    globs = list(BLOCKED_HOST_GLOBS)
+    for resource_type, extensions in RESOURCE_TYPE_EXTENSIONS.items():
+        if resource_type in BLOCK_PROFILES[profile]["resource_types"]:
+            for ext in extensions:
+                globs += [f"*.{ext}", f"*.{ext}?*"]
+    return globs
+
+class BlockStats:
+    """Contadores de bloqueio de uma página, zerados a cada navegação."""
+
+    def __init__(self, profile: str):
+        self.profile = profile
+        self.reset()
+
+    def reset(self):
+        self.requests_blocked = 0
+        self.requests_allowed = 0
+        self.bytes_loaded = 0
+        self.bytes_saved_estimate = 0
+
+    def blocked(self, resource_type: str):
+        ROUTE_STATS["blocked", resource_type] += 1
+        self.requests_blocked += 1
+        self.bytes_saved_estimate += BLOCKED_BYTES_ESTIMATE.get(resource_type, 2000)
+
+    def allowed(self, resource_type: str):
+        ROUTE_STATS["allowed", resource_type] += 1
+        self.requests_allowed += 1
+
+    def on_loading_failed(self, params: Dict[str, Any]):
+        # "inspector" = barrado pelo setBlockedURLs; os abortados pelo route handler já foram contados lá
+        if params.get("blockedReason") == "inspector":
+            self.blocked(params.get("type", "Other").lower())
+
+    def on_loading_finished(self, params: Dict[str, Any]):
+        self.bytes_loaded += int(params.get("encodedDataLength", 0))
+
+    def summary(self) -> Blocking:
+        return Blocking(
+            profile=self.profile,
+            requests_blocked=self.requests_blocked,
+            requests_allowed=self.requests_allowed,
+            bytes_loaded=self.bytes_loaded,
+            bytes_saved_estimate=self.bytes_saved_estimate,
+        )
+
+def make_route_handler(page: Page, profile: str, stats: BlockStats):
+    # --- BLOQUEIO AGRESSIVO DE RECURSOS ---
+    # Só chega aqui o que o navegador não barrou pelos padrões estáticos (tipo sem extensão, blocklist grande)
+    blocked_types = BLOCK_PROFILES[profile]["resource_types"]
+    third_party_scripts = BLOCK_PROFILES[profile]["third_party_scripts"]
+
+    async def route_handler(route):
+        resource_type = route.request.resource_type
+        if resource_type in blocked_types:
+            stats.blocked(resource_type)
+            await route.abort()
+            return
+
+        host = urlsplit(route.request.url).hostname or ""
+        if is_blocked_host(host):
+            stats.blocked(resource_type)
+            await route.abort()
+            return
+
+        if third_party_scripts and resource_type == "script" and page.url.startswith("http"):
+            if base_domain(host) != base_domain(urlsplit(page.url).hostname or ""):
+                stats.blocked(resource_type)
+                await route.abort()
+                return
+
+        stats.allowed(resource_type)
+        await route.continue_()
+
+    return route_handler
+
+async def install_blocking(page: Page, profile: str) -> BlockStats:
+    """Bloqueio em duas camadas: padrões de URL aplicados pelo próprio Chromium (CDP), sem ida ao Python,
+    e o route handler para o que só se decide pelo tipo do recurso. Também mede os bytes transferidos."""
+    stats = BlockStats(profile)
+    await page.route("**/*", make_route_handler(page, profile, stats))
+    try:
+        cdp = await page.context.new_cdp_session(page)
+        await cdp.send("Network.enable")
+        await cdp.send("Network.setBlockedURLs", {"urls": blocked_url_globs(profile)})
+        cdp.on("Network.loadingFailed", stats.on_loading_failed)
+        cdp.on("Network.loadingFinished", stats.on_loading_finished)
+    except Exception as e:
+        logger.warning(f"Bloqueio via CDP indisponível, só o route handler será usado: {e}")
+    return stats
+
+# --- Pool de Contextos/Páginas Pré-aquecidos ---
+
+class PooledPage:
+    """Contexto + página com stealth e bloqueio já instalados, reutilizados entre requisições."""
+
+    def __init__(self, key: str, context: BrowserContext, page: Page, shard: BrowserShard, blocking: BlockStats):
+        self.key = key
+        self.context = context
+        self.page = page
+        self.shard = shard
+        self.blocking = blocking
+        self.uses = 0
+        self.recording: Optional["Recording"] = None  # páginas de gravação/replay não voltam ao pool
+
+def pool_key(request: ScrapeRequest) -> str:
+    """O pool é separado por perfil de bloqueio (o roteamento é instalado na criação da página)."""
+    if request.block_profile:
+        return request.block_profile
+    return "screenshot" if request.take_screenshot else "default"
+
+async def create_pooled_page(shard: BrowserShard, key: str, record_har_path: Optional[str] = None) -> PooledPage:
+    # Proxy Configuration: ALWAYS NONE (no proxy functionality)
+    proxy_config = None
+
+    # User Agent Rotativo e Realista
+    user_agent = random_user_agent()
+    # Gravação: HAR em zip (corpos das respostas como anexos), escrito quando o contexto fecha
+    har_options = {"record_har_path": record_har_path, "record_har_content": "attach"} if record_har_path else {}
+    
+    try:
+        context = await shard.browser.new_context(
+            user_agent=user_agent,
+            proxy=proxy_config, # Sempre None agora
+            viewport={"width": 1280 + random.randint(0, 100), "height": 720 + random.randint(0, 100)}, # Viewport randomizado
+            locale="pt-BR",
+            timezone_id="America/Sao_Paulo",
+            **har_options
+        )
+    except Exception as e:
+        logger.warning(f"Falha ao criar contexto, usando configuração padrão: {e}")
+        context = await shard.browser.new_context(user_agent=user_agent, **har_options)
+
+    # --- INJEÇÃO DE STEALTH AVANÇADO ---
+    await context.add_init_script(ADVANCED_STEALTH_JS)
+    await context.add_init_script(LAZY_LOAD_PROBE_JS)
+
+    page = await context.new_page()
+    blocking = await install_blocking(page, key)
+    return PooledPage(key, context, page, shard, blocking)
+
+async def acquire_page(key: str, recording: Optional["Recording"] = None) -> PooledPage:
+    """Escolhe o navegador menos carregado e retira uma página ociosa do pool dele (ou cria uma).
+    Com gravação/replay a página é sempre nova: o HAR é opção do contexto e o replay troca o roteamento."""
+    # Requisição chegou durante o warm-up: espera o primeiro navegador em vez de falhar
+    while WARMUP_TASK is not None and not WARMUP_TASK.done() and not live_shards():
+        await asyncio.sleep(0.1)
+    shard = pick_shard()
+    shard.active += 1
+    try:
+        if recording is not None:
+            return await create_recording_page(shard, key, recording)
+        idle = shard.pool.setdefault(key, [])
+        if idle:
+            return idle.pop()
+        return await create_pooled_page(shard, key)
+    except Exception:
+        shard.active -= 1
+        raise
+
+async def discard_page(slot: PooledPage):
+    try:
+        await slot.context.close()
+    except Exception:
+        pass
+
+async def reset_page(slot: PooledPage):
+    """Limpa o estado deixado pela última navegação (storage, cookies, abas extras)."""
+    try:
+        await slot.page.evaluate("() => { try { localStorage.clear(); sessionStorage.clear(); } catch (e) {} }")
+    except Exception:
+        pass
+    for extra in slot.context.pages:
+        if extra is not slot.page:
+            await extra.close()
+    await slot.context.clear_cookies()
+    await slot.page.goto("about:blank")
+
+async def release_page(slot: PooledPage, healthy: bool = True):
+    """Devolve a página ao pool, ou a descarta se falhou, esgotou os usos ou o navegador está drenando."""
+    shard = slot.shard
+    slot.uses += 1
+    shard.request_count += 1
+    try:
+        idle = shard.pool.setdefault(slot.key, [])
+        if (
+            not healthy
+            or slot.recording is not None
+            or shard.draining
+            or slot.uses >= PAGE_MAX_USES
+            or len(idle) >= PAGE_POOL_MAX_IDLE
+        ):
+            await discard_page(slot)
+            return
+        try:
+            await reset_page(slot)
+        except Exception as e:
+            logger.warning(f"Falha ao resetar página do pool, descartando: {e}")
+            await discard_page(slot)
+            return
+        idle.append(slot)
+    finally:
+        shard.active -= 1
+        maybe_rotate_shard(shard)
+
+def schedule_release(slot: PooledPage, healthy: bool = True, after: Optional[asyncio.Future] = None):
+    """Reset em segundo plano para não atrasar a resposta. `after`: captura que ainda usa a página."""
+    async def release():
+        if after is not None:
+            await asyncio.gather(after, return_exceptions=True)
+        await release_page(slot, healthy)
+
+    task = asyncio.create_task(release())
+    PENDING_RELEASES.add(task)
+    task.add_done_callback(PENDING_RELEASES.discard)
+
+async def warm_page_pool(shard: BrowserShard):
+    """Pré-cria páginas do perfil padrão logo após o navegador subir."""
+    idle = shard.pool.setdefault("default", [])
+    per_shard = -(-PAGE_POOL_WARM // BROWSER_COUNT)
+    for _ in range(per_shard - len(idle)):
         try:
-            await page.wait_for_load_state("networkidle", timeout=3000)
-        except:
-            pass 
+            idle.append(await create_pooled_page(shard, "default"))
+        except Exception as e:
+            logger.warning(f"Falha ao pré-aquecer página: {e}")
+            break
+    logger.info(f"Pool do shard {shard.id} aquecido com {len(idle)} páginas.")
+
+async def flush_page_pool(shard: BrowserShard):
+    for idle in shard.pool.values():
+        while idle:
+            await discard_page(idle.pop())
+
+async def smart_scroll(page: Page, mode: str = "auto", budget_ms: int = SCROLL_BUDGET_MS):
+    """Rola a página para carregar conteúdo Lazy Load, com orçamento de tempo e parada antecipada.
+    mode=auto pula o scroll quando a página não tem marcadores de lazy load."""
+    if mode == "off" or budget_ms <= 0:
+        return
+    start = time.perf_counter()
+    try:
+        result = await page.evaluate(ADAPTIVE_SCROLL_JS, {"budget": budget_ms, "force": mode == "always"})
+        logger.debug(f"Smart Scroll: {result}")
+        if not result.get("scrolled"):
+            return
+        remaining = budget_ms - (time.perf_counter() - start) * 1000
+        if remaining > 0:
+            try:
+                await page.wait_for_load_state("networkidle", timeout=min(3000, remaining))
+            except:
+                pass 
     except Exception as e:
         logger.warning(f"Erro no Smart Scroll: {e}")
 
-def extract_regex(text: str) -> Dict[str, List[str]]:
-    """Extrai e-mails, telefones e CNPJ usando Regex."""
-    emails = list(set(re.findall(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", text)))
-    phones = list(set(re.findall(r"\(?\d{2}\)?\s?\d{4,5}-?\d{4}", text)))
-    cnpjs = list(set(re.findall(r"\d{2}\.\d{3}\.\d{3}\/\d{4}-\d{2}", text)))
-    return {"emails": emails, "phones": phones, "cnpj": cnpjs}
+# --- Motor de Extração (padrões compilados uma vez, DOM percorrido uma vez) ---
 
-def get_checkouts(soup: BeautifulSoup, text_content: str) -> Checkouts:
-    platforms_detected = set()
-    
-    # Keywords in URLs (Advanced List 2025)
-    checkout_keywords = {
-        "hotmart": ["pay.hotmart.com", "hotmart.com/checkout"],
-        "kiwify": ["pay.kiwify.com.br", "kiwify.app"],
-        "eduzz": ["sun.eduzz.com", "chk.eduzz.com"],
-        "monetizze": ["app.monetizze.com.br/checkout"],
-        "braip": ["ev.braip.com/checkout", "pay.braip.com"],
-        "ticto": ["checkout.ticto.com.br"],
-        "kirvano": ["pay.kirvano.com"],
-        "stripe": ["checkout.stripe.com", "js.stripe.com"],
-        "paypal": ["paypal.com/cgi-bin/webscr", "paypal.com/checkout"],
-        "shopify": ["myshopify.com", "cdn.shopify.com"],
-        "woocommerce": ["/checkout/", "wc-ajax="],
-        "yampi": ["seguro.yampi.com.br", "yampi.io"],
-        "cartpanda": ["cartpanda.com", "mycartpanda.com"],
-        "cloudfox": ["pay.cloudfox.net"]
-    }
-    
-    # 1. Verifica links href
-    for a in soup.find_all("a", href=True):
-        href = a['href'].lower()
-        for platform, patterns in checkout_keywords.items():
-            for pattern in patterns:
-                if pattern in href:
-                    platforms_detected.add(platform)
+EMAIL_RE = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+# O lookahead deixa o `re` pular direto para posições que começam com dígito ou '('
+PHONE_RE = re.compile(r"(?=[(\d])\(?\d{2}\)?\s?\d{4,5}-?\d{4}")
+CNPJ_RE = re.compile(r"\d{2}\.\d{3}\.\d{3}\/\d{4}-\d{2}")
+WHATSAPP_NUMBER_RES = [re.compile(r'phone=(\d+)'), re.compile(r'wa\.me/(\d+)')]
+
+class SubstringMatcher:
+    """Assinaturas por substring, indexadas por padrão.
+
+    O teste `in` roda em C e é bem mais rápido que uma alternação no `re`. Primeiro filtra
+    quais padrões aparecem no conjunto inteiro (uma busca por padrão) e depois classifica
+    item a item só com os poucos candidatos que sobraram."""
+
+    def __init__(self, signatures: Dict[str, List[str]]):
+        self.patterns = [(pattern, name) for name, patterns in signatures.items() for pattern in patterns]
+
+    def candidates(self, blob: str) -> List[Tuple[str, str]]:
+        return [(pattern, name) for pattern, name in self.patterns if pattern in blob]
+
+    def match(self, text: str, candidates: Optional[List[Tuple[str, str]]] = None) -> set:
+        return {name for pattern, name in (self.patterns if candidates is None else candidates) if pattern in text}
+
+class RegexSignatureMatcher:
+    """Assinaturas (literal, regex) compiladas uma vez; a regex só confirma quando o literal existe."""
+
+    def __init__(self, signatures: Dict[str, Tuple[str, Optional[str]]]):
+        self.signatures = [
+            (name, literal, re.compile(pattern) if pattern else None)
+            for name, (literal, pattern) in signatures.items()
+        ]
+
+    def match(self, text: str) -> set:
+        found = set()
+        for name, literal, compiled in self.signatures:
+            if literal in text and (compiled is None or compiled.search(text)):
+                found.add(name)
+        return found
+
+class SignaturePack:
+    """Assinaturas do data/signatures.json compiladas nos matchers acima. Adicionar uma plataforma é
+    uma linha no arquivo: o motor de extração é o mesmo para todas.
+
+    - social: rede -> substrings do href (a ordem importa: um href conta só para a primeira rede que casar)
+    - whatsapp: substrings do href
+    - checkouts: plataforma -> {"href": [...], "script": [...]} (links e src de scripts)
+    - pixels: pixel -> {"literal", "regex" (opcional, confirma o literal no HTML),
+      "globals" (variáveis do window), "data_layer" (opcional, substring do window.dataLayer)}"""
+
+    def __init__(self, data: Dict[str, Any], version: str):
+        self.version = version
+        self.social = SubstringMatcher(data["social"])
+        self.social_priority = list(data["social"])
+        self.whatsapp = SubstringMatcher({"whatsapp": data["whatsapp"]})
+        checkouts = data["checkouts"]
+        self.checkouts = list(checkouts)
+        self.checkout_href = SubstringMatcher({name: sig.get("href", []) for name, sig in checkouts.items()})
+        self.checkout_script = SubstringMatcher({name: sig.get("script", []) for name, sig in checkouts.items()})
+        pixels = data["pixels"]
+        self.pixels = list(pixels)
+        self.pixel_html = RegexSignatureMatcher(
+            {name: (sig["literal"], sig.get("regex")) for name, sig in pixels.items() if sig.get("literal")}
+        )
+        self.pixel_globals = {
+            name: {"globals": sig.get("globals", []), "data_layer": sig.get("data_layer")}
+            for name, sig in pixels.items()
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "social": len(self.social_priority),
+            "checkouts": len(self.checkouts),
+            "pixels": len(self.pixels),
+        }
+
+def load_signatures(path: str) -> SignaturePack:
+    """Lê e compila o pacote. A versão é o hash do conteúdo: mesmo arquivo, mesma versão em todos os processos.
+    Erros (JSON inválido, chave ausente, regex quebrada) sobem: o chamador decide manter o pacote anterior."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    return SignaturePack(json.loads(raw), hashlib.sha256(raw).hexdigest()[:12])
+
+def ensure_signatures(version: str):
+    """Nos workers de extração: recarrega o pacote se o processo principal já está em outra versão."""
+    global SIGNATURES
+    if SIGNATURES.version != version:
+        SIGNATURES = load_signatures(SIGNATURES_PATH)
+
+def run_with_signatures(version: str, func, *args):
+    ensure_signatures(version)
+    return func(*args)
+
+def reload_signatures() -> bool:
+    """Troca o pacote do processo principal se o conteúdo mudou. Pacote inválido levanta e o atual fica."""
+    global SIGNATURES
+    pack = load_signatures(SIGNATURES_PATH)
+    if pack.version == SIGNATURES.version:
+        return False
+    SIGNATURES = pack
+    logger.info(f"Pacote de assinaturas {pack.version} carregado: {pack.summary()}")
+    return True
+
+async def watch_signatures():
+    """Recarrega o pacote quando o arquivo muda (deploy de assinaturas sem reiniciar o serviço)."""
+    mtime = os.stat(SIGNATURES_PATH).st_mtime
+    while True:
+        await asyncio.sleep(SIGNATURES_POLL_INTERVAL)
+        try:
+            current = os.stat(SIGNATURES_PATH).st_mtime
+            if current != mtime:
+                mtime = current
+                await asyncio.to_thread(reload_signatures)
+        except Exception as e:
+            logger.error(f"Pacote de assinaturas inválido ({SIGNATURES_PATH}), mantendo {SIGNATURES.version}: {e}")
+
+SIGNATURES = load_signatures(SIGNATURES_PATH)
+DOM_TAGS = ["a", "script", "meta", "img", "link", "iframe", "noscript"]
+# Tags que cada grupo do extraction_plan precisa ("links" é interno: usado pelo crawl)
+GROUP_TAGS = {
+    "whatsapp": {"a"}, "social_media": {"a"}, "button_links": {"a"}, "links": {"a"},
+    "checkouts": {"a", "script"}, "metadata": {"meta"}, "images": {"img", "link"},
+    "pixels": {"script", "iframe", "noscript"},
+}
+REGEX_GROUPS = ("emails", "phones", "cnpj")
+TEXT_GROUPS = (*REGEX_GROUPS, "text")  # precisam do texto visível ("text" é interno: detecção de mudança)
+LINK_GROUPS = ("whatsapp", "social_media", "button_links", "checkouts")
+
+def collect_dom(soup: "BeautifulSoup", tags: List[str] = DOM_TAGS) -> Dict[str, Any]:
+    """Uma única travessia do DOM coletando tudo que os extratores usam (só as `tags` pedidas).
+    "code" é o mesmo do DOM_SNAPSHOT_JS: scripts inline e srcs de script/iframe, onde os pixels são procurados
+    (uma fração do HTML, então o custo das assinaturas de pixel não cresce com o tamanho da página)."""
+    anchors = []
+    scripts = []
+    metas = {}
+    images = []
+    icons = []
+    code = []
+    if not tags:
+        return {"anchors": anchors, "scripts": scripts, "metas": metas, "images": images, "icons": icons, "code": ""}
+    for tag in soup.find_all(tags):
+        name = tag.name
+        if name == "a":
+            href = tag.get("href")
+            if href is not None:
+                anchors.append((href, tag.get_text(strip=True)))
+        elif name == "script":
+            src = tag.get("src")
+            if src:
+                scripts.append(src)
+                code.append(src)
+            elif tag.string:
+                code.append(tag.string)
+        elif name == "iframe":
+            src = tag.get("src")
+            if src:
+                code.append(src)
+        elif name == "noscript":
+            code.append(tag.decode_contents())
+        elif name == "meta":
+            key = tag.get("name") or tag.get("property")
+            if key and key not in metas:
+                metas[key] = tag.get("content", "")
+        elif name == "img":
+            src = tag.get("src")
+            if src:
+                images.append(src)
+        elif name == "link":
+            rel = tag.get("rel") or []
+            href = tag.get("href")
+            if href and "icon" in rel:
+                icons.append(href)
+    return {"anchors": anchors, "scripts": scripts, "metas": metas, "images": images, "icons": icons, "code": "\n".join(code)}
+
+def classify_anchors(anchors: List[Tuple[str, str]], groups=RESPONSE_FIELDS) -> Dict[str, Any]:
+    """Classifica cada link (redes sociais, WhatsApp, checkout, botões) em uma passada.
+    Grupos fora de `groups` não têm candidatos e não custam nada no laço."""
+    social_links = {name: [] for name in SIGNATURES.social_priority}
+    whatsapp_links = []
+    whatsapp_seen_numbers = set() # Para evitar duplicatas de números
+    button_links = []
+    checkout_platforms = set()
+
+    # Filtro no blob de todos os hrefs: na maioria das páginas sobram 0-3 padrões por grupo
+    blob = "\n".join(href for href, _ in anchors).lower()
+    signatures = SIGNATURES
+    social_candidates = signatures.social.candidates(blob) if "social_media" in groups else []
+    whatsapp_candidates = signatures.whatsapp.candidates(blob) if "whatsapp" in groups else []
+    checkout_candidates = signatures.checkout_href.candidates(blob) if "checkouts" in groups else []
+    want_buttons = "button_links" in groups
+
+    for original_href, txt in anchors:
+        if txt and want_buttons: button_links.append(original_href)
+        if not (social_candidates or whatsapp_candidates or checkout_candidates):
+            continue
+        href = original_href.lower()
+
+        if social_candidates:
+            social = signatures.social.match(href, social_candidates)
+            if social:
+                first = next(name for name in signatures.social_priority if name in social)
+                social_links[first].append(href)
+
+        # Lógica otimizada para WhatsApp
+        if whatsapp_candidates and signatures.whatsapp.match(href, whatsapp_candidates):
+            # Tenta extrair o número para usar como chave única
+            phone_match = None
+            for number_re in WHATSAPP_NUMBER_RES:
+                phone_match = number_re.search(original_href)
+                if phone_match:
                     break
-    
-    # 2. Verifica Scripts (src)
-    for script in soup.find_all("script", src=True):
-        src = script['src'].lower()
-        if "hotmart" in src: platforms_detected.add("hotmart")
-        if "eduzz" in src: platforms_detected.add("eduzz")
-        if "stripe.com" in src: platforms_detected.add("stripe")
-        if "paypal.com" in src: platforms_detected.add("paypal")
-        if "shopify" in src: platforms_detected.add("shopify")
-        if "woocommerce" in src: platforms_detected.add("woocommerce")
-        if "yampi" in src: platforms_detected.add("yampi")
+            
+            if phone_match:
+                number = phone_match.group(1)
+                if number not in whatsapp_seen_numbers:
+                    whatsapp_seen_numbers.add(number)
+                    whatsapp_links.append(original_href)
+            else:
+                # Se não achar número (link genérico), adiciona se a URL exata não existir
+                if original_href not in whatsapp_links:
+                    whatsapp_links.append(original_href)
+
+        if checkout_candidates:
+            checkout_platforms |= signatures.checkout_href.match(href, checkout_candidates)
 
+    return {
+        "social": social_links,
+        "whatsapp": whatsapp_links,
+        "buttons": button_links,
+        "checkouts": checkout_platforms,
+    }
+
+def classify_scripts(srcs: List[str]) -> set:
+    return SIGNATURES.checkout_script.match("\n".join(srcs).lower())
+
+def extract_regex(text: str, groups=REGEX_GROUPS) -> Dict[str, List[str]]:
+    """Extrai e-mails, telefones e CNPJ usando Regex (só os grupos pedidos)."""
+    # E-mails e CNPJ não atravessam quebras de linha: só as linhas com '@' ou '/' passam pela regex
+    lines = text.splitlines() if "emails" in groups or "cnpj" in groups else []
+    emails = list(set(EMAIL_RE.findall("\n".join(line for line in lines if "@" in line)))) if "emails" in groups else []
+    phones = list(set(PHONE_RE.findall(text))) if "phones" in groups else []
+    cnpjs = list(set(CNPJ_RE.findall("\n".join(line for line in lines if "/" in line)))) if "cnpj" in groups else []
+    return {"emails": emails, "phones": phones, "cnpj": cnpjs}
+
+def get_checkouts(soup: "BeautifulSoup", text_content: str) -> Checkouts:
+    dom = collect_dom(soup)
+    platforms_detected = classify_anchors(dom["anchors"])["checkouts"] | classify_scripts(dom["scripts"])
     return Checkouts(have_checkouts=len(platforms_detected) > 0, platforms=list(platforms_detected))
 
 def detect_pixels_html(html_content: str) -> Pixels:
     """Fallback: Detecta pixels analisando o HTML bruto (Regex), útil se o JS for bloqueado."""
-    pixels = PixelDetail()
-    
-    # Facebook: fbq('init', '123...')
-    if re.search(r"fbq\s*\(\s*['\"]init['\"]\s*,\s*['\"](\d+)['\"]", html_content):
-        pixels.facebook = True
-        
-    # Google Analytics: UA-XXXX or G-XXXX
-    if re.search(r"['\"](UA-\d+-\d+|G-[A-Z0-9]+)['\"]", html_content):
-        pixels.google_analytics = True
-        
-    # Google Ads: AW-XXXX
-    if re.search(r"['\"]AW-\d+['\"]", html_content):
-        pixels.google_ads = True
-        
-    # TikTok: ttq.load('XXXX')
-    if re.search(r"ttq\.load\s*\(\s*['\"]([A-Z0-9]+)['\"]", html_content):
-        pixels.tiktok = True
-        
-    # Pinterest: pintrk('load', 'XXXX')
-    if re.search(r"pintrk\s*\(\s*['\"]load['\"]\s*,\s*['\"](\d+)['\"]", html_content):
-        pixels.pinterest = True
-    
-    # Twitter: twq('init', 'XXXX')
-    if re.search(r"twq\s*\(\s*['\"]init['\"]\s*,\s*['\"]([a-zA-Z0-9]+)['\"]", html_content):
-        pixels.twitter = True
-        
-    # LinkedIn: _linkedin_partner_id = "XXXX"
-    if re.search(r"_linkedin_partner_id\s*=\s*['\"](\d+)['\"]", html_content):
-        pixels.linkedin = True
-        
-    # Snapchat: snaptr('init', 'XXXX')
-    if re.search(r"snaptr\s*\(\s*['\"]init['\"]\s*,\s*['\"]([a-zA-Z0-9-]+)['\"]", html_content):
-        pixels.snapchat = True
-        
-    # Taboola: _tfa.push({notify: 'event', name: 'page_view', id: 123})
-    if "trc.taboola.com" in html_content:
-        pixels.taboola = True
-        
-    # Outbrain: obApi('track', ...)
-    if "widgets.outbrain.com/outbrain.js" in html_content:
-        pixels.outbrain = True
-
-    has_pixels = any(dict(pixels).values())
-    return Pixels(have_pixels=has_pixels, pixels=pixels)
+    found = SIGNATURES.pixel_html.match(html_content)
+    pixels = PixelDetail(**{name: True for name in found})
+    return Pixels(have_pixels=bool(found), pixels=pixels)
 
 async def detect_pixels_js(page: Page) -> Pixels:
     # ... (JS detection logic remains same)
     try:
-        result = await page.evaluate("""() => {
-            return {
-                facebook: !!(window.fbq || window._fbq),
-                google_analytics: !!(window.ga || window.gtag || window.GoogleAnalyticsObject),
-                google_ads: !!(window.ads_gtag || (window.gtag && JSON.stringify(window.dataLayer || []).includes('AW-'))),
-                tiktok: !!(window.ttq),
-                pinterest: !!(window.pintrk),
-                twitter: !!(window.twq),
-                linkedin: !!(window._linkedin_data_partner_ids),
-                snapchat: !!(window.snaptr),
-                taboola: !!(window._tfa),
-                outbrain: !!(window.obApi)
-            }
-        }""")
+        result = await page.evaluate(PIXEL_GLOBALS_JS, SIGNATURES.pixel_globals)
         return Pixels(have_pixels=any(result.values()), pixels=PixelDetail(**result))
     except Exception:
         return Pixels(have_pixels=False, pixels=PixelDetail())
@@ -372,274 +1598,2369 @@ def clean_and_deduplicate(items: List[str]) -> List[str]:
                 
     return list(unique_items.values())
 
-# --- Lógica de Scraping com Retry ---
+def merge_pixels(*results: Pixels) -> Pixels:
+    """Combina detecções de pixels (OR lógico campo a campo)."""
+    merged = PixelDetail()
+    for result in results:
+        for name, detected in result.pixels:
+            if detected:
+                setattr(merged, name, True)
+    return Pixels(have_pixels=any(dict(merged).values()), pixels=merged)
+
+def extract_visible_text(soup: "BeautifulSoup") -> str:
+    """Aproxima o innerText do navegador a partir do HTML bruto (ignora scripts, estilos e comentários)."""
+    from bs4 import Comment
+
+    root = soup.body or soup
+    parts = []
+    for node in root.find_all(string=True):
+        if isinstance(node, Comment) or node.parent.name in NON_VISIBLE_TAGS:
+            continue
+        text = node.strip()
+        if text:
+            parts.append(text)
+    return "\n".join(parts)
+
+def text_fingerprint(text: str) -> str:
+    """Hash do texto visível normalizado (caixa e espaços): reflow ou markup novo não contam como mudança."""
+    return hashlib.sha256(" ".join(text.lower().split()).encode()).hexdigest()[:32]
+
+def needs_javascript(html_content: str, soup: "BeautifulSoup", body_text: str) -> Optional[str]:
+    """Heurísticas para decidir se o HTML estático basta. Retorna o motivo da escalada ou None."""
+    text_length = len(body_text.strip())
+    if text_length < STATIC_MIN_TEXT_LENGTH:
+        return f"pouco texto visível ({text_length} caracteres)"
+    if not soup.find("a", href=True):
+        return "nenhum link no HTML"
+    if text_length < STATIC_SPA_TEXT_LENGTH:
+        lowered = html_content.lower()
+        for marker in SPA_ROOT_MARKERS:
+            if marker in lowered:
+                return f"marcador de SPA '{marker}'"
+    return None
+
+def load_user_agents(path: str) -> List[str]:
+    """Um user agent por linha; linhas vazias e comentários (#) são ignorados."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    except OSError as e:
+        logger.warning(f"Lista de user agents indisponível ({path}), usando fallback: {e}")
+        return []
+
+def random_user_agent() -> str:
+    """User Agent rotativo e realista, com fallback fixo."""
+    return random.choice(USER_AGENTS) if USER_AGENTS else FALLBACK_USER_AGENT
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(Exception), reraise=True)
-async def execute_scraping_task(request: ScrapeRequest) -> ScrapeResponse:
-    global BROWSER, PROXY_LIST, UA_GENERATOR
-    
-    context: Optional[BrowserContext] = None
-    page: Optional[Page] = None
-    start_time = time.perf_counter()
+# --- Pipeline de Extração (roda no pool de processos) ---
+# Só tipos nativos entram e saem destas funções: o HTML vai para o worker e volta um dict.
+
+@timed_pipeline
+def extract_page_fields(content_html: str, body_text: Optional[str], plan: List[str], title: Optional[str] = None) -> Dict[str, Any]:
+    """Extração comum aos tiers estático e dinâmico a partir do HTML já obtido."""
+    from bs4 import BeautifulSoup  # import tardio: o bs4 (e o lxml por baixo) só carrega na primeira extração
+
+    with stage("parse"):
+        soup = BeautifulSoup(content_html, 'lxml')
+    return _extract_from_soup(soup, content_html, body_text, plan, title)
+
+@timed_pipeline
+def extract_static_page(content_html: str, plan: List[str], force: bool) -> Dict[str, Any]:
+    """Tier estático: decide se o HTML basta e, se sim (ou se forçado), extrai no mesmo parse."""
+    from bs4 import BeautifulSoup
 
+    with stage("parse"):
+        soup = BeautifulSoup(content_html, 'lxml')
+        body_text = extract_visible_text(soup)
+    escalate_reason = needs_javascript(content_html, soup, body_text)
+    if escalate_reason and not force:
+        # Não gasta a extração completa se o resultado vai ser descartado
+        return {"escalate_reason": escalate_reason, "fields": None}
+    fields = _extract_from_soup(soup, content_html, body_text, plan, None)
+    return {"escalate_reason": escalate_reason, "fields": fields}
+
+@timed_pipeline
+def extract_snapshot_fields(snapshot: Dict[str, Any], plan: List[str]) -> Dict[str, Any]:
+    """Extração sobre o payload do DOM_SNAPSHOT_JS: sem reparse do DOM no Python."""
+    dom = {
+        "anchors": [tuple(anchor) for anchor in snapshot["anchors"]],
+        "scripts": snapshot["scripts"],
+        "metas": snapshot["metas"],
+        "images": snapshot["images"],
+        "icons": snapshot["icons"],
+        "code": snapshot["code"],
+    }
+    fields = fields_from_dom(dom, snapshot["text"], snapshot["title"], plan)
+    if "markdown" in plan and snapshot.get("html"):
+        with stage("markdown"):
+            fields["markdown"] = html_to_markdown(snapshot["html"], "images" in plan)
+    return fields
+
+def _extract_from_soup(soup: "BeautifulSoup", content_html: str, body_text: Optional[str], plan: List[str], title: Optional[str]) -> Dict[str, Any]:
+    fields = extract_signals(soup, body_text, plan, title)
+    if "markdown" in plan:
+        with stage("markdown"):
+            fields["markdown"] = html_to_markdown(content_html, "images" in plan)
+    return fields
+
+@timed_pipeline
+def extract_markdown(content_html: str, extract_images: bool) -> Dict[str, Any]:
+    """Markdown sob demanda (GET /results/{id}/markdown), fora do caminho do scrape."""
+    with stage("markdown"):
+        return {"markdown": html_to_markdown(content_html, extract_images)}
+
+# Conteúdo que nunca vira texto: removido do HTML bruto antes de qualquer parse
+MARKDOWN_STRIP_RE = re.compile(r"<(script|style|noscript|svg|template)\b[^>]*>.*?</\1\s*>|<!--.*?-->|<\?xml[^>]*\?>", re.I | re.S)
+# Subárvores de navegação/formulário: o Trafilatura descartaria de qualquer jeito, depois de processá-las
+MARKDOWN_PRUNE_XPATH = "//nav|//footer|//aside|//form|//iframe|//select|//button"
+
+def truncate_tree(root, budget: int):
+    """Corta o documento logo após o elemento em que o texto acumulado passa do orçamento."""
+    seen = 0
+    for el in root.iter():
+        seen += len(el.text or "") + len(el.tail or "")
+        if seen > budget:
+            node = el
+            while node.getparent() is not None:
+                parent = node.getparent()
+                for sibling in list(node.itersiblings()):
+                    parent.remove(sibling)
+                node = parent
+            return
+
+def html_to_markdown(content_html: str, extract_images: bool) -> str:
+    """Poda antes de extrair: sem scripts/estilos, com teto de tamanho, sem navegação/rodapé e truncado
+    pelo orçamento de texto. A árvore podada vai direto ao Trafilatura (um parse só) e é também o fallback."""
+    # --- EXTRAÇÃO DE MARKDOWN COM TRAFILATURA (State of the Art) ---
+    # Import tardio: o Trafilatura é o módulo mais pesado do boot e só o markdown usa
+    import lxml.html
+    import trafilatura
+
+    html = MARKDOWN_STRIP_RE.sub("", content_html)[:MARKDOWN_MAX_INPUT]
     try:
-        # Proxy Configuration: ALWAYS NONE (no proxy functionality)
-        proxy_config = None
-            
-        logger.info(f"Iniciando navegação para {request.url} | Proxy Config: NULO (funcionalidade removida)")
+        tree = lxml.html.document_fromstring(html)
+    except Exception:
+        return ""
+    for node in tree.xpath(MARKDOWN_PRUNE_XPATH):
+        node.drop_tree()
+    # Folga de 3x: o Trafilatura ainda descarta boilerplate do que sobrar
+    truncate_tree(tree, MARKDOWN_MAX_CHARS * 3)
+    try:
+        markdown_content = trafilatura.extract(tree, output_format='markdown', include_links=True, include_images=extract_images)
+    except Exception:
+        markdown_content = None
+    if not markdown_content:
+        # Fallback simples se Trafilatura não achar "artigo": texto da árvore já podada
+        body = tree.find("body")
+        markdown_content = "\n".join(text.strip() for text in (body if body is not None else tree).itertext() if text.strip())
+    return markdown_content[:MARKDOWN_MAX_CHARS]
+
+def extraction_plan(request: ScrapeRequest) -> List[str]:
+    """Grupos a extrair, decididos antes do scrape: sem `fields`, todos (imagens e markdown conforme os toggles).
+    O crawl sempre precisa dos links para escolher as próximas páginas."""
+    plan = [
+        name for name in (RESPONSE_FIELDS if request.fields is None else request.fields)
+        if (name != "images" or request.extract_images) and (name != "markdown" or request.include_markdown)
+    ]
+    if isinstance(request, CrawlRequest):
+        plan.append("links")
+    if change_mode(request):
+        # Fingerprint precisa do texto; o markdown espera o diff ("html" só guarda a fonte para gerá-lo depois)
+        plan = ["html" if name == "markdown" else name for name in plan] + ["text"]
+    return plan
+
+def extract_signals(soup: "BeautifulSoup", body_text: Optional[str], plan: List[str], title: Optional[str] = None) -> Dict[str, Any]:
+    """Todos os campos exceto markdown: uma travessia do DOM e uma varredura de regex por grupo."""
+    if body_text is None:
+        body_text = ""
+        if any(group in plan for group in TEXT_GROUPS):
+            with stage("parse"):
+                body_text = soup.get_text(separator="\n")
+    if title is None:
+        title = soup.title.get_text(strip=True) if soup.title else ""
+    with stage("dom"):
+        dom = collect_dom(soup, [tag for tag in DOM_TAGS if any(tag in GROUP_TAGS.get(group, ()) for group in plan)])
+    return fields_from_dom(dom, body_text, title, plan)
+
+def fields_from_dom(dom: Dict[str, Any], body_text: str, title: str, plan: List[str]) -> Dict[str, Any]:
+    """Campos da resposta a partir do DOM já coletado (pelo soup ou pelo navegador).
+    As assinaturas de pixel via HTML rodam sobre `dom["code"]` (scripts inline e srcs), não sobre o HTML inteiro.
+    Grupos fora do `plan` saem vazios sem rodar o extrator."""
+    links = {"social": {name: [] for name in SIGNATURES.social_priority}, "whatsapp": [], "buttons": [], "checkouts": set()}
+    if any(group in plan for group in LINK_GROUPS):
+        with stage("links"):
+            links = classify_anchors(dom["anchors"], plan)
+    regex_data = {"emails": [], "phones": [], "cnpj": []}
+    if any(group in plan for group in REGEX_GROUPS):
+        with stage("regex"):
+            regex_data = extract_regex(body_text, plan)
+
+    # Metadados
+    metadata = {
+        "title": title,
+        "description": dom["metas"].get("description", ""),
+        "og_image": dom["metas"].get("og:image", ""),
+    }
 
-        # User Agent Rotativo e Realista
+    # Imagens
+    images_data = Images()
+    if "images" in plan:
+        images_data.other_images = clean_and_deduplicate(dom["images"])[:10] # Limpeza aqui
+        if dom["icons"]:
+            images_data.favicon = dom["icons"][0]
+
+    # Pixels via HTML (o resultado via JS é combinado no build_scrape_response)
+    pixels_html = Pixels()
+    if "pixels" in plan:
+        with stage("pixels"):
+            pixels_html = detect_pixels_html(dom["code"])
+
+    platforms = links["checkouts"] | classify_scripts(dom["scripts"]) if "checkouts" in plan else set()
+    checkouts_data = Checkouts(have_checkouts=len(platforms) > 0, platforms=list(platforms))
+
+    return {
+        # --- LIMPEZA FINAL DE DUPLICATAS ---
+        "emails": clean_and_deduplicate(regex_data["emails"]),
+        "phones": clean_and_deduplicate(regex_data["phones"]),
+        "cnpj": clean_and_deduplicate(regex_data["cnpj"]),
+        "whatsapp": clean_and_deduplicate(links["whatsapp"]),
+        "social_media": {k: clean_and_deduplicate(v) for k, v in links["social"].items()},
+        "metadata": metadata,
+        "images": images_data.model_dump(),
+        "button_links": clean_and_deduplicate(links["buttons"])[:20],
+        "checkouts": checkouts_data.model_dump(),
+        "pixels": pixels_html.model_dump(),
+        "links": dom["anchors"],
+        "markdown": "",
+        "text_hash": text_fingerprint(body_text) if "text" in plan else "",
+    }
+
+async def run_extraction(func, *args):
+    """Executa uma função do pipeline no pool de processos (ou inline se EXTRACTION_WORKERS=-1)."""
+    global EXTRACTION_POOL
+    with stage("extraction"):
+        if EXTRACTION_POOL is None:
+            result = func(*args)
+        else:
+            loop = asyncio.get_running_loop()
+            try:
+                # Workers recarregam o pacote de assinaturas sozinhos quando a versão muda
+                result = await loop.run_in_executor(EXTRACTION_POOL, run_with_signatures, SIGNATURES.version, func, *args)
+            except BrokenProcessPool:
+                # Um worker morreu (OOM, segfault no lxml): recria o pool para as próximas requisições
+                logger.error("Pool de extração quebrado, recriando...")
+                EXTRACTION_POOL = create_extraction_pool()
+                raise
+    for name, seconds in result.pop("timings", {}).items():
+        record_stage(name, seconds)
+    return result
+
+def create_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    workers = EXTRACTION_WORKERS or available_cpus()
+    if workers <= 0:
+        return None
+    # spawn: não herda threads/sockets do Playwright e do event loop
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def build_scrape_response(
+    request: ScrapeRequest,
+    method: str,
+    fields: Dict[str, Any],
+    start_time: float,
+    pixels_js: Optional[Pixels] = None,
+    screenshot_data: Optional[Screenshot] = None,
+    validators: Optional[Dict[str, str]] = None,
+    blocking: Optional[Blocking] = None,
+    source_html: Optional[str] = None,
+) -> ScrapeResponse:
+    """Monta a resposta a partir dos campos extraídos. No tier estático só há pixels via HTML.
+    source_html fica guardado para o markdown sob demanda quando ele não foi gerado inline."""
+    pixels_html = Pixels(**fields["pixels"])
+    pixels_data = merge_pixels(pixels_js, pixels_html) if pixels_js else pixels_html
+
+    end_time = time.perf_counter()
+    total_time = f"{end_time - start_time:.2f}s"
+
+    response = ScrapeResponse(
+        status="success",
+        url=request.url,
+        result_id=uuid.uuid4().hex,
+        method=method,
+        emails=fields["emails"],
+        phones=fields["phones"],
+        cnpj=fields["cnpj"],
+        whatsapp=fields["whatsapp"],
+        social_media=SocialMedia(**fields["social_media"]),
+        metadata=fields["metadata"],
+        images=Images(**fields["images"]),
+        button_links=fields["button_links"],
+        checkouts=Checkouts(**fields["checkouts"]),
+        pixels=pixels_data,
+        screenshot=screenshot_data or Screenshot(),
+        markdown=fields["markdown"],
+        performance=Performance(total_time=total_time, stages=current_stages()),
+        blocking=blocking or Blocking(),
+        fields=request.fields,
+    )
+    response._validators = validators or {}
+    response._links = fields.get("links", [])
+    response._text_hash = fields.get("text_hash", "")
+    if response.markdown:
+        markdown_store_put(response.result_id, {"markdown": response.markdown})
+    elif source_html:
+        markdown_store_put(response.result_id, {"html": source_html, "extract_images": request.extract_images})
+    else:
+        response.result_id = ""  # nada guardado (ex.: browser_extract): o id só responderia 404
+    return response
+
+# --- Tier Estático (aiohttp) ---
+
+META_CHARSET_RE = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([a-zA-Z0-9_.:-]+)", re.I)
+
+def decode_html(raw: bytes, header_charset: Optional[str]) -> str:
+    """Decodifica como o navegador: BOM, charset do Content-Type, <meta charset> no início do documento
+    e, sem declaração, UTF-8 com fallback para Windows-1252 (comum em sites antigos servidos sem charset)."""
+    for bom, encoding in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16")):
+        if raw.startswith(bom):
+            return raw.decode(encoding, errors="replace")
+    match = META_CHARSET_RE.search(raw[:4096])
+    declared = header_charset or (match.group(1).decode("ascii") if match else None)
+    if declared:
         try:
-            user_agent = UA_GENERATOR.random
-        except:
-            user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-        
+            encoding = codecs.lookup(declared).name
+        except LookupError:
+            encoding = None
+        if encoding:
+            # Navegadores tratam latin-1/ascii como Windows-1252 (aspas e travessões em 0x80-0x9F)
+            return raw.decode("cp1252" if encoding in ("iso8859-1", "ascii") else encoding, errors="replace")
+    try:
+        # final=False: um caractere cortado pelo STATIC_MAX_BYTES não derruba o UTF-8
+        return codecs.getincrementaldecoder("utf-8")().decode(raw, final=False)
+    except UnicodeDecodeError:
+        return raw.decode("cp1252", errors="replace")
+
+async def fetch_static_html(request: ScrapeRequest) -> Tuple[str, Dict[str, str]]:
+    """Baixa o HTML bruto via sessão aiohttp compartilhada (sem navegador). Retorna também ETag/Last-Modified."""
+    headers = {
+        "User-Agent": random_user_agent(),
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
+    }
+    timeout = aiohttp.ClientTimeout(total=request.timeout / 1000)
+    async with HTTP_SESSION.get(request.url, headers=headers, timeout=timeout, allow_redirects=True) as resp:
+        if resp.status >= 400:
+            raise HTTPStatusError(resp.status)
+        content_type = resp.headers.get("Content-Type", "").lower()
+        if content_type and "html" not in content_type:
+            raise StaticFetchError(f"Content-Type não suportado: {content_type}")
+        # content.read(n) devolve só o que já está no buffer: lê em blocos até o EOF ou o teto
+        chunks, size = [], 0
+        async for chunk in resp.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= STATIC_MAX_BYTES:
+                break
+        raw = b"".join(chunks)[:STATIC_MAX_BYTES]
+        return decode_html(raw, resp.charset), cache_validators(resp.headers)
+
+async def execute_static_task(request: ScrapeRequest) -> Tuple[Optional[ScrapeResponse], Optional[str]]:
+    """Tier estático: mesma extração do navegador sobre o HTML bruto.
+    Retorna a resposta e o motivo para escalar ao Playwright (None se o HTML basta)."""
+    start_time = time.perf_counter()
+    logger.info(f"Fetch estático para {request.url}")
+
+    with stage("fetch"):
+        content_html, validators = await fetch_static_html(request)
+    extracted = await run_extraction(extract_static_page, content_html, extraction_plan(request), request.mode == "static")
+    if extracted["fields"] is None:
+        return None, extracted["escalate_reason"]
+
+    response = build_scrape_response(request, "static", extracted["fields"], start_time, validators=validators, source_html=content_html)
+    return response, extracted["escalate_reason"]
+
+async def run_scrape(request: ScrapeRequest, dynamic=None, fallback: bool = False) -> ScrapeResponse:
+    """Escolhe o tier: estático primeiro (mode=auto|static), navegador quando necessário.
+    `dynamic` substitui o tier do navegador (o crawl usa o próprio contexto)."""
+    if request.mode != "dynamic":
         try:
-            context = await BROWSER.new_context(
-                user_agent=user_agent,
-                proxy=proxy_config, # Sempre None agora
-                viewport={"width": 1280 + random.randint(0, 100), "height": 720 + random.randint(0, 100)}, # Viewport randomizado
-                locale="pt-BR",
-                timezone_id="America/Sao_Paulo"
-            )
+            response, escalate_reason = await execute_static_task(request)
+            if response is not None:
+                return response
         except Exception as e:
-            logger.warning(f"Falha ao criar contexto, usando configuração padrão: {e}")
-            context = await BROWSER.new_context(user_agent=user_agent)
+            # 404, DNS, certificado: o navegador veria o mesmo erro. Outros 4xx (401/403 de proteção
+            # contra bots, por exemplo) podem ser só com o cliente HTTP, então ainda escalam.
+            client_block = isinstance(e, HTTPStatusError) and e.status not in PERMANENT_HTTP_STATUS
+            if request.mode == "static" or (classify_error(e) == "permanent" and not client_block):
+                e.method = "static"  # a resposta de erro informa o tier que falhou
+                raise
+            escalate_reason = f"falha no fetch estático: {e}"
+        logger.info(f"Escalando {request.url} para o navegador: {escalate_reason}")
+    return await (dynamic or execute_scraping_task)(request, fallback)
+
+# --- Tier Dinâmico (Playwright) ---
+
+async def capture_page(page: Page, request: ScrapeRequest, blocking: BlockStats, fallback: bool = False) -> Dict[str, Any]:
+    """Navega e coleta tudo que depende do navegador. O parse fica para depois, com a página já liberada.
+    fallback (retentativas): não espera o DOMContentLoaded inteiro e não rola a página."""
+    blocking.reset()
+    # Navegação
+    with stage("goto"):
+        if fallback:
+            nav_response = await page.goto(request.url, timeout=request.timeout, wait_until="commit")
+            try:
+                await page.wait_for_load_state("domcontentloaded", timeout=min(5000, request.timeout))
+            except Exception:
+                pass  # segue com o que já foi parseado
+        else:
+            nav_response = await page.goto(request.url, timeout=request.timeout, wait_until="domcontentloaded")
+    if nav_response and (nav_response.status in PERMANENT_HTTP_STATUS or nav_response.status in TRANSIENT_HTTP_STATUS):
+        raise HTTPStatusError(nav_response.status)
+    capture = {"validators": cache_validators(nav_response.headers) if nav_response else {}}
+    if not fallback:
+        with stage("scroll"):
+            await smart_scroll(page, request.scroll, request.scroll_budget_ms)
+
+    # Extração: só os round-trips que o plano pede
+    plan = extraction_plan(request)
+    capture["pixels_js"] = None
+    with stage("content"):
+        if request.browser_extract:
+            # Um round-trip: DOM já classificado, innerText e globais de pixel. HTML só se houver markdown.
+            snapshot = await page.evaluate(
+                DOM_SNAPSHOT_JS, {"plan": plan, "maxHtml": MAX_HTML_BYTES, "pixelGlobals": SIGNATURES.pixel_globals}
+            )
+            capture["snapshot"] = snapshot
+            if snapshot["pixels"] is not None:
+                capture["pixels_js"] = Pixels(have_pixels=any(snapshot["pixels"].values()), pixels=PixelDetail(**snapshot["pixels"]))
+        else:
+            capture["content_html"] = await page.evaluate(PAGE_HTML_JS, MAX_HTML_BYTES)
+            
+            capture["body_text"] = ""  # "" = sem regex no plano; None = fallback para o texto do HTML
+            if any(group in plan for group in TEXT_GROUPS):
+                try:
+                    capture["body_text"] = await page.evaluate("document.body.innerText")
+                except:
+                    capture["body_text"] = None  # fallback para o texto do HTML no pipeline de extração
+
+            capture["title"] = await page.title() if "metadata" in plan else ""
+
+            # Pixels via JS (o HTML é verificado no pipeline de extração)
+            if "pixels" in plan:
+                capture["pixels_js"] = await detect_pixels_js(page)
+
+    # O screenshot é disparado por quem chamou (start_screenshot), depois da coleta
+    capture["screenshot"] = Screenshot()
+    capture["blocking"] = blocking.summary()
+    return capture
+
+SCREENSHOT_ID_RE = re.compile(r"^[0-9a-f]{32}\.(webp|jpeg|png)$")
+
+async def capture_screenshot(page: Page, request: ScrapeRequest) -> bytes:
+    """Page.captureScreenshot via CDP: WebP (que o page.screenshot não oferece), recorte e escala em uma chamada.
+    O recorte parte do topo do documento, independente de onde o Smart Scroll parou."""
+    cdp = await page.context.new_cdp_session(page)
+    try:
+        viewport = page.viewport_size or {"width": 1280, "height": 720}
+        width, height = viewport["width"], viewport["height"]
+        if request.screenshot_full_page:
+            metrics = await cdp.send("Page.getLayoutMetrics")
+            height = min(int(metrics["cssContentSize"]["height"]), SCREENSHOT_MAX_HEIGHT)
+        scale = min(1.0, request.screenshot_width / width) if request.screenshot_width else 1.0
+        params = {
+            "format": request.screenshot_format,
+            "clip": {"x": 0, "y": 0, "width": width, "height": height, "scale": scale},
+            "captureBeyondViewport": True,
+        }
+        if request.screenshot_format != "png":
+            params["quality"] = max(1, min(request.screenshot_quality, 100))
+        result = await cdp.send("Page.captureScreenshot", params)
+    finally:
+        await cdp.detach()
+    return base64.b64decode(result["data"])
+
+def write_screenshot(screenshot_id: str, data: bytes):
+    os.makedirs(SCREENSHOT_DIR, exist_ok=True)
+    with open(os.path.join(SCREENSHOT_DIR, screenshot_id), "wb") as f:
+        f.write(data)
+
+async def store_screenshot(page: Page, request: ScrapeRequest, screenshot_id: str) -> bytes:
+    data = await capture_screenshot(page, request)
+    await asyncio.to_thread(write_screenshot, screenshot_id, data)
+    return data
+
+def start_screenshot(page: Page, request: ScrapeRequest) -> Tuple[asyncio.Task, Screenshot]:
+    """Dispara a captura em segundo plano; a página só volta ao pool quando ela termina.
+    A resposta já sai com o id/URL, e GET /screenshots/{id} espera a captura se ainda estiver rodando."""
+    screenshot_id = f"{uuid.uuid4().hex}.{request.screenshot_format}"
+    task = asyncio.create_task(store_screenshot(page, request, screenshot_id))
+    PENDING_SCREENSHOTS[screenshot_id] = task
+
+    def done(task: asyncio.Task):
+        PENDING_SCREENSHOTS.pop(screenshot_id, None)
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Falha no screenshot de {request.url}: {task.exception()}")
+
+    task.add_done_callback(done)
+    screenshot = Screenshot(
+        id=screenshot_id, url=f"/screenshots/{screenshot_id}", format=request.screenshot_format, timestamp=str(time.time())
+    )
+    return task, screenshot
 
-        # --- INJEÇÃO DE STEALTH AVANÇADO ---
-        await context.add_init_script(ADVANCED_STEALTH_JS)
+async def finish_screenshot(response: ScrapeResponse, task: Optional[asyncio.Task], inline: bool):
+    """screenshot_inline: espera a captura e embute o base64 (comportamento antigo)."""
+    if task is None or not inline:
+        return
+    with stage("screenshot"):
+        try:
+            data = await asyncio.shield(task)
+        except Exception:
+            response.screenshot = Screenshot()
+            return
+    response.screenshot.base64 = base64.b64encode(data).decode("utf-8")
+
+def purge_screenshot_files():
+    if not os.path.isdir(SCREENSHOT_DIR):
+        return
+    cutoff = time.time() - SCREENSHOT_TTL
+    for entry in os.scandir(SCREENSHOT_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+
+async def purge_screenshots():
+    """Remove periodicamente screenshots (SCREENSHOT_TTL) e gravações (RECORDING_TTL) antigos."""
+    while True:
+        await asyncio.to_thread(purge_screenshot_files)
+        await asyncio.to_thread(purge_recording_files)
+        await asyncio.sleep(3600)
+
+async def response_from_capture(request: ScrapeRequest, capture: Dict[str, Any], start_time: float) -> ScrapeResponse:
+    if "snapshot" in capture:
+        fields = await run_extraction(extract_snapshot_fields, capture["snapshot"], extraction_plan(request))
+    else:
+        fields = await run_extraction(extract_page_fields, capture["content_html"], capture["body_text"], extraction_plan(request), capture["title"])
+    return build_scrape_response(
+        request, "dynamic", fields, start_time,
+        pixels_js=capture["pixels_js"], screenshot_data=capture["screenshot"], validators=capture["validators"],
+        blocking=capture["blocking"],
+        source_html=capture["snapshot"].get("html") if "snapshot" in capture else capture["content_html"],
+    )
 
-        page = await context.new_page()
+async def execute_scraping_task(request: ScrapeRequest, fallback: bool = False) -> ScrapeResponse:
+    slot: Optional[PooledPage] = None
+    healthy = False
+    screenshot_task: Optional[asyncio.Task] = None
+    start_time = time.perf_counter()
+    recording = request_recording(request)
+    recording_har = recording is not None and not recording.replay
 
-        # --- BLOQUEIO AGRESSIVO DE RECURSOS ---
-        async def route_handler(route):
-            req_url = route.request.url.lower()
-            resource_type = route.request.resource_type
+    try:
+        logger.info(f"Iniciando navegação para {request.url} | Proxy Config: NULO (funcionalidade removida)")
 
-            if resource_type in BLOCKED_RESOURCE_TYPES:
-                await route.abort()
-                return
-            
-            if not request.take_screenshot and resource_type == "stylesheet":
-                await route.abort()
-                return
+        with stage("context"):
+            slot = await acquire_page(pool_key(request), recording)
+        capture = await capture_page(slot.page, request, slot.blocking, fallback)
+        healthy = True
+        if request.take_screenshot and not unchanged_text(request, capture):
+            screenshot_task, capture["screenshot"] = start_screenshot(slot.page, request)
+    except Exception as e:
+        if recording_har:
+            # Páginas lentas/quebradas são justamente as que valem gravar: o HAR e o trace ficam com o erro
+            if slot:
+                await release_page(slot, healthy=False)
+                slot = None
+            await asyncio.to_thread(write_trace, recording, request, None, str(e))
+            logger.info(f"Gravação {recording.id} de {request.url} guardada com a falha.")
+        raise
+    finally:
+        if slot and not (recording_har and healthy): schedule_release(slot, healthy, after=screenshot_task)
+
+    if recording_har:
+        # O HAR só é escrito quando o contexto fecha: a resposta sai com a gravação já completa
+        if screenshot_task: await asyncio.gather(screenshot_task, return_exceptions=True)
+        await release_page(slot, healthy)
+
+    # A página já voltou ao pool (ou está só no screenshot): o parse roda fora do event loop sem segurar o navegador
+    response = await response_from_capture(request, capture, start_time)
+    await finish_screenshot(response, screenshot_task, request.screenshot_inline)
+    if recording:
+        response.recording = recording.id
+    if recording_har:
+        await asyncio.to_thread(write_trace, recording, request, response)
+    return response
+
+# --- Gravação e Replay (HAR + trace por etapa) ---
+
+class RecordingNotFoundError(Exception):
+    """replay aponta para uma gravação que não existe (ou expirou)."""
+
+class Recording:
+    """Uma gravação: HAR da navegação (zip com os corpos das respostas) e trace JSON com o tempo de cada etapa.
+    No replay o mesmo HAR responde às requisições da página, e o que não foi gravado é abortado."""
+
+    def __init__(self, recording_id: str, replay: bool = False):
+        self.id = recording_id
+        self.replay = replay
+        self.har_path = os.path.join(RECORDINGS_DIR, f"{recording_id}.har.zip")
+        self.trace_path = os.path.join(RECORDINGS_DIR, f"{recording_id}.json")
+
+def request_recording(request: ScrapeRequest) -> Optional[Recording]:
+    """Gravação usada pela tentativa: uma nova a cada tentativa com record, a pedida no replay."""
+    if request.replay:
+        recording = Recording(request.replay, replay=True)
+        if not os.path.exists(recording.har_path):
+            raise RecordingNotFoundError(f"Gravação {request.replay} não encontrada")
+        return recording
+    if request.record:
+        os.makedirs(RECORDINGS_DIR, exist_ok=True)
+        return Recording(uuid.uuid4().hex)
+    return None
+
+async def create_recording_page(shard: BrowserShard, key: str, recording: Recording) -> PooledPage:
+    if recording.replay:
+        slot = await create_pooled_page(shard, key)
+        # Registrado depois do bloqueio, então responde antes dele: nenhuma requisição sai para a rede
+        await slot.page.route_from_har(recording.har_path, not_found="abort")
+    else:
+        slot = await create_pooled_page(shard, key, record_har_path=recording.har_path)
+    slot.recording = recording
+    return slot
+
+def write_trace(recording: Recording, request: ScrapeRequest, response: Optional[ScrapeResponse], error: Optional[str] = None):
+    """Trace da gravação: requisição, tempo por etapa e bloqueio. As timings de rede ficam no próprio HAR."""
+    trace = {
+        "id": recording.id,
+        "url": request.url,
+        "created_at": time.time(),
+        "status": response.status if response else "error",
+        "error": error,
+        "request": request.model_dump(exclude={"record", "replay"}),
+        "total_time": response.performance.total_time if response else None,
+        "stages": response.performance.stages if response else current_stages(),
+        "blocking": response.blocking.model_dump() if response else None,
+        "har_bytes": os.path.getsize(recording.har_path) if os.path.exists(recording.har_path) else 0,
+    }
+    with open(recording.trace_path, "w") as f:
+        json.dump(trace, f)
 
-            if any(pattern in req_url for pattern in BLOCKED_URL_PATTERNS):
-                await route.abort()
-                return
+def read_trace(recording_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(RECORDINGS_DIR, f"{recording_id}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-            await route.continue_()
+def list_recordings() -> List[Dict[str, Any]]:
+    if not os.path.isdir(RECORDINGS_DIR):
+        return []
+    traces = []
+    for entry in os.scandir(RECORDINGS_DIR):
+        name = entry.name.removesuffix(".json")
+        if entry.name.endswith(".json") and RECORDING_ID_RE.match(name):
+            trace = read_trace(name)
+            if trace:
+                traces.append({key: trace.get(key) for key in ("id", "url", "created_at", "status", "total_time")})
+    return sorted(traces, key=lambda trace: trace["created_at"] or 0, reverse=True)
+
+def delete_recording(recording_id: str) -> bool:
+    recording = Recording(recording_id)
+    removed = False
+    for path in (recording.har_path, recording.trace_path):
+        if os.path.exists(path):
+            os.remove(path)
+            removed = True
+    return removed
+
+def purge_recording_files():
+    if not os.path.isdir(RECORDINGS_DIR):
+        return
+    cutoff = time.time() - RECORDING_TTL
+    for entry in os.scandir(RECORDINGS_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+
+# --- Cache de Resultados (LRU em memória + Redis/SQLite opcionais) ---
+
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+
+def normalize_url(url: str) -> str:
+    """Mesma página, mesma chave: host minúsculo, sem porta padrão, fragmento ou parâmetros de tracking."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, netloc, parts.path or "/", urlencode(query), ""))
+
+def cache_key(request: ScrapeRequest) -> str:
+    """Hash da URL normalizada + opções que mudam o conteúdo da resposta."""
+    parts = [
+        normalize_url(request.url),
+        request.mode,  # static e dynamic da mesma URL não se confundem
+        request.scroll,
+        request.scroll_budget_ms,
+        request.block_profile,
+        request.extract_images,
+        request.take_screenshot,
+        request.include_markdown,
+        request.browser_extract,
+        SIGNATURES.version,  # pacote novo pode detectar o que o resultado guardado não viu
+    ]
+    if request.fields is not None:
+        parts.append(sorted(request.fields))
+    if request.take_screenshot:
+        parts += [request.screenshot_format, request.screenshot_width, request.screenshot_full_page, request.screenshot_inline]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+def cache_validators(headers) -> Dict[str, str]:
+    validators = {}
+    if headers.get("etag"):
+        validators["etag"] = headers.get("etag")
+    if headers.get("last-modified"):
+        validators["last_modified"] = headers.get("last-modified")
+    return validators
+
+def cache_db_init():
+    global CACHE_DB
+    if not CACHE_DB_PATH:
+        return
+    os.makedirs(os.path.dirname(CACHE_DB_PATH) or ".", exist_ok=True)
+    CACHE_DB = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+    CACHE_DB.execute("PRAGMA journal_mode=WAL")
+    CACHE_DB.execute("""
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            stored_at REAL NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            response TEXT NOT NULL
+        )
+    """)
+    CACHE_DB.commit()
+    purge_cache_rows()
+
+def purge_cache_rows() -> int:
+    """Tira do disco entradas velhas demais até para revalidação (CACHE_STALE_TTL) e, acima de
+    CACHE_DB_MAX_ENTRIES, as gravadas/revalidadas há mais tempo. Retorna quantas saíram."""
+    with CACHE_DB_LOCK:
+        removed = CACHE_DB.execute("DELETE FROM cache WHERE stored_at < ?", (time.time() - CACHE_STALE_TTL,)).rowcount
+        removed += CACHE_DB.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (CACHE_DB_MAX_ENTRIES,)
+        ).rowcount
+        CACHE_DB.commit()
+        return removed
+
+async def purge_cache():
+    """Mantém o tier em disco limitado enquanto o serviço roda."""
+    while True:
+        await asyncio.sleep(CACHE_PURGE_INTERVAL)
+        CACHE_STATS["evictions"] += await asyncio.to_thread(purge_cache_rows)
+
+def cache_db_execute(sql: str, params: tuple = ()) -> List[tuple]:
+    """Executa uma instrução no cache em disco (chamar via asyncio.to_thread)."""
+    with CACHE_DB_LOCK:
+        rows = CACHE_DB.execute(sql, params).fetchall()
+        CACHE_DB.commit()
+        return rows
+
+def cache_memory_put(key: str, entry: Dict[str, Any]):
+    CACHE_MEMORY[key] = entry
+    CACHE_MEMORY.move_to_end(key)
+    while len(CACHE_MEMORY) > CACHE_MAX_ENTRIES:
+        CACHE_MEMORY.popitem(last=False)
+        CACHE_STATS["evictions"] += 1
+
+async def cache_get(key: str) -> Optional[Dict[str, Any]]:
+    entry = CACHE_MEMORY.get(key)
+    if entry is not None:
+        CACHE_MEMORY.move_to_end(key)
+        return entry
+    if CLUSTER:
+        entry = await CLUSTER.cache_get(key)
+        if entry is not None:
+            cache_memory_put(key, entry)
+            return entry
+    if CACHE_DB is None:
+        return None
+    rows = await asyncio.to_thread(
+        cache_db_execute, "SELECT stored_at, etag, last_modified, response FROM cache WHERE key = ?", (key,)
+    )
+    if not rows:
+        return None
+    stored_at, etag, last_modified, response = rows[0]
+    entry = {"stored_at": stored_at, "etag": etag, "last_modified": last_modified, "response": response}
+    cache_memory_put(key, entry)  # promove para a memória
+    return entry
+
+async def cache_put(key: str, response: ScrapeResponse):
+    entry = {
+        "stored_at": time.time(),
+        "etag": response._validators.get("etag"),
+        "last_modified": response._validators.get("last_modified"),
+        "response": response.model_dump_json(),
+    }
+    cache_memory_put(key, entry)
+    CACHE_STATS["stores"] += 1
+    if CLUSTER:
+        await CLUSTER.cache_put(key, entry)
+    if CACHE_DB is not None:
+        await asyncio.to_thread(
+            cache_db_execute,
+            "INSERT OR REPLACE INTO cache (key, stored_at, etag, last_modified, response) VALUES (?, ?, ?, ?, ?)",
+            (key, entry["stored_at"], entry["etag"], entry["last_modified"], entry["response"])
+        )
 
-        await page.route("**/*", route_handler)
+async def cache_touch(key: str, entry: Dict[str, Any]):
+    """Revalidação bem-sucedida: a entrada volta a ser fresca."""
+    entry["stored_at"] = time.time()
+    if CLUSTER:
+        await CLUSTER.cache_put(key, entry)
+    if CACHE_DB is not None:
+        await asyncio.to_thread(cache_db_execute, "UPDATE cache SET stored_at = ? WHERE key = ?", (entry["stored_at"], key))
+
+async def revalidate(url: str, entry: Dict[str, Any]) -> bool:
+    """GET condicional (If-None-Match / If-Modified-Since): 304 significa que o resultado guardado vale."""
+    headers = {"User-Agent": random_user_agent()}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        async with HTTP_SESSION.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10), allow_redirects=True) as resp:
+            return resp.status == 304
+    except Exception as e:
+        logger.info(f"Revalidação falhou para {url}: {e}")
+        return False
+
+async def cached_response(request: ScrapeRequest, key: str) -> Optional[ScrapeResponse]:
+    """Resposta do cache se ainda fresca (ou revalidada na origem). None = precisa rodar o scrape."""
+    if not CACHE_ENABLED or request.force_refresh:
+        return None
+    entry = await cache_get(key)
+    if entry is None:
+        CACHE_STATS["misses"] += 1
+        return None
+
+    response = ScrapeResponse.model_validate_json(entry["response"])
+    if request.mode != "auto" and response.method != request.mode:
+        # Tier forçado só aceita resultado do próprio tier
+        CACHE_STATS["misses"] += 1
+        return None
+
+    max_age = CACHE_TTL if request.max_age is None else request.max_age
+    cache_status = "hit"
+    if time.time() - entry["stored_at"] > max_age:
+        if not (entry.get("etag") or entry.get("last_modified")) or not await revalidate(request.url, entry):
+            CACHE_STATS["misses"] += 1
+            return None
+        await cache_touch(key, entry)
+        CACHE_STATS["revalidated"] += 1
+        cache_status = "revalidated"
+    else:
+        CACHE_STATS["hits"] += 1
+
+    response.cache = cache_status
+    if response.screenshot.id and time.time() - float(response.screenshot.timestamp or 0) > SCREENSHOT_TTL:
+        # Entrada revalidada por mais tempo que o arquivo do screenshot vive: a URL já não responde
+        response.screenshot = Screenshot()
+    restore_markdown_entry(response)
+    return response
+
+# --- Markdown sob Demanda ---
+
+def markdown_store_put(result_id: str, entry: Dict[str, Any]):
+    """LRU limitado por MARKDOWN_STORE_MB: guarda o HTML de origem (ou o markdown já gerado) por result_id."""
+    global MARKDOWN_STORE_BYTES
+    entry["size"] = len(entry.get("html", "")) + len(entry.get("markdown", "")) + 32 * len(entry.get("parts", []))
+    previous = MARKDOWN_STORE.pop(result_id, None)
+    if previous:
+        MARKDOWN_STORE_BYTES -= previous["size"]
+    MARKDOWN_STORE[result_id] = entry
+    MARKDOWN_STORE_BYTES += entry["size"]
+    while MARKDOWN_STORE and MARKDOWN_STORE_BYTES > MARKDOWN_STORE_MB * 1024 * 1024:
+        _, evicted = MARKDOWN_STORE.popitem(last=False)
+        MARKDOWN_STORE_BYTES -= evicted["size"]
+
+def restore_markdown_entry(response: ScrapeResponse):
+    """Hit de cache: o result_id guardado só vale se GET /results/{id}/markdown ainda responde por ele.
+    Markdown inline é registrado de novo; sem ele (e sem o HTML, que não vai para o cache) o id sai da resposta."""
+    if not response.result_id or response.result_id in MARKDOWN_STORE:
+        return
+    if response.markdown:
+        markdown_store_put(response.result_id, {"markdown": response.markdown})
+    else:
+        response.result_id = ""
+
+async def markdown_for(result_id: str) -> Optional[str]:
+    """Markdown de um resultado, gerado no pool de extração na primeira leitura e guardado no lugar do HTML."""
+    entry = MARKDOWN_STORE.get(result_id)
+    if entry is None:
+        return None
+    MARKDOWN_STORE.move_to_end(result_id)
+    if "markdown" in entry:
+        return entry["markdown"]
+    if "parts" in entry:
+        parts = [await markdown_for(part) for part in entry["parts"]]
+        markdown = "\n\n---\n\n".join(part for part in parts if part)[:MARKDOWN_MAX_CHARS]
+    else:
+        markdown = (await run_extraction(extract_markdown, entry["html"], entry["extract_images"]))["markdown"]
+    markdown_store_put(result_id, {"markdown": markdown})
+    return markdown
+
+# --- Detecção de Mudança (fingerprints por URL) ---
+
+# Seções fora do fingerprint: mudam a cada captura (screenshot) ou derivam do texto (markdown)
+CHANGE_EXCLUDED = ("screenshot", "markdown")
+
+def change_mode(request: ScrapeRequest) -> bool:
+    return request.if_changed or request.since is not None
+
+def change_sections(request: ScrapeRequest) -> List[str]:
+    return [name for name in extraction_plan(request) if name in RESPONSE_FIELDS and name not in CHANGE_EXCLUDED]
+
+def fingerprint_key(request: ScrapeRequest) -> str:
+    """URL normalizada + seções comparadas: pedidos com `fields` diferentes têm referências separadas."""
+    parts = [normalize_url(request.url), sorted(change_sections(request)), isinstance(request, CrawlRequest)]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+def section_items(value: Any, prefix: str = "") -> set:
+    """Itens comparáveis de uma seção: valores de listas, flags verdadeiras e pares chave/valor."""
+    if isinstance(value, dict):
+        return set().union(*(section_items(item, f"{prefix}{key}:") for key, item in value.items()))
+    if isinstance(value, list):
+        return {f"{prefix}{item}" for item in value}
+    if isinstance(value, bool):
+        return {prefix.rstrip(":")} if value else set()
+    return {f"{prefix}{value}"} if value not in ("", None) else set()
+
+def diff_sections(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Dict[str, List[str]]]:
+    changes = {}
+    for name, value in new.items():
+        before, after = section_items(old.get(name)), section_items(value)
+        if before != after:
+            changes[name] = {"added": sorted(after - before), "removed": sorted(before - after)}
+    return changes
+
+def fingerprint_db_init():
+    global FINGERPRINT_DB
+    os.makedirs(os.path.dirname(FINGERPRINT_DB_PATH) or ".", exist_ok=True)
+    FINGERPRINT_DB = sqlite3.connect(FINGERPRINT_DB_PATH, check_same_thread=False)
+    FINGERPRINT_DB.execute("PRAGMA journal_mode=WAL")
+    FINGERPRINT_DB.execute("""
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            key TEXT PRIMARY KEY,
+            updated_at REAL NOT NULL,
+            entry TEXT NOT NULL
+        )
+    """)
+    FINGERPRINT_DB.execute("DELETE FROM fingerprints WHERE updated_at < ?", (time.time() - FINGERPRINT_TTL,))
+    FINGERPRINT_DB.commit()
+
+def fingerprint_db_execute(sql: str, params: tuple = ()) -> List[tuple]:
+    """Executa uma instrução no banco de fingerprints (chamar via asyncio.to_thread)."""
+    with FINGERPRINT_DB_LOCK:
+        rows = FINGERPRINT_DB.execute(sql, params).fetchall()
+        FINGERPRINT_DB.commit()
+        return rows
+
+async def fingerprint_get(key: str) -> Optional[Dict[str, Any]]:
+    if CLUSTER:
+        return await CLUSTER.fingerprint_get(key)
+    if FINGERPRINT_DB is None:
+        return None
+    rows = await asyncio.to_thread(fingerprint_db_execute, "SELECT entry FROM fingerprints WHERE key = ?", (key,))
+    return json.loads(rows[0][0]) if rows else None
+
+async def fingerprint_put(key: str, entry: Dict[str, Any]):
+    if CLUSTER:
+        await CLUSTER.fingerprint_put(key, entry)
+    elif FINGERPRINT_DB is not None:
+        await asyncio.to_thread(
+            fingerprint_db_execute,
+            "INSERT OR REPLACE INTO fingerprints (key, updated_at, entry) VALUES (?, ?, ?)",
+            (key, time.time(), json.dumps(entry))
+        )
 
-        # Navegação
-        await page.goto(request.url, timeout=request.timeout, wait_until="domcontentloaded")
-        await smart_scroll(page)
+async def load_baseline(request: ScrapeRequest) -> Optional[Dict[str, Any]]:
+    """Referência da URL. Com `since`, só vale se for a versão que o cliente tem (senão a resposta sai completa)."""
+    entry = await fingerprint_get(fingerprint_key(request))
+    if entry is None or (request.since is not None and entry["fingerprint"] != request.since):
+        return None
+    return entry
+
+def unchanged_text(request: ScrapeRequest, capture: Dict[str, Any]) -> bool:
+    """Texto visível igual ao da referência: o screenshot não é capturado."""
+    if not request._baseline:
+        return False
+    text = capture["snapshot"]["text"] if "snapshot" in capture else capture.get("body_text")
+    return bool(text) and text_fingerprint(text) == request._baseline["text_hash"]
+
+async def unchanged_by_validators(request: ScrapeRequest, baseline: Dict[str, Any]) -> Optional[ScrapeResponse]:
+    """A origem responde 304 ao GET condicional com o ETag/Last-Modified da referência: nem navega."""
+    start_time = time.perf_counter()
+    if not (baseline.get("etag") or baseline.get("last_modified")) or not await revalidate(request.url, baseline):
+        return None
+    return ScrapeResponse(
+        status="success", url=request.url, method="static", cache="revalidated",
+        performance=Performance(total_time=f"{time.perf_counter() - start_time:.2f}s"),
+        fingerprint=baseline["fingerprint"], change="unchanged", fields=[],
+    )
 
-        # Extração
-        content_html = await page.content()
-        soup = BeautifulSoup(content_html, 'lxml')
-        
+async def apply_change_detection(request: ScrapeRequest, response: ScrapeResponse, baseline: Optional[Dict[str, Any]]):
+    """Calcula o fingerprint, guarda como nova referência e reduz a resposta ao que mudou.
+    O markdown pedido só é gerado aqui, se o texto mudou."""
+    sections = response.model_dump(mode="json", include=set(change_sections(request)))
+    response.fingerprint = hashlib.sha256(
+        (response._text_hash + json.dumps(sections, sort_keys=True)).encode()
+    ).hexdigest()[:32]
+    await fingerprint_put(fingerprint_key(request), {
+        "fingerprint": response.fingerprint,
+        "text_hash": response._text_hash,
+        "sections": sections,
+        "etag": response._validators.get("etag"),
+        "last_modified": response._validators.get("last_modified"),
+    })
+
+    if baseline is not None and baseline["fingerprint"] == response.fingerprint:
+        response.change = "unchanged"
+        response.fields = []
+        return
+    text_changed = baseline is None or baseline["text_hash"] != response._text_hash
+    if request.include_markdown and text_changed:
+        response.markdown = await markdown_for(response.result_id) or ""
+    if baseline is None:
+        response.change = "new"
+        return
+    response.change = "changed"
+    response.changes = diff_sections(baseline["sections"], sections)
+    response.fields = [
+        *response.changes,
+        *(["markdown"] if request.include_markdown and text_changed else []),
+        *(["screenshot"] if response.screenshot.id else []),
+    ]
+
+# --- Política de Retentativa (taxonomia de erros + circuit breaker por host) ---
+
+# Falhas que não mudam ao repetir: DNS, certificado, URL inválida
+PERMANENT_ERROR_MARKERS = (
+    "ERR_NAME_NOT_RESOLVED", "ERR_NAME_RESOLUTION_FAILED", "ERR_CERT_", "ERR_SSL_",
+    "ERR_INVALID_URL", "ERR_UNKNOWN_URL_SCHEME", "ERR_BAD_SSL_CLIENT_AUTH_CERT",
+    "Name or service not known", "nodename nor servname", "No address associated",
+    "CERTIFICATE_VERIFY_FAILED",
+)
+PERMANENT_HTTP_STATUS = {404, 410}
+TRANSIENT_HTTP_STATUS = {429, 500, 502, 503, 504}
+
+class HTTPStatusError(Exception):
+    """A origem respondeu com um status que invalida o resultado (tiers estático e dinâmico)."""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+class CircuitOpenError(Exception):
+    """Host com falhas consecutivas demais: a requisição falha sem ocupar slot."""
+
+def classify_error(exc: Exception) -> str:
+    """permanent (não retenta), timeout (uma retentativa, estratégia barata) ou transient (retenta com backoff)."""
+    if isinstance(exc, (CircuitOpenError, RecordingNotFoundError)):
+        return "permanent"
+    if isinstance(exc, HTTPStatusError):
+        # Só 429 e 5xx podem mudar na próxima vez; qualquer outro 4xx (400, 401, 403, 404...) se repete igual
+        return "transient" if exc.status == 429 or exc.status >= 500 else "permanent"
+    if isinstance(exc, (PlaywrightTimeoutError, asyncio.TimeoutError, aiohttp.ServerTimeoutError)):
+        return "timeout"
+    if isinstance(exc, (aiohttp.ClientConnectorCertificateError, aiohttp.ClientSSLError, aiohttp.InvalidURL)):
+        return "permanent"
+    message = str(exc)
+    if any(marker in message for marker in PERMANENT_ERROR_MARKERS):
+        return "permanent"
+    if "Timeout" in message and "exceeded" in message:
+        return "timeout"
+    return "transient"
+
+def is_host_failure(exc: Exception) -> bool:
+    """Só falhas do host contam para o circuit breaker (um 404 é problema da URL, não do site)."""
+    if isinstance(exc, HTTPStatusError):
+        return exc.status >= 500 or exc.status == 429
+    return not isinstance(exc, (CircuitOpenError, StaticFetchError, RecordingNotFoundError))
+
+def backoff_delay(attempt: int) -> float:
+    """Backoff exponencial com full jitter."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+class CircuitBreaker:
+    """Aberto após CIRCUIT_FAILURE_THRESHOLD falhas seguidas; depois de CIRCUIT_OPEN_SECONDS
+    deixa passar uma requisição de teste (half-open) que fecha ou reabre o circuito."""
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at < CIRCUIT_OPEN_SECONDS or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+            if self.opened_at is None:
+                ERROR_STATS["circuit_opened"] += 1
+            self.opened_at = time.monotonic()
+
+def host_circuit(url: str) -> CircuitBreaker:
+    host = (urlsplit(url).hostname or "").lower()
+    if host not in HOST_CIRCUITS:
+        if len(HOST_CIRCUITS) >= CIRCUIT_MAX_HOSTS:
+            # Só hosts com falhas recentes precisam de estado
+            for known in [known for known, circuit in HOST_CIRCUITS.items() if not circuit.failures]:
+                del HOST_CIRCUITS[known]
+        HOST_CIRCUITS[host] = CircuitBreaker()
+    return HOST_CIRCUITS[host]
+
+async def scrape_with_retries(request: ScrapeRequest, dynamic=None) -> ScrapeResponse:
+    """Roda o scrape com um slot do scheduler, retentando só o que pode dar certo na próxima vez.
+    O slot é devolvido durante o backoff; as retentativas usam wait_until=commit e sem scroll."""
+    circuit = host_circuit(request.url)
+    attempt = 1
+    while True:
+        if not circuit.allow():
+            ERROR_STATS["circuit_rejected"] += 1
+            raise CircuitOpenError(f"Circuito aberto para {urlsplit(request.url).hostname} após falhas consecutivas")
         try:
-            body_text = await page.evaluate("document.body.innerText")
-        except:
-            body_text = soup.get_text(separator="\n")
-
-        regex_data = extract_regex(body_text)
-        
-        # Metadados
-        title = await page.title()
-        desc_tag = soup.find("meta", attrs={"name": "description"})
-        description = desc_tag["content"] if desc_tag else ""
-        og_image_tag = soup.find("meta", property="og:image")
-        og_image = og_image_tag["content"] if og_image_tag else ""
-
-        # Redes Sociais & Links
-        social_links = {"linkedin": [], "facebook": [], "instagram": [], "youtube": [], "twitter": []}
-        whatsapp_links = []
-        whatsapp_seen_numbers = set() # Para evitar duplicatas de números
-        button_links = []
-
-        for a in soup.find_all("a", href=True):
-            href = a['href'].lower()
-            original_href = a['href'] # Mantém case original para o link final
-            txt = a.get_text(strip=True)
-            
-            if "linkedin.com" in href: social_links["linkedin"].append(href)
-            elif "facebook.com" in href: social_links["facebook"].append(href)
-            elif "instagram.com" in href: social_links["instagram"].append(href)
-            elif "youtube.com" in href: social_links["youtube"].append(href)
-            elif "twitter.com" in href or "x.com" in href: social_links["twitter"].append(href)
-            
-            # Lógica otimizada para WhatsApp
-            if "wa.me" in href or "api.whatsapp.com" in href or "web.whatsapp.com" in href:
-                # Tenta extrair o número para usar como chave única
-                phone_match = re.search(r'phone=(\d+)', original_href) or re.search(r'wa\.me/(\d+)', original_href)
-                
-                if phone_match:
-                    number = phone_match.group(1)
-                    if number not in whatsapp_seen_numbers:
-                        whatsapp_seen_numbers.add(number)
-                        whatsapp_links.append(original_href)
-                else:
-                    # Se não achar número (link genérico), adiciona se a URL exata não existir
-                    if original_href not in whatsapp_links:
-                        whatsapp_links.append(original_href)
-
-            if txt: button_links.append(original_href)
-
-        # Imagens
-        images_data = Images()
-        if request.extract_images:
-            imgs = [img['src'] for img in soup.find_all('img', src=True)]
-            images_data.other_images = clean_and_deduplicate(imgs)[:10] # Limpeza aqui
-            icon_link = soup.find("link", rel="icon") or soup.find("link", rel="shortcut icon")
-            if icon_link and icon_link.get("href"):
-                images_data.favicon = icon_link["href"]
-
-        # Pixels (Híbrido: JS + HTML Regex)
-        pixels_js = await detect_pixels_js(page)
-        pixels_html = detect_pixels_html(content_html)
-        
-        # Merge dos resultados (OR bit a bit lógico)
-        merged_pixels = PixelDetail(
-            facebook=pixels_js.pixels.facebook or pixels_html.pixels.facebook,
-            google_analytics=pixels_js.pixels.google_analytics or pixels_html.pixels.google_analytics,
-            google_ads=pixels_js.pixels.google_ads or pixels_html.pixels.google_ads,
-            tiktok=pixels_js.pixels.tiktok or pixels_html.pixels.tiktok,
-            pinterest=pixels_js.pixels.pinterest or pixels_html.pixels.pinterest,
-            twitter=pixels_js.pixels.twitter or pixels_html.pixels.twitter,
-            linkedin=pixels_js.pixels.linkedin or pixels_html.pixels.linkedin,
-            snapchat=pixels_js.pixels.snapchat or pixels_html.pixels.snapchat,
-            taboola=pixels_js.pixels.taboola or pixels_html.pixels.taboola,
-            outbrain=pixels_js.pixels.outbrain or pixels_html.pixels.outbrain
-        )
-        
-        pixels_data = Pixels(
-            have_pixels=pixels_js.have_pixels or pixels_html.have_pixels,
-            pixels=merged_pixels
+            async with acquire_slot(request.url):
+                result = await run_scrape(request, dynamic=dynamic, fallback=attempt > 1)
+            circuit.record_success()
+            return result
+        except asyncio.CancelledError:
+            circuit.probing = False
+            raise
+        except Exception as e:
+            error = e
+        if is_host_failure(error):
+            circuit.record_failure()
+        else:
+            circuit.record_success()  # o host respondeu; o problema é da URL
+
+        kind = classify_error(error)
+        ERROR_STATS[kind] += 1
+        max_attempts = {"permanent": 1, "timeout": min(2, RETRY_ATTEMPTS), "transient": RETRY_ATTEMPTS}[kind]
+        if attempt >= max_attempts:
+            raise error
+        delay = backoff_delay(attempt)
+        logger.info(f"Falha {kind} em {request.url} (tentativa {attempt}): {error}. Nova tentativa em {delay:.1f}s")
+        ERROR_STATS["retries"] += 1
+        attempt += 1
+        await asyncio.sleep(delay)
+
+# --- Scheduler (fila justa por host + concorrência adaptativa) ---
+
+class HostState:
+    """Token bucket e fila de espera de um host. A taxa cai pela metade a cada 429 e se recupera aos poucos.
+    limited=False (replay, que não acessa host nenhum): sem bucket nem teto por host, só o limite global."""
+
+    def __init__(self, limited: bool = True):
+        self.limited = limited
+        self.rate = SCHEDULER_HOST_RATE
+        self.tokens = float(SCHEDULER_HOST_BURST)
+        self.updated = time.monotonic()
+        self.active = 0
+        self.waiters: deque = deque()
+
+    def refill(self, now: float):
+        self.tokens = min(SCHEDULER_HOST_BURST, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take_token(self, now: float) -> float:
+        """Consome um token e retorna 0, ou retorna quantos segundos faltam para o próximo."""
+        if not self.limited:
+            return 0.0
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def idle(self) -> bool:
+        return not self.active and not self.waiters and (not self.limited or self.tokens >= SCHEDULER_HOST_BURST)
+
+class Scheduler:
+    """Limite de concorrência do serviço. Cada host tem token bucket e teto de concorrência próprios; os slots
+    livres são distribuídos em round-robin entre os hosts com fila, então um host lento não ocupa tudo.
+    O limite global segue AIMD: +1/limite por sucesso rápido, x0.7 em timeout/falha transitória ou
+    latência acima de SCHEDULER_LATENCY_TARGET (no máximo uma redução por SCHEDULER_DECREASE_COOLDOWN)."""
+
+    def __init__(self):
+        self.limit = float(min(max(MAX_CONCURRENCY, SCHEDULER_MIN_CONCURRENCY), SCHEDULER_MAX_CONCURRENCY))
+        self.active = 0
+        self.waiting = 0
+        self.hosts: Dict[str, HostState] = {}
+        self.ready: deque = deque()  # hosts com requisições esperando, na ordem do round-robin
+        self.last_decrease = 0.0
+        self.memory_factor = 1.0  # reduzido pelo MemoryGuard sob pressão de memória
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at = 0.0
+
+    def capacity(self) -> int:
+        return max(SCHEDULER_MIN_CONCURRENCY, int(self.limit * self.memory_factor))
+
+    def set_memory_factor(self, factor: float):
+        self.memory_factor = factor
+        self._dispatch()  # se a pressão caiu, entrega os slots liberados
+
+    async def acquire(self, host: str, limited: bool = True):
+        state = self.hosts.get(host)
+        if state is None:
+            if len(self.hosts) >= SCHEDULER_MAX_HOSTS:
+                self._prune()
+            state = self.hosts[host] = HostState(limited)
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.append(waiter)
+        if host not in self.ready:
+            self.ready.append(host)
+        self.waiting += 1
+        try:
+            self._dispatch()
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # O slot chegou junto com o cancelamento: devolve para o próximo, sem sinal para o AIMD
+                self.release(host, 0.0, None, adapt=False)
+            raise
+        finally:
+            self.waiting -= 1
+
+    def release(self, host: str, latency: float, error: Optional[Exception], adapt: bool = True):
+        """Devolve o slot. adapt=False (execução cancelada ou que nem começou) não conta como sucesso nem falha."""
+        state = self.hosts[host]
+        state.active -= 1
+        self.active -= 1
+        if adapt:
+            self._adapt(state, latency, error)
+        if state.idle():
+            del self.hosts[host]
+        self._dispatch()
+
+    def _adapt(self, state: HostState, latency: float, error: Optional[Exception]):
+        now = time.monotonic()
+        if isinstance(error, HTTPStatusError) and error.status == 429:
+            state.rate = max(SCHEDULER_HOST_RATE / 16, state.rate / 2)
+            logger.info(f"Scheduler: 429 recebido, taxa do host reduzida para {state.rate:.2f} req/s")
+            return
+        overloaded = latency > SCHEDULER_LATENCY_TARGET or (
+            error is not None and not isinstance(error, HTTPStatusError) and classify_error(error) in ("timeout", "transient")
         )
+        if overloaded:
+            if now - self.last_decrease >= SCHEDULER_DECREASE_COOLDOWN:
+                self.limit = max(float(SCHEDULER_MIN_CONCURRENCY), self.limit * 0.7)
+                self.last_decrease = now
+                logger.info(f"Scheduler: sobrecarga detectada, limite global reduzido para {self.limit:.1f}")
+        elif error is None:
+            self.limit = min(float(SCHEDULER_MAX_CONCURRENCY), self.limit + 1 / self.limit)
+            state.rate = min(SCHEDULER_HOST_RATE, state.rate + SCHEDULER_HOST_RATE / 10)
+
+    def _dispatch(self):
+        """Entrega slots livres em round-robin aos hosts com fila que têm token e folga de concorrência."""
+        now = time.monotonic()
+        wake_in = None
+        progress = True
+        while progress and self.active < self.capacity() and self.ready:
+            progress = False
+            for _ in range(len(self.ready)):
+                if self.active >= self.capacity():
+                    break
+                host = self.ready.popleft()
+                state = self.hosts[host]
+                while state.waiters and state.waiters[0].done():
+                    state.waiters.popleft()  # cancelados enquanto esperavam
+                if state.waiters and (state.active < SCHEDULER_HOST_CONCURRENCY or not state.limited):
+                    delay = state.take_token(now)
+                    if delay:
+                        wake_in = delay if wake_in is None else min(wake_in, delay)
+                    else:
+                        state.active += 1
+                        self.active += 1
+                        state.waiters.popleft().set_result(None)
+                        progress = True
+                if state.waiters:
+                    self.ready.append(host)  # volta para o fim: um slot por host a cada volta
+                elif state.idle():
+                    del self.hosts[host]
+        if wake_in is not None:
+            self._schedule_wakeup(now + wake_in)
+
+    def _prune(self):
+        """Esquece hosts sem requisições e com o bucket cheio (não há estado a perder)."""
+        now = time.monotonic()
+        for host, state in list(self.hosts.items()):
+            state.refill(now)
+            if state.idle():
+                del self.hosts[host]
+
+    def _schedule_wakeup(self, when: float):
+        if self._timer is not None and self._timer_at <= when:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_at = when
+        self._timer = asyncio.get_running_loop().call_later(max(0.0, when - time.monotonic()), self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._timer = None
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "capacity": self.capacity(),
+            "active": self.active,
+            "waiting": self.waiting,
+            "hosts": len(self.hosts),
+        }
 
-        checkouts_data = get_checkouts(soup, body_text)
+@asynccontextmanager
+async def acquire_slot(url: str, remote: bool = True):
+    """Slot do scheduler para o host da URL, medindo a espera na fila (etapa "queue").
+    A latência e o erro da execução alimentam o ajuste de concorrência.
+    remote=False (replay): ocupa o navegador (slot global), sem bucket nem teto de host, que não é acessado."""
+    host = site_domain(url) if remote else "replay"
+    queued_at = time.perf_counter()
+    if CLUSTER and remote:
+        await CLUSTER.host_token(host)  # rate limit do host somando todos os nós
+    await SCHEDULER.acquire(host, limited=remote)
+    started_at = time.perf_counter()
+    record_stage("queue", started_at - queued_at)
+    error, cancelled = None, False
+    try:
+        yield
+    except asyncio.CancelledError:
+        cancelled = True  # execução interrompida: a latência não diz nada sobre o host
+        raise
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        SCHEDULER.release(host, time.perf_counter() - started_at, error, adapt=not cancelled)
+        if CLUSTER and isinstance(error, HTTPStatusError) and error.status == 429:
+            await CLUSTER.penalize_host(host)
+
+# --- Orquestração ---
+
+def error_response(url: str, message: str, method: str = "dynamic", fields: Optional[List[str]] = None) -> ScrapeResponse:
+    return ScrapeResponse(
+        status="error",
+        url=url,
+        method=method,
+        social_media=SocialMedia(),
+        images=Images(),
+        checkouts=Checkouts(),
+        pixels=Pixels(pixels=PixelDetail()),
+        screenshot=Screenshot(),
+        performance=Performance(total_time="0s"),
+        markdown=message,
+        error=message,
+        fields=fields,
+    )
 
-        # Screenshot
-        screenshot_data = Screenshot()
-        if request.take_screenshot:
-            b64 = await page.screenshot(full_page=False, type='jpeg', quality=70)
-            screenshot_data.base64 = base64.b64encode(b64).decode("utf-8")
-            screenshot_data.timestamp = str(time.time())
+def failed_method(request: ScrapeRequest, exc: Exception) -> str:
+    """Tier em que a falha aconteceu: o estático marca as exceções que não escalaram; circuito aberto não roda nenhum."""
+    if isinstance(exc, CircuitOpenError):
+        return "none"
+    return getattr(exc, "method", "static" if request.mode == "static" else "dynamic")
+
+async def process_scrape(request: ScrapeRequest) -> ScrapeResponse:
+    """Executa um scrape pelo scheduler, com retentativas (ou responde do cache). Erros viram uma resposta com status="error"."""
+    global ACTIVE_CONNECTIONS, REQUEST_COUNT
 
-        # --- EXTRAÇÃO DE MARKDOWN COM TRAFILATURA (State of the Art) ---
+    # Detecção de mudança: a referência vem antes de tudo; um 304 da origem já responde "unchanged"
+    baseline = await load_baseline(request) if change_mode(request) else None
+    request._baseline = baseline
+    if baseline is not None and not request.force_refresh:
+        unchanged = await unchanged_by_validators(request, baseline)
+        if unchanged is not None:
+            return unchanged
+
+    # Cache fica na frente do scheduler: hits não ocupam slot de navegador
+    # Gravação, replay e detecção de mudança sempre comparam com a página atual (e não entram no cache)
+    use_cache = CACHE_ENABLED and not (request.record or request.replay or change_mode(request))
+    key = cache_key(request)
+    cached = await cached_response(request, key) if use_cache else None
+    if cached is not None:
+        return cached
+
+    timer = StageTimer()
+    token = STAGE_TIMER.set(timer)
+    start_time = time.perf_counter()
+    result = None
+    ACTIVE_CONNECTIONS += 1
+    try:
+        if request.replay:
+            # Replay não acessa o site: sem circuit breaker, retentativas nem rate limit do host
+            async with acquire_slot(request.url, remote=False):
+                result = await execute_scraping_task(request)
+        else:
+            result = await scrape_with_retries(request)
+        if not use_cache:
+            result.cache = "bypass"
+        elif result.status == "success":
+            await cache_put(key, result)
+            if request.force_refresh:
+                result.cache = "bypass"
+        if change_mode(request) and result.status == "success":
+            await apply_change_detection(request, result, baseline)
+        return result
+    except Exception as e:
+        kind = classify_error(e)
+        logger.error(f"Erro Fatal ({kind}) {request.url}: {str(e)}")
+        result = error_response(request.url, f"Error ({kind}): {str(e)}", failed_method(request, e), request.fields)
+        return result
+    finally:
+        STAGE_TIMER.reset(token)
+        observe_request("scrape", timer, result, start_time)
+        ACTIVE_CONNECTIONS -= 1
+        REQUEST_COUNT += 1
+
+# --- Crawl de Site (descoberta de contatos) ---
+
+# Peso de cada termo no href/texto do link: páginas de contato primeiro, depois institucionais
+CRAWL_LINK_KEYWORDS = {
+    "contato": 10, "contact": 10, "fale-conosco": 10, "faleconosco": 10, "fale conosco": 10,
+    "atendimento": 8, "whatsapp": 6, "suporte": 5,
+    "sobre": 5, "about": 5, "quem-somos": 5, "quem somos": 5, "empresa": 4, "institucional": 4,
+    "trabalhe-conosco": 2, "privacidade": 2, "privacy": 2, "termos": 1,
+}
+CRAWL_SKIP_SCHEMES = ("mailto:", "tel:", "javascript:", "data:", "whatsapp:")
+CRAWL_SKIP_EXTENSIONS = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".zip", ".rar",
+    ".mp4", ".mp3", ".doc", ".docx", ".xls", ".xlsx", ".css", ".js", ".xml",
+)
+
+def site_domain(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+def score_link(href: str, text: str) -> int:
+    """Valor provável do link para achar contatos (0 = só se sobrar orçamento)."""
+    haystack = f"{urlsplit(href).path} {text}".lower()
+    return sum(weight for keyword, weight in CRAWL_LINK_KEYWORDS.items() if keyword in haystack)
+
+def crawl_candidates(base_url: str, links: List[Tuple[str, str]], domain: str) -> List[Tuple[int, str]]:
+    """Links do mesmo domínio, absolutos e sem fragmento, com o score de cada um."""
+    candidates = {}
+    for href, text in links:
+        href = href.strip()
+        if not href or href.startswith("#") or href.lower().startswith(CRAWL_SKIP_SCHEMES):
+            continue
+        url = urldefrag(urljoin(base_url, href))[0]
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or site_domain(url) != domain:
+            continue
+        if parts.path.lower().endswith(CRAWL_SKIP_EXTENSIONS):
+            continue
+        score = score_link(url, text)
+        candidates[url] = max(score, candidates.get(url, 0))
+    return [(score, url) for url, score in candidates.items()]
+
+class CrawlSession:
+    """Um crawl em andamento: um contexto de navegador para o domínio, criado só se alguma página precisar de JS.
+    As páginas extras abertas no contexto compartilham cookies (consentimento, sessão) entre as navegações."""
+
+    def __init__(self, request: CrawlRequest):
+        self.request = request
+        self.slot: Optional[PooledPage] = None
+        self.idle_pages: List[Page] = []
+        self.blocking: Dict[Page, BlockStats] = {}  # o roteamento é por página
+        self.screenshot_task: Optional[asyncio.Task] = None  # só a página inicial tem screenshot
+        self.lock = asyncio.Lock()
+        self.healthy = True
+
+    async def take_page(self) -> Page:
+        with stage("context"):
+            return await self._take_page()
+
+    async def _take_page(self) -> Page:
+        async with self.lock:
+            if self.slot is None:
+                self.slot = await acquire_page(pool_key(self.request))
+                self.blocking[self.slot.page] = self.slot.blocking
+                return self.slot.page
+            if self.idle_pages:
+                return self.idle_pages.pop()
+            page = await self.slot.context.new_page()
+            self.blocking[page] = await install_blocking(page, self.slot.key)
+            return page
+
+    async def scrape_dynamic(self, request: ScrapeRequest, fallback: bool = False) -> ScrapeResponse:
+        """Tier dinâmico dentro do contexto do crawl (substitui o execute_scraping_task do run_scrape)."""
+        start_time = time.perf_counter()
+        page = await self.take_page()
+        screenshot_task = None
         try:
-            markdown_content = trafilatura.extract(content_html, output_format='markdown', include_links=True, include_images=request.extract_images)
-            if not markdown_content:
-                 # Fallback simples se Trafilatura não achar "artigo"
-                 markdown_content = soup.get_text(separator="\n")
+            capture = await capture_page(page, request, self.blocking[page], fallback)
+            if request.take_screenshot:
+                screenshot_task, capture["screenshot"] = start_screenshot(page, request)
+                self.screenshot_task = screenshot_task
         except Exception:
-            markdown_content = soup.get_text(separator="\n")
+            self.healthy = False
+            raise
+        finally:
+            if screenshot_task:
+                # A página só volta a ser usada pelo crawl depois da captura
+                screenshot_task.add_done_callback(lambda _: self.idle_pages.append(page))
+            else:
+                self.idle_pages.append(page)
+        response = await response_from_capture(request, capture, start_time)
+        await finish_screenshot(response, screenshot_task, request.screenshot_inline)
+        return response
+
+    def close(self):
+        # reset_page fecha as páginas extras e limpa os cookies antes de devolver o contexto ao pool
+        if self.slot:
+            schedule_release(self.slot, self.healthy, after=self.screenshot_task)
+
+async def crawl_fetch(session: CrawlSession, url: str, is_start: bool) -> ScrapeResponse:
+    """Uma página do crawl. Politeness (concorrência e taxa por domínio) fica a cargo do scheduler."""
+    page_request = session.request.model_copy(
+        update={"url": url, "take_screenshot": session.request.take_screenshot and is_start}
+    )
+    return await scrape_with_retries(page_request, dynamic=session.scrape_dynamic)
+
+def merge_crawl_results(request: CrawlRequest, results: List[ScrapeResponse], start_time: float) -> ScrapeResponse:
+    """Uma resposta para o site: listas unidas e deduplicadas; metadados e screenshot vêm da página inicial."""
+    first = results[0]
+    social = {
+        name: clean_and_deduplicate([link for result in results for link in getattr(result.social_media, name, [])])
+        for name in dict.fromkeys([*SocialMedia.model_fields, *SIGNATURES.social_priority])
+    }
+    platforms = sorted({platform for result in results for platform in result.checkouts.platforms})
+    markdown = "\n\n---\n\n".join(result.markdown for result in results if result.markdown)[:MARKDOWN_MAX_CHARS]
+
+    def merged(field: str) -> List[str]:
+        return clean_and_deduplicate([item for result in results for item in getattr(result, field)])
+
+    blocking = Blocking(profile=pool_key(request))
+    for result in results:
+        for field in ("requests_blocked", "requests_allowed", "bytes_loaded", "bytes_saved_estimate"):
+            setattr(blocking, field, getattr(blocking, field) + getattr(result.blocking, field))
+
+    response = ScrapeResponse(
+        status="success",
+        url=request.url,
+        result_id=uuid.uuid4().hex,
+        method="dynamic" if any(result.method == "dynamic" for result in results) else "static",
+        emails=merged("emails"),
+        phones=merged("phones"),
+        cnpj=merged("cnpj"),
+        whatsapp=merged("whatsapp"),
+        social_media=SocialMedia(**social),
+        metadata=first.metadata,
+        images=first.images,
+        button_links=merged("button_links")[:20],
+        checkouts=Checkouts(have_checkouts=bool(platforms), platforms=platforms),
+        pixels=merge_pixels(*(result.pixels for result in results)),
+        screenshot=first.screenshot,
+        markdown=markdown,
+        performance=Performance(total_time=f"{time.perf_counter() - start_time:.2f}s", stages=current_stages()),
+        blocking=blocking,
+        crawled_pages=[result.url for result in results],
+        fields=request.fields,
+    )
+    response._text_hash = hashlib.sha256("".join(sorted(result._text_hash for result in results)).encode()).hexdigest()[:32]
+    # Sem markdown inline, o do site é montado sob demanda a partir das páginas
+    parts = [result.result_id for result in results if result.result_id]
+    if markdown:
+        markdown_store_put(response.result_id, {"markdown": markdown})
+    elif parts:
+        markdown_store_put(response.result_id, {"parts": parts})
+    else:
+        response.result_id = ""
+    return response
+
+async def crawl_site(request: CrawlRequest) -> ScrapeResponse:
+    """Busca em largura priorizada: a cada rodada, os links de maior score ainda não visitados, até
+    max_pages, max_depth ou o orçamento de tempo. Falha na página inicial falha o crawl; nas demais, só pula."""
+    start_time = time.perf_counter()
+    deadline = time.monotonic() + request.budget_ms / 1000
+    domain = site_domain(request.url)
+    max_pages = max(1, min(request.max_pages, CRAWL_MAX_PAGES))
+
+    session = CrawlSession(request)
+    seen = {normalize_url(request.url)}
+    frontier: List[Tuple[int, int, str]] = []  # (-score, profundidade, url)
+    results: List[ScrapeResponse] = []
+    tasks: Dict[asyncio.Task, Tuple[int, str]] = {}
+    try:
+        results.append(await crawl_fetch(session, request.url, is_start=True))
+        discovered = [(0, request.url, results[0]._links)]
+        while len(results) < max_pages:
+            for page_depth, base_url, page_links in discovered:
+                if page_depth >= request.max_depth:
+                    continue
+                for score, url in crawl_candidates(base_url, page_links, domain):
+                    key = normalize_url(url)
+                    if key not in seen:
+                        seen.add(key)
+                        heapq.heappush(frontier, (-score, page_depth + 1, url))
+            remaining = deadline - time.monotonic()
+            if not frontier or remaining <= 0:
+                break
+
+            # Uma rodada por vez: os links descobertos nela entram no ranking da próxima
+            wave = [heapq.heappop(frontier) for _ in range(min(len(frontier), max_pages - len(results)))]
+            tasks = {
+                asyncio.create_task(crawl_fetch(session, url, is_start=False)): (depth, url)
+                for _, depth, url in wave
+            }
+            done, pending = await asyncio.wait(tasks, timeout=remaining)
+            for task in pending:
+                task.cancel()
+
+            discovered = []
+            for task in done:
+                depth, url = tasks[task]
+                if task.exception():
+                    logger.info(f"Crawl: falha em {url}: {task.exception()}")
+                    continue
+                result = task.result()
+                results.append(result)
+                discovered.append((depth, url, result._links))
+            if pending:
+                logger.info(f"Crawl de {domain}: orçamento de tempo esgotado com {len(pending)} páginas pendentes")
+                break
+    finally:
+        # Capturas canceladas (orçamento esgotado ou crawl cancelado) terminam de desfazer antes
+        # de o contexto e as páginas compartilhados serem liberados
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        session.close()
 
-        end_time = time.perf_counter()
-        total_time = f"{end_time - start_time:.2f}s"
+    logger.info(f"Crawl de {domain}: {len(results)} páginas em {time.perf_counter() - start_time:.2f}s")
+    return merge_crawl_results(request, results, start_time)
 
-        # --- LIMPEZA FINAL DE DUPLICATAS ---
-        final_emails = clean_and_deduplicate(regex_data["emails"])
-        final_phones = clean_and_deduplicate(regex_data["phones"])
-        final_cnpj = clean_and_deduplicate(regex_data["cnpj"])
-        final_whatsapp = clean_and_deduplicate(whatsapp_links)
-        final_buttons = clean_and_deduplicate(button_links)[:20]
-        
-        final_social = {}
-        for k, v in social_links.items():
-            final_social[k] = clean_and_deduplicate(v)
-
-        return ScrapeResponse(
-            status="success",
-            url=request.url,
-            emails=final_emails,
-            phones=final_phones,
-            cnpj=final_cnpj,
-            whatsapp=final_whatsapp,
-            social_media=SocialMedia(**final_social),
-            metadata={"title": title, "description": description, "og_image": og_image},
-            images=images_data,
-            button_links=final_buttons,
-            checkouts=checkouts_data,
-            pixels=pixels_data,
-            screenshot=screenshot_data,
-            markdown=markdown_content[:20000],
-            performance=Performance(total_time=total_time)
+async def process_crawl(request: CrawlRequest) -> ScrapeResponse:
+    global ACTIVE_CONNECTIONS, REQUEST_COUNT
+    timer = StageTimer()
+    token = STAGE_TIMER.set(timer)
+    start_time = time.perf_counter()
+    result = None
+    ACTIVE_CONNECTIONS += 1
+    try:
+        baseline = await load_baseline(request) if change_mode(request) else None
+        result = await crawl_site(request)
+        if change_mode(request):
+            await apply_change_detection(request, result, baseline)
+        return result
+    except Exception as e:
+        logger.error(f"Erro no crawl {request.url}: {str(e)}")
+        result = error_response(request.url, f"Crawl error: {str(e)}", failed_method(request, e), request.fields)
+        return result
+    finally:
+        STAGE_TIMER.reset(token)
+        observe_request("crawl", timer, result, start_time)
+        ACTIVE_CONNECTIONS -= 1
+        REQUEST_COUNT += 1
+
+# --- Fila de Jobs (SQLite) ---
+
+def jobs_db_init():
+    """Abre o banco de jobs e cria a tabela se necessário."""
+    global JOBS_DB
+    os.makedirs(os.path.dirname(JOBS_DB_PATH) or ".", exist_ok=True)
+    JOBS_DB = sqlite3.connect(JOBS_DB_PATH, check_same_thread=False)
+    JOBS_DB.execute("PRAGMA journal_mode=WAL")
+    JOBS_DB.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            request TEXT NOT NULL,
+            result TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
         )
+    """)
+    JOBS_DB.commit()
+
+def jobs_db_execute(sql: str, params: tuple = ()) -> List[tuple]:
+    """Executa uma instrução no banco de jobs (chamar via asyncio.to_thread)."""
+    with JOBS_DB_LOCK:
+        rows = JOBS_DB.execute(sql, params).fetchall()
+        JOBS_DB.commit()
+        return rows
+
+async def enqueue_job(request: JobRequest) -> JobStatus:
+    job = JobStatus(id=uuid.uuid4().hex, status="queued", created_at=time.time())
+    if CLUSTER:
+        await CLUSTER.enqueue_job(job, request)
+        return job
+    await asyncio.to_thread(
+        jobs_db_execute,
+        "INSERT INTO jobs (id, status, request, created_at) VALUES (?, ?, ?, ?)",
+        (job.id, job.status, request.model_dump_json(), job.created_at)
+    )
+    JOB_QUEUE.put_nowait(job.id)
+    return job
+
+async def get_job(job_id: str) -> Optional[JobStatus]:
+    if CLUSTER:
+        return await CLUSTER.get_job(job_id)
+    rows = await asyncio.to_thread(
+        jobs_db_execute,
+        "SELECT id, status, result, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+        (job_id,)
+    )
+    if not rows:
+        return None
+    job_id, status, result, created_at, started_at, finished_at = rows[0]
+    return JobStatus(
+        id=job_id,
+        status=status,
+        created_at=created_at,
+        started_at=started_at,
+        finished_at=finished_at,
+        result=ScrapeResponse.model_validate_json(result) if result else None
+    )
 
-    finally:
-        if page: await page.close()
-        if context: await context.close()
+async def recover_jobs():
+    """Recoloca na fila os jobs que não terminaram antes do último desligamento."""
+    rows = await asyncio.to_thread(
+        jobs_db_execute,
+        "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+    )
+    await asyncio.to_thread(jobs_db_execute, "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+    for (job_id,) in rows:
+        JOB_QUEUE.put_nowait(job_id)
+    if rows:
+        logger.info(f"{len(rows)} jobs pendentes recolocados na fila.")
+
+async def purge_finished_jobs():
+    """Remove periodicamente resultados mais antigos que JOB_TTL."""
+    while True:
+        cutoff = time.time() - JOB_TTL
+        await asyncio.to_thread(jobs_db_execute, "DELETE FROM jobs WHERE status = 'finished' AND finished_at < ?", (cutoff,))
+        await asyncio.sleep(3600)
+
+async def send_webhook(url: str, job: JobStatus):
+    """Entrega o resultado do job via POST, com algumas tentativas."""
+    for attempt in range(WEBHOOK_ATTEMPTS):
+        try:
+            async with HTTP_SESSION.post(
+                url,
+                data=job.model_dump_json(),
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=10)
+            ) as resp:
+                if resp.status < 400:
+                    return
+                logger.warning(f"Webhook {url} respondeu {resp.status} (job {job.id})")
+        except Exception as e:
+            logger.warning(f"Falha no webhook {url} (job {job.id}): {e}")
+        await asyncio.sleep(2 ** attempt)
+    logger.error(f"Webhook {url} desistido após {WEBHOOK_ATTEMPTS} tentativas (job {job.id})")
+
+async def next_job() -> Optional[Tuple[str, JobRequest, float]]:
+    """Próximo job (id, requisição, criação). No modo distribuído só puxa da fila compartilhada com slot livre."""
+    if CLUSTER:
+        return await CLUSTER.claim_job()
+    job_id = await JOB_QUEUE.get()
+    JOB_QUEUE.task_done()
+    rows = await asyncio.to_thread(jobs_db_execute, "SELECT request, created_at FROM jobs WHERE id = ?", (job_id,))
+    if not rows:
+        return None
+    return job_id, JobRequest.model_validate_json(rows[0][0]), rows[0][1]
+
+async def mark_job_running(job_id: str, started_at: float):
+    if CLUSTER:
+        return await CLUSTER.update_job(job_id, status="running", started_at=started_at)
+    await asyncio.to_thread(jobs_db_execute, "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (started_at, job_id))
+
+async def mark_job_finished(job_id: str, result: ScrapeResponse, finished_at: float):
+    if CLUSTER:
+        return await CLUSTER.finish_job(job_id, result, finished_at)
+    await asyncio.to_thread(
+        jobs_db_execute,
+        "UPDATE jobs SET status = 'finished', result = ?, finished_at = ? WHERE id = ?",
+        (result.model_dump_json(), finished_at, job_id)
+    )
+
+async def job_worker():
+    """Consome a fila de jobs. O limite real de concorrência continua sendo o do scheduler."""
+    while True:
+        job_id = None
+        try:
+            job = await next_job()
+            if job is None:
+                continue
+            job_id, request, created_at = job
+            started_at = time.time()
+            JOB_WAIT_TIMES.append(started_at - created_at)
+            await mark_job_running(job_id, started_at)
+
+            result = await process_scrape(request)
+
+            finished_at = time.time()
+            JOB_RUN_TIMES.append(finished_at - started_at)
+            await mark_job_finished(job_id, result, finished_at)
+            if request.webhook_url:
+                job = JobStatus(id=job_id, status="finished", created_at=created_at, started_at=started_at, finished_at=finished_at, result=result)
+                task = asyncio.create_task(send_webhook(request.webhook_url, job))
+                PENDING_WEBHOOKS.add(task)
+                task.add_done_callback(PENDING_WEBHOOKS.discard)
+        except Exception as e:
+            logger.error(f"Erro no worker de jobs ({job_id}): {e}")
+            if job_id is None:
+                await asyncio.sleep(1)  # fila indisponível (ex.: Redis fora): não gira em falso
+        finally:
+            if CLUSTER and job_id is not None:
+                CLUSTER.claimed -= 1
+
+def average(values) -> float:
+    return round(sum(values) / len(values), 3) if values else 0.0
+
+# --- Modo Distribuído (Redis opcional) ---
+
+# Token bucket por host compartilhado entre os nós. Usa o relógio do Redis (nós com relógios
+# diferentes enxergam o mesmo bucket) e devolve quantos segundos esperar (0 = token consumido).
+HOST_TOKEN_LUA = """
+local rate = tonumber(ARGV[1]) * tonumber(redis.call('GET', KEYS[2]) or '1')
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(wait)
+"""
+
+class Cluster:
+    """Coordenação entre nós via Redis: fila de jobs (cada nó puxa conforme o próprio slot livre),
+    cache de resultados, rate limit por host e heartbeat com a capacidade de cada nó.
+    Falhas do Redis no cache e no rate limit não derrubam o scrape: o nó segue com o estado local."""
+
+    def __init__(self, client):
+        self.client = client
+        self.host_token_script = client.register_script(HOST_TOKEN_LUA)
+        self.claimed = 0  # jobs puxados da fila compartilhada e ainda não terminados neste nó
+        self.queue_depth = 0
+
+    def key(self, *parts: str) -> str:
+        return ":".join((CLUSTER_PREFIX,) + parts)
+
+    # Fila de jobs: lista compartilhada + lista "processing" por nó (jobs de um nó morto voltam para a fila)
+
+    async def enqueue_job(self, job: JobStatus, request: JobRequest):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key("job", job.id), mapping={
+                "status": job.status, "request": request.model_dump_json(), "created_at": job.created_at,
+            })
+            pipe.rpush(self.key("jobs"), job.id)
+            await pipe.execute()
+
+    async def get_job(self, job_id: str) -> Optional[JobStatus]:
+        data = await self.client.hgetall(self.key("job", job_id))
+        if not data:
+            return None
+        return JobStatus(
+            id=job_id,
+            status=data["status"],
+            created_at=float(data["created_at"]),
+            started_at=float(data["started_at"]) if data.get("started_at") else None,
+            finished_at=float(data["finished_at"]) if data.get("finished_at") else None,
+            result=ScrapeResponse.model_validate_json(data["result"]) if data.get("result") else None
+        )
+
+    def has_capacity(self) -> bool:
+        if not readiness()[0]:
+            return False
+        capacity = SCHEDULER.capacity()
+        return self.claimed < capacity and SCHEDULER.active + SCHEDULER.waiting < capacity
+
+    async def claim_job(self) -> Optional[Tuple[str, JobRequest, float]]:
+        while not self.has_capacity():
+            await asyncio.sleep(0.2)
+        self.claimed += 1
+        try:
+            job_id = await self.client.blmove(self.key("jobs"), self.key("processing", NODE_ID), 5, "LEFT", "RIGHT")
+            data = await self.client.hmget(self.key("job", job_id), "request", "created_at") if job_id else None
+        except BaseException:
+            self.claimed -= 1
+            raise
+        if not data or data[0] is None:
+            self.claimed -= 1
+            if job_id:
+                await self.client.lrem(self.key("processing", NODE_ID), 1, job_id)
+            return None
+        return job_id, JobRequest.model_validate_json(data[0]), float(data[1])
+
+    async def update_job(self, job_id: str, **fields):
+        await self.client.hset(self.key("job", job_id), mapping=fields)
+
+    async def finish_job(self, job_id: str, result: ScrapeResponse, finished_at: float):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key("job", job_id), mapping={
+                "status": "finished", "result": result.model_dump_json(), "finished_at": finished_at,
+            })
+            pipe.expire(self.key("job", job_id), JOB_TTL)
+            pipe.lrem(self.key("processing", NODE_ID), 1, job_id)
+            await pipe.execute()
+
+    async def requeue(self, node_id: str) -> int:
+        """Devolve para o início da fila os jobs que estavam com um nó (morto ou desligando)."""
+        moved = 0
+        while await self.client.lmove(self.key("processing", node_id), self.key("jobs"), "RIGHT", "LEFT"):
+            moved += 1
+        return moved
+
+    # Cache de resultados compartilhado (mesma entrada do LRU local, expira junto com o stale do SQLite)
+
+    async def cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = await self.client.get(self.key("cache", key))
+        except aioredis.RedisError as e:
+            logger.warning(f"Cache compartilhado indisponível: {e}")
+            return None
+        return json.loads(raw) if raw else None
+
+    async def cache_put(self, key: str, entry: Dict[str, Any]):
+        try:
+            await self.client.set(self.key("cache", key), json.dumps(entry), ex=CACHE_STALE_TTL)
+        except aioredis.RedisError as e:
+            logger.warning(f"Cache compartilhado indisponível: {e}")
+
+    # Fingerprints da detecção de mudança: qualquer nó compara com a última passada de qualquer outro
+
+    async def fingerprint_get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = await self.client.get(self.key("fingerprint", key))
+        except aioredis.RedisError as e:
+            logger.warning(f"Fingerprints compartilhados indisponíveis: {e}")
+            return None
+        return json.loads(raw) if raw else None
+
+    async def fingerprint_put(self, key: str, entry: Dict[str, Any]):
+        try:
+            await self.client.set(self.key("fingerprint", key), json.dumps(entry), ex=FINGERPRINT_TTL)
+        except aioredis.RedisError as e:
+            logger.warning(f"Fingerprints compartilhados indisponíveis: {e}")
+
+    # Rate limit por host entre os nós (o bucket local do scheduler continua valendo por nó)
+
+    async def host_token(self, host: str):
+        while True:
+            try:
+                wait = float(await self.host_token_script(
+                    keys=[self.key("rate", host), self.key("penalty", host)],
+                    args=[CLUSTER_HOST_RATE, SCHEDULER_HOST_BURST],
+                ))
+            except aioredis.RedisError as e:
+                logger.warning(f"Rate limit compartilhado indisponível ({host}): {e}")
+                return
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def penalize_host(self, host: str):
+        """429 em qualquer nó reduz a taxa do host à metade para todos (até 1/16, por CLUSTER_PENALTY_TTL)."""
+        try:
+            factor = float(await self.client.get(self.key("penalty", host)) or 1)
+            await self.client.set(self.key("penalty", host), max(1 / 16, factor / 2), ex=CLUSTER_PENALTY_TTL)
+        except aioredis.RedisError as e:
+            logger.warning(f"Rate limit compartilhado indisponível ({host}): {e}")
+
+    # Heartbeat: capacidade de cada nó em /health e recuperação de jobs de nós mortos
+
+    def node_stats(self) -> Dict[str, Any]:
+        capacity = SCHEDULER.capacity()
+        return {
+            "node_id": NODE_ID,
+            "capacity": capacity,
+            "active": SCHEDULER.active,
+            "waiting": SCHEDULER.waiting,
+            "free": max(0, capacity - SCHEDULER.active - SCHEDULER.waiting),
+            "jobs_claimed": self.claimed,
+            "browsers": len(BROWSER_SHARDS),
+            "memory": MEMORY_GUARD.state() if MEMORY_GUARD else None,
+            "updated_at": time.time(),
+        }
+
+    async def heartbeat(self):
+        await self.client.set(self.key("node", NODE_ID), json.dumps(self.node_stats()), ex=CLUSTER_NODE_TTL)
+        self.queue_depth = await self.client.llen(self.key("jobs"))
+        async for processing in self.client.scan_iter(match=self.key("processing", "*")):
+            node_id = processing[len(self.key("processing", "")):]
+            if not await self.client.exists(self.key("node", node_id)):
+                moved = await self.requeue(node_id)
+                if moved:
+                    logger.warning(f"Nó {node_id} sem heartbeat: {moved} jobs devolvidos para a fila.")
+
+    async def nodes(self) -> List[Dict[str, Any]]:
+        try:
+            keys = [key async for key in self.client.scan_iter(match=self.key("node", "*"))]
+            values = await self.client.mget(keys) if keys else []
+        except aioredis.RedisError as e:
+            logger.warning(f"Redis indisponível ao listar nós: {e}")
+            return []
+        return sorted((json.loads(value) for value in values if value), key=lambda node: node["node_id"])
+
+    async def close(self):
+        """Desligamento limpo: jobs em andamento voltam para a fila e o nó sai do /health na hora."""
+        try:
+            await self.requeue(NODE_ID)
+            await self.client.delete(self.key("node", NODE_ID))
+        finally:
+            await self.client.aclose()
+
+async def connect_cluster() -> Cluster:
+    global aioredis
+    try:
+        import redis.asyncio as aioredis
+    except ImportError:
+        raise RuntimeError("REDIS_URL definido, mas o pacote 'redis' não está instalado.")
+    client = aioredis.from_url(REDIS_URL, decode_responses=True)
+    await client.ping()
+    cluster = Cluster(client)
+    await cluster.heartbeat()
+    return cluster
+
+async def cluster_heartbeat():
+    while True:
+        await asyncio.sleep(CLUSTER_HEARTBEAT_INTERVAL)
+        try:
+            await CLUSTER.heartbeat()
+        except Exception as e:
+            logger.warning(f"Falha no heartbeat do cluster: {e}")
+
+# --- Warm-up e Prontidão ---
+
+def warm_parser() -> int:
+    """Carrega o bs4/lxml (import tardio) antes da primeira requisição precisar deles."""
+    from bs4 import BeautifulSoup
+    BeautifulSoup("<p></p>", "lxml")
+    return os.getpid()
+
+async def warm_extraction_pool():
+    """Sobe todos os processos de extração já importando o main, o pacote de assinaturas e o parser.
+    Sem pool (extração inline), aquece o parser no próprio processo."""
+    if not EXTRACTION_POOL:
+        await asyncio.to_thread(warm_parser)
+        return
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(
+        loop.run_in_executor(EXTRACTION_POOL, run_with_signatures, SIGNATURES.version, warm_parser)
+        for _ in range(EXTRACTION_POOL._max_workers)
+    ))
+
+async def warm_up():
+    """Navegadores e pool de extração sobem depois que o servidor já responde (/health/live).
+    Falha ao subir o Chromium não derruba o processo: tenta de novo e o /health/ready segue em 503."""
+    started_at = time.perf_counter()
+    pool_warmup = asyncio.create_task(warm_extraction_pool())
+    while True:
+        try:
+            await init_browsers()
+            break
+        except Exception as e:
+            logger.error(f"Falha ao subir navegadores ({e}), nova tentativa em 5s...")
+            await asyncio.sleep(5)
+    try:
+        await pool_warmup
+    except Exception as e:
+        logger.warning(f"Falha ao aquecer o pool de extração: {e}")
+    logger.info(f"Warm-up concluído em {time.perf_counter() - started_at:.1f}s.")
+
+def readiness() -> Tuple[bool, str]:
+    """Pronto = há navegador aceitando páginas e a memória não está no limite."""
+    if not live_shards():
+        starting = WARMUP_TASK is None or not WARMUP_TASK.done()
+        return False, "starting" if starting else "no_browser"
+    if MEMORY_GUARD and MEMORY_GUARD.state() == "critical":
+        return False, "memory"
+    return True, "ready"
 
 # --- Ciclo de Vida da Aplicação ---
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global PLAYWRIGHT_INSTANCE, BROWSER, SEMAPHORE, UA_GENERATOR
+    global PLAYWRIGHT_INSTANCE, SCHEDULER, MEMORY_GUARD, CLUSTER, USER_AGENTS, WARMUP_TASK, HTTP_SESSION, JOB_QUEUE, EXTRACTION_POOL
     
-    max_concurrency = int(os.getenv("MAX_CONCURRENCY", 5))
-    SEMAPHORE = asyncio.Semaphore(max_concurrency)
-    logger.info(f"Semaphore inicializado com {max_concurrency} slots.")
+    SCHEDULER = Scheduler()
+    MEMORY_GUARD = MemoryGuard()
+    logger.info(f"Admissão por memória: limite {MEMORY_GUARD.limit // (1024 * 1024)}MB (soft {MEMORY_SOFT_RATIO:.0%}, hard {MEMORY_HARD_RATIO:.0%}).")
+    logger.info(f"Scheduler inicializado com {SCHEDULER.capacity()} slots (adaptativo entre {SCHEDULER_MIN_CONCURRENCY} e {SCHEDULER_MAX_CONCURRENCY}).")
     
-    # Inicializa Fake UserAgent com cache
-    try:
-        UA_GENERATOR = UserAgent(browsers=['chrome', 'edge', 'firefox'], os=['windows', 'macos'])
-    except:
-        UA_GENERATOR = None
-        logger.warning("Fake UserAgent falhou, usando fallback.")
+    USER_AGENTS = load_user_agents(USER_AGENTS_PATH)
+    logger.info(f"{len(USER_AGENTS)} user agents carregados.")
+
+    # Pool de extração criado antes do Chromium subir
+    EXTRACTION_POOL = create_extraction_pool()
+    logger.info(f"Pool de extração: {EXTRACTION_POOL._max_workers if EXTRACTION_POOL else 0} processos.")
+
+    # Sessão HTTP compartilhada do tier estático (pool de conexões keep-alive)
+    HTTP_SESSION = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=STATIC_POOL_SIZE, ttl_dns_cache=300),
+        cookie_jar=aiohttp.DummyCookieJar()
+    )
 
-    await init_browser()
+    # Blocklist antes do warm-up: as páginas pré-aquecidas já nascem com os padrões no navegador
+    init_blocklist()
+    WARMUP_TASK = asyncio.create_task(warm_up())
+
+    # Jobs: banco (ou fila compartilhada no modo distribuído), recuperação de pendentes e pool de workers
+    JOB_QUEUE = asyncio.Queue()
+    if CACHE_ENABLED:
+        await asyncio.to_thread(cache_db_init)
+    if REDIS_URL:
+        CLUSTER = await connect_cluster()
+        logger.info(f"Modo distribuído: nó {NODE_ID} conectado ao Redis.")
+        background_tasks = [asyncio.create_task(cluster_heartbeat())]
+    else:
+        await asyncio.to_thread(jobs_db_init)
+        await asyncio.to_thread(fingerprint_db_init)
+        await recover_jobs()
+        background_tasks = [asyncio.create_task(purge_finished_jobs())]
+    background_tasks += [asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS)]
+    background_tasks.append(asyncio.create_task(purge_screenshots()))
+    if CACHE_DB is not None:
+        background_tasks.append(asyncio.create_task(purge_cache()))
+    background_tasks.append(asyncio.create_task(browser_monitor()))
+    background_tasks.append(asyncio.create_task(memory_monitor()))
+    background_tasks.append(asyncio.create_task(watch_signatures()))
+    logger.info(f"{JOB_WORKERS} workers de jobs iniciados.")
+
+    # Objetos do boot (módulos, modelos, regex) saem do GC cíclico; gen0 maior = menos coletas por request
+    gc.collect()
+    gc.freeze()
+    gc.set_threshold(GC_GEN0_THRESHOLD, *gc.get_threshold()[1:])
     
     yield
     
+    for task in [WARMUP_TASK, *background_tasks]:
+        task.cancel()
+    await asyncio.gather(WARMUP_TASK, *background_tasks, return_exceptions=True)
+    if CLUSTER: await CLUSTER.close()
+    if JOBS_DB: JOBS_DB.close()
+    if FINGERPRINT_DB: FINGERPRINT_DB.close()
+    if CACHE_DB: CACHE_DB.close()
+
     logger.info("Fechando Browser e Playwright...")
-    if BROWSER: await BROWSER.close()
+    await HTTP_SESSION.close()
+    for shard in list(BROWSER_SHARDS):
+        await close_browser_shard(shard)
+    if PLAYWRIGHT_INSTANCE is None and PLAYWRIGHT_START:
+        # Warm-up cancelado no meio do start(): espera o driver subir para conseguir encerrá-lo
+        try:
+            PLAYWRIGHT_INSTANCE = await asyncio.wait_for(PLAYWRIGHT_START, timeout=10)
+        except Exception:
+            pass
     if PLAYWRIGHT_INSTANCE: await PLAYWRIGHT_INSTANCE.stop()
+    if EXTRACTION_POOL: EXTRACTION_POOL.shutdown(cancel_futures=True)
 
 app = FastAPI(lifespan=lifespan, title="High-Performance Scraper API (Enhanced 2025 - No Proxies)")
 
 # --- Endpoints ---
 
+@app.get("/health/live")
+async def health_live():
+    """Liveness: o processo e o event loop respondem. Não depende de navegador (não reinicie por warm-up)."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: 200 só com navegador disponível e memória fora do limite; 503 durante warm-up e reciclagens."""
+    ready, reason = readiness()
+    if not ready:
+        return JSONResponse({"status": "not_ready", "reason": reason}, status_code=503)
+    return {"status": "ready"}
+
 @app.get("/health")
 async def health_check():
+    ready, reason = readiness()
     return {
-        "status": "online",
+        "status": "online" if ready else reason,
         "active_connections": ACTIVE_CONNECTIONS,
-        "request_count_since_restart": REQUEST_COUNT,
-        "proxy_functionality": "REMOVIDA",
-        "ram_available_system": "Check via Docker Stats"
+        "request_count": REQUEST_COUNT,
+        "browsers": [
+            {
+                "id": shard.id,
+                "active": shard.active,
+                "requests": shard.request_count,
+                "age_seconds": int(time.time() - shard.launched_at),
+                "rss_mb": shard.rss // (1024 * 1024),
+                "draining": shard.draining,
+                "idle_pages": {key: len(idle) for key, idle in shard.pool.items()}
+            }
+            for shard in BROWSER_SHARDS
+        ],
+        "scheduler": SCHEDULER.stats() if SCHEDULER else None,
+        "jobs": {
+            "queue_depth": job_queue_depth(),
+            "workers": JOB_WORKERS,
+            "avg_wait_time": average(JOB_WAIT_TIMES),
+            "avg_run_time": average(JOB_RUN_TIMES)
+        },
+        "cache": {**CACHE_STATS, "entries_in_memory": len(CACHE_MEMORY)},
+        "errors": {
+            **ERROR_STATS,
+            "open_circuits": [host for host, circuit in HOST_CIRCUITS.items() if circuit.opened_at is not None],
+        },
+        "memory": MEMORY_GUARD.stats() if MEMORY_GUARD else None,
+        "signatures": SIGNATURES.summary(),
+        "cluster": {"node_id": NODE_ID, "nodes": await CLUSTER.nodes()} if CLUSTER else None,
+        "proxy_functionality": "REMOVIDA"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Exposição Prometheus: histogramas por etapa e o estado de /health em formato de métricas."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/scrape", response_model=ScrapeResponse)
 async def scrape(request: ScrapeRequest):
-    global ACTIVE_CONNECTIONS, REQUEST_COUNT
-    
-    if not SEMAPHORE:
+    if not SCHEDULER:
         raise HTTPException(status_code=500, detail="Sistema inicializando.")
+    check_admission()
+    return await process_scrape(request)
 
-    ACTIVE_CONNECTIONS += 1
-    async with SEMAPHORE:
+@app.post("/scrape/batch")
+async def scrape_batch(batch: BatchScrapeRequest):
+    """Executa vários scrapes pelo mesmo scheduler e devolve cada resultado (NDJSON) assim que termina."""
+    if not SCHEDULER:
+        raise HTTPException(status_code=500, detail="Sistema inicializando.")
+    if len(batch.requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Lote excede o limite de {MAX_BATCH_SIZE} URLs.")
+    check_admission()
+
+    # Planejamento: requisições idênticas rodam uma única vez e as que podem
+    # ser resolvidas sem navegador entram primeiro na fila do scheduler.
+    groups: Dict[str, List[int]] = {}
+    unique: List[ScrapeRequest] = []
+    for index, item in enumerate(batch.requests):
+        key = item.model_dump_json()
+        if key not in groups:
+            groups[key] = []
+            unique.append(item)
+        groups[key].append(index)
+    unique.sort(key=lambda item: item.mode == "dynamic")
+
+    async def run_item(item: ScrapeRequest):
+        return groups[item.model_dump_json()], await process_scrape(item)
+
+    async def stream():
+        tasks = [asyncio.create_task(run_item(item)) for item in unique]
         try:
-            result = await execute_scraping_task(request)
-            return result
-        except Exception as e:
-            logger.error(f"Erro Fatal após retentativas {request.url}: {str(e)}")
-            return ScrapeResponse(
-                status="error",
-                url=request.url,
-                social_media=SocialMedia(),
-                images=Images(),
-                checkouts=Checkouts(),
-                pixels=Pixels(pixels=PixelDetail()),
-                screenshot=Screenshot(),
-                performance=Performance(total_time="0s"),
-                markdown=f"Error after retries: {str(e)}"
-            )
+            for next_done in asyncio.as_completed(tasks):
+                indexes, result = await next_done
+                for index in indexes:
+                    yield BatchItemResult(index=index, result=result).model_dump_json() + "\n"
         finally:
-            ACTIVE_CONNECTIONS -= 1
-            REQUEST_COUNT += 1
-            gc.collect()
-            await restart_browser_if_needed()
\ No newline at end of file
+            # Cliente desconectou: não segura slots com trabalho que ninguém vai ler
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/crawl", response_model=ScrapeResponse)
+async def crawl(request: CrawlRequest):
+    """Segue links do mesmo domínio ranqueados por valor de contato e devolve uma resposta mesclada."""
+    if not SCHEDULER:
+        raise HTTPException(status_code=500, detail="Sistema inicializando.")
+    if request.record or request.replay:
+        raise HTTPException(status_code=422, detail="record/replay valem só para /scrape, /scrape/batch e /jobs.")
+    check_admission()
+    return await process_crawl(request)
+
+@app.get("/results/{result_id}/markdown")
+async def read_result_markdown(result_id: str):
+    """Markdown de um scrape (gerado agora se não veio inline), enquanto a fonte estiver em memória."""
+    markdown = await markdown_for(result_id)
+    if markdown is None:
+        raise HTTPException(status_code=404, detail="Resultado não encontrado ou expirado.")
+    return Response(markdown, media_type="text/markdown; charset=utf-8")
+
+@app.get("/screenshots/{screenshot_id}")
+async def read_screenshot(screenshot_id: str):
+    """Imagem binária do screenshot. Se a captura ainda estiver rodando, espera por ela."""
+    if not SCREENSHOT_ID_RE.match(screenshot_id):
+        raise HTTPException(status_code=404, detail="Screenshot não encontrado.")
+    media_type = f"image/{screenshot_id.rsplit('.', 1)[1]}"
+    task = PENDING_SCREENSHOTS.get(screenshot_id)
+    if task:
+        try:
+            return Response(await asyncio.shield(task), media_type=media_type)
+        except Exception:
+            raise HTTPException(status_code=404, detail="Falha ao capturar o screenshot.")
+    path = os.path.join(SCREENSHOT_DIR, screenshot_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Screenshot não encontrado.")
+    return FileResponse(path, media_type=media_type)
+
+@app.get("/recordings")
+async def read_recordings():
+    """Gravações guardadas neste nó (mais recentes primeiro)."""
+    return {"recordings": await asyncio.to_thread(list_recordings)}
+
+@app.get("/recordings/{recording_id}")
+async def read_recording(recording_id: str):
+    """Trace da gravação: tempo por etapa, bloqueio e a requisição original (para repetir com replay)."""
+    trace = await asyncio.to_thread(read_trace, recording_id) if RECORDING_ID_RE.match(recording_id) else None
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Gravação não encontrada.")
+    return {**trace, "har_url": f"/recordings/{recording_id}/har"}
+
+@app.get("/recordings/{recording_id}/har")
+async def read_recording_har(recording_id: str):
+    """HAR em zip: o .har de dentro abre no DevTools ou em qualquer visualizador de HAR."""
+    path = Recording(recording_id).har_path if RECORDING_ID_RE.match(recording_id) else ""
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Gravação não encontrada.")
+    return FileResponse(path, media_type="application/zip", filename=f"{recording_id}.har.zip")
+
+@app.delete("/recordings/{recording_id}", status_code=204)
+async def remove_recording(recording_id: str):
+    if not RECORDING_ID_RE.match(recording_id) or not await asyncio.to_thread(delete_recording, recording_id):
+        raise HTTPException(status_code=404, detail="Gravação não encontrada.")
+    return Response(status_code=204)
+
+@app.post("/signatures/reload")
+async def signatures_reload():
+    """Recarrega data/signatures.json agora (sem esperar o watcher). Os workers de extração seguem a nova versão."""
+    try:
+        reloaded = await asyncio.to_thread(reload_signatures)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Pacote de assinaturas inválido: {e}")
+    return {"reloaded": reloaded, **SIGNATURES.summary()}
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def create_job(request: JobRequest):
+    """Aceita o scrape e retorna imediatamente. Resultado via GET /jobs/{id} ou webhook_url."""
+    if not JOB_QUEUE:
+        raise HTTPException(status_code=500, detail="Sistema inicializando.")
+    return await enqueue_job(request)
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def read_job(job_id: str):
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return job
@@ -0,0 +1,61 @@
+"""Fixtures da suíte: API real (lifespan completo) contra o bench/fixture_server.py, tudo local.
+
+Os testes usam o tier estático (mode="static"), então não precisam de Chromium; o warm-up do
+navegador roda em background e pode falhar sem afetar o resultado.
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+# Antes do import do main: configuração lida no carregamento do módulo
+os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp(prefix="scraper-tests-"))
+os.environ.setdefault("EXTRACTION_WORKERS", "-1")  # extração inline, sem pool de processos
+os.environ.setdefault("CACHE_DB_PATH", "")
+os.environ.pop("REDIS_URL", None)
+
+import fixture_server  # noqa: E402
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def fixture_url():
+    """bench/fixture_server.py num event loop próprio, em thread separada."""
+    port = free_port()
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        runner = loop.run_until_complete(fixture_server.start(port=port))
+        started.set()
+        loop.run_forever()
+        loop.run_until_complete(runner.cleanup())
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    started.wait(10)
+    yield f"http://127.0.0.1:{port}"
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,49 @@
+"""POST /scrape/batch: NDJSON com um resultado por posição do lote, duplicatas executadas uma vez."""
+import json
+
+import main
+
+
+def batch(client, urls: list, **options) -> list:
+    body = {"requests": [{"url": url, "mode": "static", "force_refresh": True, **options} for url in urls]}
+    resp = client.post("/scrape/batch", json=body)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in resp.text.splitlines() if line]
+
+
+def test_batch_streams_one_line_per_request(client, fixture_url):
+    urls = [
+        f"{fixture_url}/static/landing_hotmart.html",
+        f"{fixture_url}/status/404",
+        f"{fixture_url}/static/landing_hotmart.html",  # duplicata do índice 0
+        f"{fixture_url}/static/portal_noticias.html",
+    ]
+
+    lines = batch(client, urls)
+
+    assert sorted(line["index"] for line in lines) == [0, 1, 2, 3]
+    results = {line["index"]: line["result"] for line in lines}
+    assert results[0] == results[2]
+    assert results[0]["status"] == "success"
+    assert results[1]["status"] == "error"
+    assert "HTTP 404" in results[1]["error"]
+    assert "contato@exemplo.com.br" in results[3]["emails"]
+
+
+def test_duplicates_in_a_batch_are_fetched_once(client, fixture_url):
+    url = f"{fixture_url}/static/wordpress_institucional.html?batch=dedup"
+    stores = main.CACHE_STATS["stores"]
+
+    lines = batch(client, [url] * 3)
+
+    assert len(lines) == 3
+    assert main.CACHE_STATS["stores"] == stores + 1
+
+
+def test_batch_over_max_size_is_rejected(client, fixture_url, monkeypatch):
+    monkeypatch.setattr(main, "MAX_BATCH_SIZE", 2)
+
+    resp = client.post("/scrape/batch", json={"requests": [{"url": f"{fixture_url}/static/landing_hotmart.html"}] * 3})
+
+    assert resp.status_code == 413
@@ -0,0 +1,91 @@
+"""Cache de resultados: chave, limite do tier em disco e o que um hit devolve (result_id, screenshot)."""
+import time
+
+import main
+
+
+def forget_markdown_store():
+    """Simula um reinício: o cache (memória/SQLite) sobrevive, o HTML de origem em memória não."""
+    main.MARKDOWN_STORE.clear()
+    main.MARKDOWN_STORE_BYTES = 0
+
+
+def test_cache_hit_without_source_html_drops_result_id(client, fixture_url):
+    body = {"url": f"{fixture_url}/static/landing_hotmart.html?cache=lazy", "mode": "static"}
+    first = client.post("/scrape", json=body).json()
+    assert first["cache"] == "miss"
+    assert client.get(f"/results/{first['result_id']}/markdown").status_code == 200
+
+    forget_markdown_store()
+    hit = client.post("/scrape", json=body).json()
+
+    assert hit["cache"] == "hit"
+    assert hit["result_id"] == ""
+
+
+def test_cache_hit_with_inline_markdown_keeps_result_id_servable(client, fixture_url):
+    body = {"url": f"{fixture_url}/static/landing_hotmart.html?cache=inline", "mode": "static", "include_markdown": True}
+    first = client.post("/scrape", json=body).json()
+    assert first["markdown"]
+
+    forget_markdown_store()
+    hit = client.post("/scrape", json=body).json()
+
+    assert hit["cache"] == "hit"
+    resp = client.get(f"/results/{hit['result_id']}/markdown")
+    assert resp.status_code == 200
+    assert resp.text == first["markdown"]
+
+
+def test_cache_key_covers_tier_and_browser_options():
+    base = main.ScrapeRequest(url="https://exemplo.com.br/")
+    keys = {
+        main.cache_key(base.model_copy(update=update))
+        for update in ({}, {"mode": "static"}, {"mode": "dynamic"}, {"scroll": "off"}, {"scroll_budget_ms": 1}, {"block_profile": "fast"})
+    }
+    assert len(keys) == 6
+
+
+def test_forced_tier_rejects_an_entry_from_another_tier(client, fixture_url):
+    request = main.ScrapeRequest(url=f"{fixture_url}/static/landing_hotmart.html?cache=entry", mode="static")
+    client.post("/scrape", json=request.model_dump())
+    key = main.cache_key(request)
+    entry = main.CACHE_MEMORY[key]
+    response = main.ScrapeResponse.model_validate_json(entry["response"])
+    response.method = "dynamic"
+    entry["response"] = response.model_dump_json()
+
+    data = client.post("/scrape", json=request.model_dump()).json()
+
+    assert data["method"] == "static"
+    assert data["cache"] == "miss"
+
+
+def test_disk_tier_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "CACHE_DB_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(main, "CACHE_DB_MAX_ENTRIES", 3)
+    main.cache_db_init()
+    try:
+        now = time.time()
+        rows = [(f"k{i}", now - i, None, None, "{}") for i in range(5)]
+        rows.append(("velha", now - main.CACHE_STALE_TTL - 1, None, None, "{}"))
+        main.CACHE_DB.executemany("INSERT INTO cache VALUES (?, ?, ?, ?, ?)", rows)
+
+        assert main.purge_cache_rows() == 3
+        assert sorted(key for (key,) in main.CACHE_DB.execute("SELECT key FROM cache")) == ["k0", "k1", "k2"]
+    finally:
+        main.CACHE_DB.close()
+        main.CACHE_DB = None
+
+
+def test_hit_drops_screenshot_older_than_its_file(client, fixture_url, monkeypatch):
+    request = main.ScrapeRequest(url=f"{fixture_url}/static/landing_hotmart.html?cache=screenshot", mode="static")
+    client.post("/scrape", json=request.model_dump())
+    entry = main.CACHE_MEMORY[main.cache_key(request)]
+    response = main.ScrapeResponse.model_validate_json(entry["response"])
+    response.screenshot = main.Screenshot(id="antigo.webp", url="/screenshots/antigo.webp", format="webp", timestamp=str(time.time() - 60))
+    entry["response"] = response.model_dump_json()
+
+    assert client.post("/scrape", json=request.model_dump()).json()["screenshot"]["id"] == "antigo.webp"
+    monkeypatch.setattr(main, "SCREENSHOT_TTL", 30)
+    assert client.post("/scrape", json=request.model_dump()).json()["screenshot"]["id"] == ""
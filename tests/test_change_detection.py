@@ -0,0 +1,52 @@
+"""Recrawl incremental (if_changed/since) contra /versioned/<nome> do servidor de fixtures."""
+import fixture_server
+
+
+def scrape(client, url: str, **options) -> dict:
+    resp = client.post("/scrape", json={"url": url, "mode": "static", **options})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_recrawl_reports_new_unchanged_and_changed(client, fixture_url):
+    url = f"{fixture_url}/versioned/recrawl"
+
+    first = scrape(client, url, if_changed=True)
+    assert first["change"] == "new"
+    assert first["fingerprint"]
+    assert sorted(first["emails"]) == ["contato@fixture.com.br", "equipe0@fixture.com.br"]
+
+    same = scrape(client, url, if_changed=True)
+    assert same["change"] == "unchanged"
+    assert same["cache"] == "revalidated"  # 304 no ETag da referência: sem scrape
+    assert same["fields"] == []
+    assert "emails" not in same
+
+    fixture_server.VERSIONS["recrawl"] = 2
+    changed = scrape(client, url, if_changed=True)
+    assert changed["change"] == "changed"
+    assert changed["fingerprint"] != first["fingerprint"]
+    assert changed["changes"]["emails"] == {"added": ["equipe1@fixture.com.br"], "removed": []}
+    assert "emails" in changed
+    assert "phones" not in changed  # seção igual à da referência fica de fora
+
+
+def test_since_an_old_fingerprint_returns_the_full_response(client, fixture_url):
+    url = f"{fixture_url}/versioned/since"
+    old = scrape(client, url, if_changed=True)["fingerprint"]
+    fixture_server.VERSIONS["since"] = 2
+    current = scrape(client, url, if_changed=True)["fingerprint"]
+
+    stale = scrape(client, url, since=old)
+    assert stale["change"] == "new"
+    assert len(stale["emails"]) == 3
+
+    fresh = scrape(client, url, since=current)
+    assert fresh["change"] == "unchanged"
+
+
+def test_plain_scrape_has_no_change_fields(client, fixture_url):
+    data = scrape(client, f"{fixture_url}/versioned/plain", force_refresh=True)
+
+    for name in ("fingerprint", "change", "changes"):
+        assert name not in data
@@ -0,0 +1,159 @@
+"""Modo distribuído contra fakeredis (com Lua): fila de jobs, recuperação de nós mortos, rate limit e cache compartilhados."""
+import asyncio
+
+import fakeredis
+import pytest
+import redis.asyncio
+
+import main
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Um "Redis" compartilhado; cada Cluster criado sobre ele é um nó."""
+    monkeypatch.setattr(main, "aioredis", redis.asyncio)  # connect_cluster importa sob demanda
+    monkeypatch.setattr(main, "SCHEDULER", main.Scheduler())
+    monkeypatch.setattr(main, "readiness", lambda: (True, "ready"))  # sem Chromium nos testes
+    return fakeredis.FakeServer()
+
+
+def node(server) -> main.Cluster:
+    return main.Cluster(fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+
+
+def job_request(url: str = "https://exemplo.com.br/") -> main.JobRequest:
+    return main.JobRequest(url=url, mode="static")
+
+
+def result(url: str) -> main.ScrapeResponse:
+    return main.error_response(url, "HTTP 404", "static")
+
+
+async def enqueue(cluster: main.Cluster, request: main.JobRequest) -> main.JobStatus:
+    job = main.JobStatus(id=f"job-{request.url}", status="queued", created_at=1000.0)
+    await cluster.enqueue_job(job, request)
+    return job
+
+
+def test_enqueue_claim_and_finish(server):
+    async def run():
+        cluster = node(server)
+        job = await enqueue(cluster, job_request())
+        assert (await cluster.get_job(job.id)).status == "queued"
+
+        job_id, request, created_at = await cluster.claim_job()
+
+        assert (job_id, request, created_at) == (job.id, job_request(), 1000.0)
+        assert cluster.claimed == 1
+        assert await cluster.client.lrange(cluster.key("processing", main.NODE_ID), 0, -1) == [job.id]
+        assert await cluster.client.llen(cluster.key("jobs")) == 0
+
+        await cluster.finish_job(job_id, result(request.url), 1001.0)
+
+        finished = await cluster.get_job(job_id)
+        assert finished.status == "finished"
+        assert finished.finished_at == 1001.0
+        assert finished.result.url == request.url
+        assert await cluster.client.llen(cluster.key("processing", main.NODE_ID)) == 0
+        assert 0 < await cluster.client.ttl(cluster.key("job", job_id)) <= main.JOB_TTL
+
+    asyncio.run(run())
+
+
+def test_claim_times_out_on_an_empty_queue(server, monkeypatch):
+    async def run():
+        cluster = node(server)
+        real_blmove = cluster.client.blmove
+        monkeypatch.setattr(cluster.client, "blmove", lambda src, dst, timeout, *args: real_blmove(src, dst, 0.1, *args))
+
+        assert await cluster.claim_job() is None
+        assert cluster.claimed == 0
+
+    asyncio.run(run())
+
+
+def test_jobs_of_a_dead_node_go_back_to_the_queue(server, monkeypatch):
+    async def run():
+        dead, alive = node(server), node(server)
+        first = await enqueue(dead, job_request("https://a.com.br/"))
+        second = await enqueue(dead, job_request("https://b.com.br/"))
+        monkeypatch.setattr(main, "NODE_ID", "no-morto")
+        await dead.claim_job()
+        await dead.claim_job()
+        third = await enqueue(dead, job_request("https://c.com.br/"))
+
+        monkeypatch.setattr(main, "NODE_ID", "no-vivo")
+        await alive.heartbeat()  # no-morto nunca mandou heartbeat
+
+        # Voltam para o início da fila, na ordem em que tinham sido puxados
+        assert await alive.client.lrange(alive.key("jobs"), 0, -1) == [first.id, second.id, third.id]
+        assert not await alive.client.exists(alive.key("processing", "no-morto"))
+        assert (await alive.claim_job())[0] == first.id
+
+    asyncio.run(run())
+
+
+def test_shutdown_requeues_own_jobs(server):
+    async def run():
+        leaving, staying = node(server), node(server)
+        job = await enqueue(leaving, job_request())
+        await leaving.claim_job()
+
+        await leaving.close()
+
+        assert await staying.client.lrange(staying.key("jobs"), 0, -1) == [job.id]
+
+    asyncio.run(run())
+
+
+def test_host_token_bucket_is_shared_between_nodes(server):
+    async def run():
+        first, second = node(server), node(server)
+        keys = [first.key("rate", "exemplo.com.br"), first.key("penalty", "exemplo.com.br")]
+
+        async def take(cluster):
+            return float(await cluster.host_token_script(keys=keys, args=[1.0, 2]))
+
+        # Rajada de 2 somando os dois nós; o terceiro espera ~1s (1 req/s)
+        assert await take(first) == 0
+        assert await take(second) == 0
+        assert 0.9 < await take(first) <= 1.0
+
+        await second.penalize_host("exemplo.com.br")  # 429 em um nó: taxa à metade para todos
+        assert 1.9 < await take(first) <= 2.0
+
+    asyncio.run(run())
+
+
+def test_host_token_waits_for_the_bucket(server, monkeypatch):
+    monkeypatch.setattr(main, "CLUSTER_HOST_RATE", 20.0)
+    monkeypatch.setattr(main, "SCHEDULER_HOST_BURST", 1)
+
+    async def run():
+        cluster = node(server)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(3):
+            await cluster.host_token("exemplo.com.br")
+        assert loop.time() - started >= 0.09  # 2 tokens além da rajada a 20/s
+
+    asyncio.run(run())
+
+
+def test_cache_entries_are_shared_between_nodes(server, monkeypatch):
+    async def run():
+        writer, reader = node(server), node(server)
+        response = result("https://exemplo.com.br/")
+        monkeypatch.setattr(main, "CLUSTER", writer)
+        await main.cache_put("chave-compartilhada", response)
+
+        # Outro nó: LRU local vazio, entrada vem do Redis e é promovida para a memória
+        main.CACHE_MEMORY.pop("chave-compartilhada")
+        monkeypatch.setattr(main, "CLUSTER", reader)
+        entry = await main.cache_get("chave-compartilhada")
+
+        assert main.ScrapeResponse.model_validate_json(entry["response"]).url == response.url
+        assert "chave-compartilhada" in main.CACHE_MEMORY
+        assert 0 < await reader.client.ttl(reader.key("cache", "chave-compartilhada")) <= main.CACHE_STALE_TTL
+
+    asyncio.run(run())
@@ -0,0 +1,28 @@
+"""Crawl: páginas canceladas pelo orçamento de tempo terminam antes de a sessão ser liberada."""
+import asyncio
+
+import main
+
+
+def test_cancelled_pages_unwind_before_the_session_closes(monkeypatch):
+    unwound, closed_after = [], []
+
+    async def fake_fetch(session, url, is_start):
+        if is_start:
+            response = main.error_response(url, "", "static")
+            response._links = [(f"/contato-{i}", "Contato") for i in range(3)]
+            return response
+        try:
+            await asyncio.sleep(60)
+        finally:
+            await asyncio.sleep(0.05)  # desfazendo a captura (fechar página, soltar rotas...)
+            unwound.append(url)
+
+    monkeypatch.setattr(main, "crawl_fetch", fake_fetch)
+    monkeypatch.setattr(main.CrawlSession, "close", lambda session: closed_after.append(len(unwound)))
+
+    request = main.CrawlRequest(url="https://exemplo.com.br/", max_pages=4, budget_ms=100)
+    response = asyncio.run(main.crawl_site(request))
+
+    assert response.crawled_pages == ["https://exemplo.com.br/"]
+    assert closed_after == [3]
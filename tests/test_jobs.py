@@ -0,0 +1,41 @@
+"""Fila de jobs: POST /jobs responde na hora e o resultado aparece em GET /jobs/{id}."""
+import time
+
+
+def wait_finished(client, job_id: str, timeout: float = 15.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] == "finished":
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} não terminou em {timeout}s")
+
+
+def test_job_is_queued_and_polled_until_finished(client, fixture_url):
+    resp = client.post("/jobs", json={"url": f"{fixture_url}/static/landing_hotmart.html", "mode": "static", "force_refresh": True})
+
+    assert resp.status_code == 202
+    queued = resp.json()
+    assert queued["status"] == "queued"
+    assert queued["result"] is None
+
+    job = wait_finished(client, queued["id"])
+
+    assert job["started_at"] >= job["created_at"]
+    assert job["finished_at"] >= job["started_at"]
+    assert job["result"]["status"] == "success"
+    assert job["result"]["method"] == "static"
+
+
+def test_failed_scrape_still_finishes_the_job(client, fixture_url):
+    queued = client.post("/jobs", json={"url": f"{fixture_url}/status/404", "mode": "static"}).json()
+
+    job = wait_finished(client, queued["id"])
+
+    assert job["result"]["status"] == "error"
+    assert "HTTP 404" in job["result"]["error"]
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/jobs/nao-existe").status_code == 404
@@ -0,0 +1,34 @@
+"""Markdown sob demanda: todo result_id devolvido responde em GET /results/{id}/markdown."""
+import time
+
+import fixture_server
+import main
+
+
+def build(html: str, **options) -> main.ScrapeResponse:
+    request = main.ScrapeRequest(url="https://exemplo.com.br/", **options)
+    fields = main.extract_static_page(html, main.extraction_plan(request), True)["fields"]
+    return main.build_scrape_response(request, "dynamic", fields, time.perf_counter(), source_html=None)
+
+
+def test_no_result_id_when_nothing_is_stored():
+    # browser_extract: o HTML não sai do navegador, então não há de onde gerar o markdown depois
+    response = build(fixture_server.corpus_page("landing_hotmart.html"))
+
+    assert response.result_id == ""
+
+
+def test_inline_markdown_keeps_a_servable_result_id():
+    response = build(fixture_server.corpus_page("landing_hotmart.html"), include_markdown=True)
+
+    assert response.markdown
+    assert main.MARKDOWN_STORE[response.result_id]["markdown"] == response.markdown
+
+
+def test_static_result_id_serves_markdown_on_demand(client, fixture_url):
+    data = client.post("/scrape", json={"url": f"{fixture_url}/static/landing_hotmart.html", "mode": "static", "force_refresh": True}).json()
+
+    assert not data.get("markdown")
+    resp = client.get(f"/results/{data['result_id']}/markdown")
+    assert resp.status_code == 200
+    assert resp.text
@@ -0,0 +1,42 @@
+"""Métricas por etapa: cada etapa entra uma vez no breakdown da resposta e no histograma."""
+import asyncio
+
+import main
+
+
+def screenshot_count() -> float:
+    for metric in main.STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_count") and sample.labels.get("stage") == "screenshot":
+                return sample.value
+    return 0.0
+
+
+def test_inline_screenshot_is_timed_once(monkeypatch):
+    async def capture(page, request):
+        await asyncio.sleep(0.05)
+        return b"imagem"
+
+    monkeypatch.setattr(main, "capture_screenshot", capture)
+    monkeypatch.setattr(main, "write_screenshot", lambda screenshot_id, data: None)
+    request = main.ScrapeRequest(url="https://exemplo.com.br/", take_screenshot=True, screenshot_inline=True)
+    timer = main.StageTimer()
+    count_before = screenshot_count()
+
+    async def run():
+        token = main.STAGE_TIMER.set(timer)
+        try:
+            task, screenshot = main.start_screenshot(None, request)
+            response = main.error_response(request.url, "", "dynamic")
+            response.screenshot = screenshot
+            await main.finish_screenshot(response, task, inline=True)
+            return response
+        finally:
+            main.STAGE_TIMER.reset(token)
+
+    response = asyncio.run(run())
+    timer.observe()
+
+    assert response.screenshot.base64
+    assert 0.05 <= timer.stages["screenshot"] < 0.1
+    assert screenshot_count() == count_before + 1
@@ -0,0 +1,73 @@
+"""Scheduler: slots cancelados voltam sem mexer no limite AIMD; replays só ocupam o limite global."""
+import asyncio
+import time
+
+import pytest
+
+import main
+
+
+def test_slot_granted_with_cancellation_is_released_without_aimd_signal():
+    async def run():
+        scheduler = main.Scheduler()
+        scheduler.limit = float(main.SCHEDULER_MIN_CONCURRENCY)
+        hosts = [f"cheio-{i}.test" for i in range(scheduler.capacity())]  # hosts distintos: só o limite global segura
+        for host in hosts:
+            await scheduler.acquire(host)
+        waiting = asyncio.create_task(scheduler.acquire("alvo.test"))
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 1
+
+        scheduler.release(hosts[0], 0.0, None, adapt=False)  # o slot vai para o waiter...
+        limit = scheduler.limit
+        waiting.cancel()  # ...que é cancelado antes de retomar
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        assert scheduler.limit == limit
+        assert scheduler.active == len(hosts) - 1
+        assert scheduler.hosts["alvo.test"].active == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_execution_does_not_raise_the_limit(monkeypatch):
+    async def run():
+        monkeypatch.setattr(main, "SCHEDULER", main.Scheduler())
+        main.SCHEDULER.limit = limit = float(main.SCHEDULER_MIN_CONCURRENCY)
+
+        with pytest.raises(asyncio.CancelledError):
+            async with main.acquire_slot("https://exemplo.com.br/"):
+                raise asyncio.CancelledError
+        assert main.SCHEDULER.limit == limit
+        assert main.SCHEDULER.active == 0
+
+        async with main.acquire_slot("https://exemplo.com.br/"):
+            pass
+        assert main.SCHEDULER.limit > limit  # sucesso rápido, esse sim conta
+
+    asyncio.run(run())
+
+
+def test_replay_slots_skip_the_host_limits(monkeypatch):
+    async def run():
+        monkeypatch.setattr(main, "SCHEDULER", main.Scheduler())
+        main.SCHEDULER.limit = float(main.SCHEDULER_MAX_CONCURRENCY)
+        running, peak = 0, 0
+
+        async def replay():
+            nonlocal running, peak
+            async with main.acquire_slot("https://exemplo.com.br/", remote=False):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(replay() for _ in range(4 * main.SCHEDULER_HOST_BURST)))
+
+        # Bucket de 2 req/s seguraria isso por vários segundos; só o limite global vale
+        assert time.monotonic() - started < 1.0
+        assert peak == main.SCHEDULER.capacity() > main.SCHEDULER_HOST_CONCURRENCY
+
+    asyncio.run(run())
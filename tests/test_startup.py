@@ -0,0 +1,21 @@
+"""Boot rápido: importar o main não carrega as bibliotecas pesadas (importadas sob demanda)."""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_defers_heavy_modules():
+    code = "import sys, main; print(' '.join(sorted(m for m in ('bs4', 'lxml', 'trafilatura', 'redis') if m in sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+
+def test_warm_parser_loads_the_parser_in_process():
+    code = "import sys, main; main.warm_parser(); print('bs4' in sys.modules and 'lxml' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+    assert result.stdout.strip() == "True", result.stderr
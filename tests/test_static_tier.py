@@ -0,0 +1,124 @@
+"""Tier estático (aiohttp) ponta a ponta: /scrape contra o servidor de fixtures, sem navegador."""
+import codecs
+
+import fixture_server
+import main
+
+
+def scrape(client, url: str, **options) -> dict:
+    resp = client.post("/scrape", json={"url": url, "mode": "static", "force_refresh": True, **options})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_large_corpus_page_is_read_whole(client, fixture_url):
+    html = fixture_server.corpus_page("portal_noticias.html")
+    assert len(html.encode()) > 64 * 1024  # maior que um bloco de leitura
+    expected = main.extract_static_page(html, main.extraction_plan(main.ScrapeRequest(url=fixture_url)), True)["fields"]
+
+    data = scrape(client, f"{fixture_url}/static/portal_noticias.html")
+
+    assert data["status"] == "success"
+    assert data["method"] == "static"
+    assert "contato@exemplo.com.br" in data["emails"]
+    assert sorted(data["emails"]) == sorted(expected["emails"])
+    assert sorted(data["phones"]) == sorted(expected["phones"])
+    assert data["social_media"] == expected["social_media"]
+
+
+def test_streamed_body_larger_than_one_chunk_comes_back_intact(client, fixture_url):
+    # Contatos só depois de ~600KB enviados em blocos: qualquer corte no meio some com eles
+    data = scrape(client, f"{fixture_url}/streamed?kb=600")
+
+    assert data["status"] == "success"
+    assert data["emails"] == ["contato@fixture.com.br"]
+    assert data["whatsapp"]
+    assert data["social_media"]["instagram"] == ["https://www.instagram.com/fixture"]
+
+
+def test_static_body_is_capped_at_static_max_bytes(client, fixture_url, monkeypatch):
+    monkeypatch.setattr(main, "STATIC_MAX_BYTES", 256 * 1024)
+
+    data = scrape(client, f"{fixture_url}/streamed?kb=600")
+
+    # O teto vale: o bloco de contatos do fim não chega
+    assert data["status"] == "success"
+    assert data["emails"] == []
+
+
+def test_meta_charset_is_honoured_without_a_header_charset(client, fixture_url):
+    data = scrape(client, f"{fixture_url}/legacy-charset", include_markdown=True)
+
+    assert data["status"] == "success"
+    assert data["metadata"]["title"] == "Açaí & Cia — Fale Conosco"
+    assert "Rua São João" in data["markdown"]
+    assert "\ufffd" not in data["markdown"]
+
+
+def test_decode_html_follows_the_browser_rules():
+    page = "<p>Ação “sem complicação”</p>"
+    assert main.decode_html(page.encode("utf-8"), "utf-8") == page
+    assert main.decode_html(page.encode("utf-8"), None) == page
+    assert main.decode_html(page.encode("cp1252"), None) == page  # sem declaração e inválido em UTF-8
+    assert main.decode_html(page.encode("cp1252"), "iso-8859-1") == page  # latin-1 vale como Windows-1252
+    assert main.decode_html(codecs.BOM_UTF8 + page.encode("utf-8"), "iso-8859-1") == page  # BOM vence o header
+    assert main.decode_html(page.encode("utf-8")[:-6], None) == "<p>Ação “sem complicação"  # corte no meio de um caractere
+
+
+def test_huge_dom_keeps_footer_contacts(client, fixture_url):
+    data = scrape(client, f"{fixture_url}/huge-dom?nodes=30000")
+
+    assert data["status"] == "success"
+    assert "contato@fixture.com.br" in data["emails"]
+    assert data["cnpj"]
+
+
+def test_only_429_and_5xx_are_transient():
+    for status in (400, 401, 403, 404, 405, 410, 451):
+        assert main.classify_error(main.HTTPStatusError(status)) == "permanent"
+        assert not main.is_host_failure(main.HTTPStatusError(status))
+    for status in (429, 500, 502, 503, 504):
+        assert main.classify_error(main.HTTPStatusError(status)) == "transient"
+        assert main.is_host_failure(main.HTTPStatusError(status))
+
+
+def test_static_4xx_fails_fast_without_retries(client, fixture_url):
+    retries = main.ERROR_STATS["retries"]
+
+    data = scrape(client, f"{fixture_url}/status/403")
+
+    assert data["status"] == "error"
+    assert data["method"] == "static"
+    assert "HTTP 403" in data["error"]
+    assert main.ERROR_STATS["retries"] == retries
+
+
+def test_error_response_is_slimmed_like_success(client, fixture_url):
+    data = scrape(client, f"{fixture_url}/status/401", fields=["emails"])
+
+    assert data["status"] == "error"
+    assert data["method"] == "static"
+    assert data["fields"] == ["emails"]
+    assert data["emails"] == []
+    for name in ("phones", "social_media", "pixels", "markdown", "screenshot"):
+        assert name not in data
+    assert "HTTP 401" in data["error"]
+
+
+def test_fields_select_sections_on_success(client, fixture_url):
+    data = scrape(client, f"{fixture_url}/static/landing_hotmart.html", fields=["emails", "markdown"])
+
+    assert data["status"] == "success"
+    assert data["fields"] == ["emails", "markdown"]
+    assert data["markdown"]  # `markdown` em fields vale como include_markdown
+    assert "emails" in data
+    for name in set(main.RESPONSE_FIELDS) - {"emails", "markdown"}:
+        assert name not in data
+    assert "error" not in data
+
+
+def test_fields_plan_skips_unrequested_extractors():
+    plan = main.extraction_plan(main.ScrapeRequest(url="https://exemplo.com.br", fields=["emails", "images"]))
+
+    # Só o pedido: sem pixels, links, markdown...; `images` em fields dispensa extract_images
+    assert plan == ["emails", "images"]